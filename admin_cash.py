@@ -10,7 +10,8 @@ from sqlalchemy import select, desc, or_, func
 from sqlalchemy.orm import joinedload
 
 # Додано імпорт BalanceHistory та CashTransaction для ручного погашення
-from models import Employee, CashShift, Settings, Order, BalanceHistory, CashTransaction
+from models import Employee, CashShift, Order, BalanceHistory, CashTransaction
+from settings_cache import settings_cache
 from templates import ADMIN_HTML_TEMPLATE
 from dependencies import get_db_session, check_credentials
 from cash_service import (
@@ -26,7 +27,7 @@ async def cash_dashboard(
     session: AsyncSession = Depends(get_db_session),
     username: str = Depends(check_credentials)
 ):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     # Шукаємо будь-яку відкриту зміну
     active_shift_res = await session.execute(
@@ -244,7 +245,7 @@ async def handover_form(
     session: AsyncSession = Depends(get_db_session),
     username: str = Depends(check_credentials)
 ):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     employee = await session.get(Employee, employee_id)
     if not employee:
         raise HTTPException(status_code=404, detail="Співробітника не знайдено")
@@ -419,7 +420,7 @@ async def process_handover_route(
 
 @router.get("/admin/cash/history", response_class=HTMLResponse)
 async def cash_history(session: AsyncSession = Depends(get_db_session), username: str = Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     shifts_res = await session.execute(
         select(CashShift)
@@ -504,7 +505,7 @@ async def print_z_report(shift_id: int, session: AsyncSession = Depends(get_db_s
     shift = await session.get(CashShift, shift_id, options=[joinedload(CashShift.employee)])
     if not shift: return HTMLResponse("Зміну не знайдено", status_code=404)
     
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     theoretical = shift.start_cash + shift.total_sales_cash + shift.service_in - shift.service_out
     diff = shift.end_cash_actual - theoretical
@@ -4,12 +4,14 @@ import html
 from fastapi import APIRouter, Depends, Query, HTTPException
 from fastapi.responses import HTMLResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_
+from sqlalchemy import select, func
 from sqlalchemy.orm import joinedload, selectinload
 
-from models import Order, OrderStatusHistory, Employee, Settings
+from models import Order, OrderStatusHistory, Employee
+from settings_cache import settings_cache
+from search import name_or_phone, dialect_of
 from templates import ADMIN_HTML_TEMPLATE, ADMIN_CLIENTS_LIST_BODY, ADMIN_CLIENT_DETAIL_BODY
-from dependencies import get_db_session, check_credentials
+from dependencies import get_read_db_session, check_credentials
 
 router = APIRouter()
 
@@ -18,13 +20,11 @@ async def admin_clients_list(
     page: int = Query(1, ge=1),
     q: str = Query(None, alias="search"),
     filter_type: str = Query("all", alias="type"), # all, delivery, in_house
-    session: AsyncSession = Depends(get_db_session),
+    session: AsyncSession = Depends(get_read_db_session),
     username: str = Depends(check_credentials)
 ):
     """Відображає сторінку клієнтів з можливістю пошуку, фільтрації та пагінації."""
-    settings = await session.get(Settings, 1)
-    if not settings:
-        settings = Settings()
+    settings = await settings_cache.get(session)
 
     per_page = 20
     offset = (page - 1) * per_page
@@ -70,12 +70,12 @@ async def admin_clients_list(
     )
 
     if q:
-        client_query = client_query.where(
-            or_(
-                latest_name_subquery.c.customer_name.ilike(f"%{q}%"),
-                Order.phone_number.ilike(f"%{q}%")
-            )
+        # Номери зі збігом шукаються по індексах orders (ім'я або цифри телефону),
+        # а не ILIKE по підзапиту з row_number
+        matching_phones = select(Order.phone_number).where(
+            name_or_phone(Order.customer_name, Order.phone_number, q.strip(), dialect_of(session))
         )
+        client_query = client_query.where(Order.phone_number.in_(matching_phones))
 
     total_res = await session.execute(select(func.count()).select_from(client_query.subquery()))
     total = total_res.scalar_one()
@@ -141,13 +141,11 @@ async def admin_clients_list(
 @router.get("/admin/client/{phone_number}", response_class=HTMLResponse)
 async def admin_client_detail(
     phone_number: str,
-    session: AsyncSession = Depends(get_db_session),
+    session: AsyncSession = Depends(get_read_db_session),
     username: str = Depends(check_credentials)
 ):
     """Відображає детальну інформацію про клієнта та його історію замовлень."""
-    settings = await session.get(Settings, 1)
-    if not settings:
-        settings = Settings()
+    settings = await settings_cache.get(session)
     
     orders_res = await session.execute(
         select(Order)
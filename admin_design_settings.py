@@ -14,8 +14,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from models import Settings
+from settings_cache import settings_cache
 from templates import ADMIN_HTML_TEMPLATE, ADMIN_DESIGN_SETTINGS_BODY
 from dependencies import get_db_session, check_credentials
+from http_cache import site_content
+from image_pipeline import image_ingest, remove_image_files, ImageRejected, ImageIngestBusy, HEADER_WIDTHS
 
 router = APIRouter()
 
@@ -37,11 +40,7 @@ async def get_design_settings_page(
     username: str = Depends(check_credentials)
 ):
     """Відображає сторінку налаштувань дизайну, SEO та текстів."""
-    settings = await session.get(Settings, 1)
-    if not settings:
-        settings = Settings(id=1)
-        session.add(settings)
-        await session.commit()
+    settings = await settings_cache.get(session)
 
     # --- Функція для генерації HTML <option> для <select> ---
     def get_font_options(font_list: list, selected_font: str, default_font: str) -> str:
@@ -277,20 +276,32 @@ async def save_design_settings(
 
     # --- Обробка зображення ШАПКИ ---
     if header_image_file and header_image_file.filename:
-        if settings.header_image_url and os.path.exists(settings.header_image_url):
-            try: os.remove(settings.header_image_url)
-            except OSError: pass
-        
-        ext = header_image_file.filename.split('.')[-1] if '.' in header_image_file.filename else 'jpg'
-        filename = f"header_bg_{secrets.token_hex(8)}.{ext}"
-        fs_path = os.path.join("static", "images", filename)
+        old_image_url, old_variants = settings.header_image_url, settings.header_image_variants
         
+        file_bytes = await header_image_file.read()
         try:
-            async with aiofiles.open(fs_path, 'wb') as f:
-                await f.write(await header_image_file.read())
-            settings.header_image_url = f"static/images/{filename}"
+            # Набір ширин/форматів (у пулі процесів), менші версії - для вузьких екранів
+            settings.header_image_url, settings.header_image_variants = await image_ingest.process(
+                file_bytes, HEADER_WIDTHS, prefix="header_bg_"
+            )
+            remove_image_files(old_image_url, old_variants)
+        # Як і для фото товарів: завелике / невалідне - 400, пул зайнятий - 503 (налаштування не зберігаються)
+        except ImageRejected as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ImageIngestBusy as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
-            print(f"Error saving header image: {e}")
+            print(f"Error processing header image: {e}")
+            try:
+                ext = header_image_file.filename.split('.')[-1] if '.' in header_image_file.filename else 'jpg'
+                filename = f"header_bg_{secrets.token_hex(8)}.{ext}"
+                async with aiofiles.open(os.path.join("static", "images", filename), 'wb') as f:
+                    await f.write(file_bytes)
+                settings.header_image_url = f"static/images/{filename}"
+                settings.header_image_variants = None
+                remove_image_files(old_image_url, old_variants)
+            except Exception as e:
+                print(f"Error saving header image: {e}")
     
     # --- Збереження ФАВІКОНІВ та PWA іконок ---
     favicon_dir = "static/favicons"
@@ -340,5 +351,7 @@ async def save_design_settings(
     settings.telegram_welcome_message = telegram_welcome_message
 
     await session.commit()
+    settings_cache.invalidate()
+    site_content.bump()
     
     return RedirectResponse(url="/admin/design_settings?saved=true", status_code=303)
\ No newline at end of file
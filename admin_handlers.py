@@ -17,9 +17,10 @@ import re
 import os
 from decimal import Decimal
 
-from models import Order, Product, Category, OrderStatus, Employee, Role, Settings, OrderStatusHistory, OrderItem, BalanceHistory
+from models import Order, Product, Category, OrderStatus, Employee, Settings, OrderStatusHistory, OrderItem, BalanceHistory
 from courier_handlers import _generate_waiter_order_view
-from notification_manager import notify_all_parties_on_status_change, create_staff_notification
+from notification_manager import notify_all_parties_on_status_change, create_staff_notification, commit_staff_notifications
+from staff_roster import staff_roster
 # --- КАСА & СКЛАД ---
 # ДОДАНО: імпорт get_open_shift
 from cash_service import link_order_to_shift, register_employee_debt, unregister_employee_debt, get_open_shift
@@ -554,12 +555,7 @@ def register_admin_handlers(dp: Dispatcher):
         if not order:
             return await callback.answer("Замовлення не знайдено!", show_alert=True)
 
-        courier_roles_res = await session.execute(select(Role.id).where(Role.can_be_assigned == True))
-        courier_role_ids = courier_roles_res.scalars().all()
-        
-        if not courier_role_ids: return await callback.answer("Помилка: Роль 'Кур'єр' не знайдена.", show_alert=True)
-        
-        couriers = (await session.execute(select(Employee).where(Employee.role_id.in_(courier_role_ids), Employee.is_on_shift == True).order_by(Employee.full_name))).scalars().all()
+        couriers = (await staff_roster.get(session)).on_shift("courier")
         
         kb = InlineKeyboardBuilder()
         text = f"<b>Замовлення #{order.id}</b>\nВиберіть кур'єра (🟢 На зміні):"
@@ -623,7 +619,7 @@ def register_admin_handlers(dp: Dispatcher):
                     )
                 except Exception: pass
         
-        await session.commit()
+        await commit_staff_notifications(session)
         
         if admin_chat_id_str:
             try: await callback.bot.send_message(admin_chat_id_str, f"👤 Замовленню #{order.id} призначено кур'єра: <b>{html_module.escape(new_courier_name)}</b>")
@@ -17,12 +17,15 @@ from inventory_models import (
     IngredientRecipeItem
 )
 # Додали Order в імпорт
-from models import Product, Settings, Order
-from dependencies import get_db_session, check_credentials
+from models import Product, Order
+from settings_cache import settings_cache
+from dependencies import get_db_session, get_read_db_session, check_credentials
 from templates import ADMIN_HTML_TEMPLATE
 # Імпортуємо функції сервісу
 from inventory_service import apply_doc_stock_changes, process_inventory_check
 from cash_service import add_shift_transaction, get_any_open_shift
+from menu_cache import menu_cache
+from search import contains
 
 router = APIRouter(prefix="/admin/inventory", tags=["inventory"])
 
@@ -112,7 +115,7 @@ def get_active_classes():
 @router.get("/dashboard", response_class=HTMLResponse)
 @router.get("/", response_class=HTMLResponse)
 async def inv_dashboard(session: AsyncSession = Depends(get_db_session), user=Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     total_cost_res = await session.execute(
         select(func.sum(Stock.quantity * Ingredient.current_cost))
@@ -189,7 +192,7 @@ async def warehouses_list(
     session: AsyncSession = Depends(get_db_session),
     user=Depends(check_credentials)
 ):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     warehouses = (await session.execute(
         select(Warehouse).options(joinedload(Warehouse.linked_warehouse)).order_by(Warehouse.name)
@@ -309,7 +312,7 @@ async def delete_warehouse(w_id: int, session: AsyncSession = Depends(get_db_ses
 # --- SUPPLIERS ---
 @router.get("/suppliers", response_class=HTMLResponse)
 async def suppliers_list(session: AsyncSession = Depends(get_db_session), user=Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     suppliers = (await session.execute(select(Supplier).order_by(Supplier.name))).scalars().all()
     
     rows = ""
@@ -360,7 +363,7 @@ async def add_supplier(name: str = Form(...), contact_person: str = Form(None),
 # --- MODIFIERS ---
 @router.get("/modifiers", response_class=HTMLResponse)
 async def modifiers_list(session: AsyncSession = Depends(get_db_session), user=Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     mods = (await session.execute(
         select(Modifier)
@@ -449,6 +452,7 @@ async def add_modifier(
         warehouse_id=warehouse_id
     ))
     await session.commit()
+    menu_cache.invalidate()
     return RedirectResponse("/admin/inventory/modifiers", 303)
 
 @router.get("/modifiers/delete/{mod_id}")
@@ -457,12 +461,13 @@ async def delete_modifier(mod_id: int, session: AsyncSession = Depends(get_db_se
     if mod:
         await session.delete(mod)
         await session.commit()
+        menu_cache.invalidate()
     return RedirectResponse("/admin/inventory/modifiers", 303)
 
 # --- PACKAGING RULES (RULES) ---
 @router.get("/rules", response_class=HTMLResponse)
 async def rules_list(session: AsyncSession = Depends(get_db_session), user=Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     rules = (await session.execute(
         select(AutoDeductionRule)
@@ -563,10 +568,10 @@ async def delete_rule(r_id: int, session: AsyncSession = Depends(get_db_session)
 # --- INGREDIENTS ---
 @router.get("/ingredients", response_class=HTMLResponse)
 async def ingredients_page(q: str = Query(None), session: AsyncSession = Depends(get_db_session), user=Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     query = select(Ingredient).options(joinedload(Ingredient.unit)).order_by(Ingredient.name)
-    if q: query = query.where(Ingredient.name.ilike(f"%{q}%"))
+    if q: query = query.where(contains(Ingredient.name, q.strip()))
     ingredients = (await session.execute(query)).scalars().all()
     units = (await session.execute(select(Unit))).scalars().all()
     
@@ -641,7 +646,7 @@ async def add_ing(
 # --- РЕДАКТИРОВАНИЕ РЕЦЕПТА ПОЛУФАБРИКАТА ---
 @router.get("/ingredients/{pf_id}/recipe", response_class=HTMLResponse)
 async def edit_pf_recipe(pf_id: int, session: AsyncSession = Depends(get_db_session), user=Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     pf = await session.get(Ingredient, pf_id, options=[
         joinedload(Ingredient.recipe_components).joinedload(IngredientRecipeItem.child_ingredient).joinedload(Ingredient.unit),
@@ -726,7 +731,7 @@ async def del_pf_component(item_id: int, session: AsyncSession = Depends(get_db_
 # --- STOCK ---
 @router.get("/stock", response_class=HTMLResponse)
 async def stock_page(warehouse_id: int = Query(None), session: AsyncSession = Depends(get_db_session), user=Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     warehouses = (await session.execute(select(Warehouse))).scalars().all()
     
     query = select(Stock).options(joinedload(Stock.warehouse), joinedload(Stock.ingredient).joinedload(Ingredient.unit))
@@ -765,7 +770,7 @@ async def stock_page(warehouse_id: int = Query(None), session: AsyncSession = De
 # --- ІНВЕНТАРИЗАЦІЯ (CHECKS) ---
 @router.get("/checks", response_class=HTMLResponse)
 async def inventory_checks_list(session: AsyncSession = Depends(get_db_session), user=Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     query = select(InventoryDoc).options(joinedload(InventoryDoc.source_warehouse))\
         .where(InventoryDoc.doc_type == 'inventory')\
@@ -873,7 +878,7 @@ async def view_inventory_check(
     session: AsyncSession = Depends(get_db_session), 
     user=Depends(check_credentials)
 ):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     doc = await session.get(InventoryDoc, doc_id, options=[
         joinedload(InventoryDoc.items).joinedload(InventoryDocItem.ingredient).joinedload(Ingredient.unit),
@@ -1127,7 +1132,7 @@ async def update_inventory_check(
 # --- DOCS ---
 @router.get("/docs", response_class=HTMLResponse)
 async def docs_page(type: str = Query(None), session: AsyncSession = Depends(get_db_session), user=Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     query = select(InventoryDoc).options(joinedload(InventoryDoc.supplier), joinedload(InventoryDoc.source_warehouse), joinedload(InventoryDoc.target_warehouse)).order_by(desc(InventoryDoc.created_at))
     if type: query = query.where(InventoryDoc.doc_type == type)
@@ -1215,7 +1220,7 @@ async def docs_page(type: str = Query(None), session: AsyncSession = Depends(get
 
 @router.get("/docs/create", response_class=HTMLResponse)
 async def create_doc_page(session: AsyncSession = Depends(get_db_session), user=Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     warehouses = (await session.execute(select(Warehouse))).scalars().all()
     suppliers = (await session.execute(select(Supplier))).scalars().all()
     
@@ -1333,7 +1338,7 @@ async def delete_document(doc_id: int, session: AsyncSession = Depends(get_db_se
 
 @router.get("/docs/{doc_id}", response_class=HTMLResponse)
 async def view_doc(doc_id: int, session: AsyncSession = Depends(get_db_session), user=Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     doc = await session.get(InventoryDoc, doc_id, options=[
         joinedload(InventoryDoc.items).joinedload(InventoryDocItem.ingredient).joinedload(Ingredient.unit),
@@ -1588,7 +1593,7 @@ async def pay_document(doc_id: int, amount: Decimal = Form(...), session: AsyncS
 # --- TECH CARDS ---
 @router.get("/tech_cards", response_class=HTMLResponse)
 async def tc_list(session: AsyncSession = Depends(get_db_session), user=Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     tcs = (await session.execute(select(TechCard).options(joinedload(TechCard.product)))).scalars().all()
     
     rows = "".join([f"""
@@ -1640,7 +1645,7 @@ async def edit_tc(
     tc_id: int, 
     session: AsyncSession = Depends(get_db_session), 
     user=Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     # Завантажуємо техкарту разом з продуктом
     tc = await session.get(TechCard, tc_id, options=[joinedload(TechCard.product), joinedload(TechCard.components).joinedload(TechCardItem.ingredient).joinedload(Ingredient.unit)])
     
@@ -1765,6 +1770,7 @@ async def update_tc_product_price(
     if tc and tc.product:
         tc.product.price = price
         await session.commit()
+        menu_cache.invalidate()
     return RedirectResponse(f"/admin/inventory/tech_cards/{tc_id}", 303)
 
 @router.post("/tc/{tc_id}/add")
@@ -1800,10 +1806,10 @@ async def inventory_usage_report(
     ingredient_id: int = Query(None),
     date_from: str = Query(None),
     date_to: str = Query(None),
-    session: AsyncSession = Depends(get_db_session),
+    session: AsyncSession = Depends(get_read_db_session),
     user=Depends(check_credentials)
 ):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     ingredients = (await session.execute(select(Ingredient).order_by(Ingredient.name))).scalars().all()
     ing_options = "".join([f'<option value="{i.id}" {"selected" if ingredient_id == i.id else ""}>{html.escape(i.name)}</option>' for i in ingredients])
@@ -1915,8 +1921,8 @@ async def inventory_usage_report(
 
 # --- ЗВІТ ПО РЕНТАБЕЛЬНОСТІ ---
 @router.get("/reports/profitability", response_class=HTMLResponse)
-async def report_profitability(session: AsyncSession = Depends(get_db_session), user=Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+async def report_profitability(session: AsyncSession = Depends(get_read_db_session), user=Depends(check_credentials)):
+    settings = await settings_cache.get(session)
     
     products_res = await session.execute(
         select(Product)
@@ -2020,10 +2026,10 @@ async def report_suppliers(
     date_from: str = Query(None),
     date_to: str = Query(None),
     sort_by: str = Query("date_desc"),
-    session: AsyncSession = Depends(get_db_session),
+    session: AsyncSession = Depends(get_read_db_session),
     user=Depends(check_credentials)
 ):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     suppliers = (await session.execute(select(Supplier).order_by(Supplier.name))).scalars().all()
     sup_opts = f"<option value=''>-- Всі постачальники --</option>"
@@ -2177,7 +2183,7 @@ async def report_suppliers(
 # --- ВИРОБНИЦТВО ---
 @router.get("/production", response_class=HTMLResponse)
 async def production_page(session: AsyncSession = Depends(get_db_session), user=Depends(check_credentials)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     # Список П/Ф для выбора
     pfs = (await session.execute(
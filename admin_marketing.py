@@ -6,14 +6,17 @@ import aiofiles
 import html
 from typing import Optional
 
-from fastapi import APIRouter, Depends, Form, UploadFile, File
+from fastapi import APIRouter, Depends, Form, HTTPException, UploadFile, File
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from models import MarketingPopup, Settings, Banner
+from settings_cache import settings_cache
 from templates import ADMIN_HTML_TEMPLATE, ADMIN_MARKETING_BODY
 from dependencies import get_db_session, check_credentials
+from http_cache import site_content
+from image_pipeline import image_ingest, remove_image_files, ImageRejected, ImageIngestBusy, BANNER_WIDTHS
 
 router = APIRouter()
 
@@ -23,7 +26,7 @@ async def get_marketing_page(
     username: str = Depends(check_credentials)
 ):
     # Отримуємо налаштування (або створюємо порожній об'єкт, якщо ще немає в БД)
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     # --- ОТРИМАННЯ ДАНИХ POPUP ---
     # Отримуємо перший попап (будемо використовувати один редагований)
@@ -218,6 +221,8 @@ async def save_marketing_settings(
     settings.google_ads_conversion_label = google_ads_conversion_label.strip() if google_ads_conversion_label.strip() else None
     
     await session.commit()
+    settings_cache.invalidate()
+    site_content.bump()
     return RedirectResponse(url="/admin/marketing", status_code=303)
 
 @router.post("/admin/marketing/add_banner")
@@ -234,17 +239,28 @@ async def add_banner(
         # Можна додати обробку помилки або просто редірект
         return RedirectResponse(url="/admin/marketing?error=missing_file", status_code=303)
 
-    # Збереження файлу
-    ext = image_file.filename.split('.')[-1] if '.' in image_file.filename else 'jpg'
-    filename = f"banner_{secrets.token_hex(8)}.{ext}"
-    
-    # Переконаємось, що папка існує
-    os.makedirs("static/images", exist_ok=True)
-    fs_path = os.path.join("static", "images", filename)
-    
+    file_bytes = await image_file.read()
+    try:
+        # Набір ширин/форматів для srcset
+        image_url, image_variants = await image_ingest.process(file_bytes, BANNER_WIDTHS, prefix="banner_")
+    # Як і для фото товарів: завелике / невалідне - 400, пул зайнятий - 503
+    except ImageRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImageIngestBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        # Не вдалося обробити (наприклад, SVG) - нижче зберігаємо оригінал як є
+        print(f"Error processing banner image: {e}")
+        image_url, image_variants = None, None
+
     try:
-        async with aiofiles.open(fs_path, 'wb') as f:
-            await f.write(await image_file.read())
+        if image_url is None:
+            ext = image_file.filename.split('.')[-1] if '.' in image_file.filename else 'jpg'
+            filename = f"banner_{secrets.token_hex(8)}.{ext}"
+            os.makedirs("static/images", exist_ok=True)
+            async with aiofiles.open(os.path.join("static", "images", filename), 'wb') as f:
+                await f.write(file_bytes)
+            image_url, image_variants = f"static/images/{filename}", None
         
         # Створення запису в БД
         banner = Banner(
@@ -252,10 +268,12 @@ async def add_banner(
             link=link,
             sort_order=sort_order,
             is_active=is_active,
-            image_url=f"static/images/{filename}"
+            image_url=image_url,
+            image_variants=image_variants
         )
         session.add(banner)
         await session.commit()
+        site_content.bump()
         
     except Exception as e:
         print(f"Error saving banner: {e}")
@@ -280,10 +298,12 @@ async def delete_banner(
                     os.remove(file_path)
                 except OSError as e:
                     print(f"Error deleting banner file: {e}")
+        remove_image_files(None, banner.image_variants)
         
         # Видаляємо з БД
         await session.delete(banner)
         await session.commit()
+        site_content.bump()
         
     return RedirectResponse(url="/admin/marketing", status_code=303)
 
@@ -337,4 +357,5 @@ async def save_marketing_popup(
             print(f"Error saving popup image: {e}")
 
     await session.commit()
+    site_content.bump()
     return RedirectResponse(url="/admin/marketing", status_code=303)
\ No newline at end of file
@@ -7,13 +7,16 @@ from fastapi import APIRouter, Depends, Form, HTTPException, Request
 from fastapi.responses import RedirectResponse, HTMLResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm import joinedload
 from aiogram import Bot
 from urllib.parse import quote_plus
 from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardButton
 import re
 
-from models import Order, OrderStatus, Employee, Role, OrderStatusHistory, Settings, Product, OrderItem, OrderLog
+from models import Order, OrderStatus, Employee, OrderStatusHistory, Product, OrderItem, OrderLog
+from settings_cache import settings_cache
+from staff_roster import staff_roster
+from order_loading import ORDER_FULL_DETAIL
 from templates import ADMIN_HTML_TEMPLATE, ADMIN_ORDER_MANAGE_BODY
 from dependencies import get_db_session, check_credentials
 from notification_manager import notify_all_parties_on_status_change
@@ -30,19 +33,12 @@ async def get_manage_order_page(
     username: str = Depends(check_credentials)
 ):
     """Відображає сторінку керування для конкретного замовлення."""
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     order = await session.get(
         Order,
         order_id,
-        options=[
-            joinedload(Order.status),
-            joinedload(Order.courier),
-            joinedload(Order.history).joinedload(OrderStatusHistory.status),
-            joinedload(Order.table),
-            selectinload(Order.items), # Завантажуємо товари
-            selectinload(Order.logs)   # Завантажуємо логи
-        ]
+        options=list(ORDER_FULL_DETAIL)
     )
     if not order:
         raise HTTPException(status_code=404, detail="Замовлення не знайдено")
@@ -73,17 +69,7 @@ async def get_manage_order_page(
     all_statuses = statuses_res.scalars().all()
     status_options = "".join([f'<option value="{s.id}" {"selected" if s.id == order.status_id else ""}>{html.escape(s.name)}</option>' for s in all_statuses])
 
-    courier_role_res = await session.execute(select(Role.id).where(Role.can_be_assigned == True))
-    courier_role_ids = courier_role_res.scalars().all()
-    
-    couriers_on_shift = []
-    if courier_role_ids:
-        couriers_res = await session.execute(
-            select(Employee)
-            .where(Employee.role_id.in_(courier_role_ids), Employee.is_on_shift == True)
-            .order_by(Employee.full_name)
-        )
-        couriers_on_shift = couriers_res.scalars().all()
+    couriers_on_shift = (await staff_roster.get(session)).on_shift("courier")
         
     courier_options = '<option value="0">Не призначено</option>'
     courier_options += "".join([f'<option value="{c.id}" {"selected" if c.id == order.courier_id else ""}>{html.escape(c.full_name)}</option>' for c in couriers_on_shift])
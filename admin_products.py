@@ -5,10 +5,8 @@ import os
 import secrets
 import aiofiles
 import logging
-import io  # Додано для роботи з байтами
 from decimal import Decimal
 from typing import Optional, List
-from PIL import Image  # Додано для обробки зображень
 
 from fastapi import APIRouter, Depends, Form, HTTPException, File, UploadFile, Query
 from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
@@ -16,17 +14,26 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from sqlalchemy.orm import joinedload, selectinload
 
-from models import Product, Category, Settings, product_modifier_association
+from models import Product, Category, product_modifier_association, transliterate_slug, make_unique_slug
+from settings_cache import settings_cache
 from inventory_models import Modifier, Warehouse
 from templates import ADMIN_HTML_TEMPLATE
 from dependencies import get_db_session, check_credentials
+from menu_cache import menu_cache
+from image_pipeline import image_ingest, remove_image_files, ImageRejected, ImageIngestBusy, PRODUCT_WIDTHS
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Налаштування для зображень
-IMG_MAX_SIZE = (800, 800)
-IMG_QUALITY = 80
+
+async def assign_product_slug(session: AsyncSession, product: Product):
+    """Рахує унікальний slug для страви (перевірка по унікальному індексу products.slug)."""
+    base = transliterate_slug(product.name or "")[:200] or "product"
+    query = select(Product.slug).where(Product.slug.like(f"{base}%"))
+    if product.id:
+        query = query.where(Product.id != product.id)
+    taken = set((await session.execute(query)).scalars().all())
+    product.slug = make_unique_slug(base, taken)
 
 @router.get("/admin/products", response_class=HTMLResponse)
 async def admin_products(
@@ -36,7 +43,7 @@ async def admin_products(
     username: str = Depends(check_credentials)
 ):
     """Відображає список страв (товарів) з пагінацією та пошуком."""
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     per_page = 10
     offset = (page - 1) * per_page
 
@@ -302,32 +309,18 @@ async def add_product(
         raise HTTPException(status_code=400, detail="Ціна повинна бути позитивною")
     
     image_url = None
+    image_variants = None
     
     # --- ЛОГІКА ЗБЕРЕЖЕННЯ ТА ОПТИМІЗАЦІЇ ФОТО ---
     if image and image.filename:
         try:
-            # Читаємо файл у пам'ять
+            # Читаємо файл у пам'ять і робимо набір ширин/форматів для srcset
             file_bytes = await image.read()
-            img = Image.open(io.BytesIO(file_bytes))
-            
-            # Зменшуємо розмір
-            img.thumbnail(IMG_MAX_SIZE)
-            
-            # Зберігаємо в буфер як WebP
-            output = io.BytesIO()
-            img.save(output, format="WEBP", quality=IMG_QUALITY, optimize=True)
-            output.seek(0)
-            
-            # Формуємо шлях з розширенням .webp
-            filename = f"{secrets.token_hex(8)}.webp"
-            path = os.path.join("static/images", filename)
-            os.makedirs("static/images", exist_ok=True)
-            
-            # Записуємо оптимізовані байти на диск
-            async with aiofiles.open(path, 'wb') as f: 
-                await f.write(output.read())
-            
-            image_url = path
+            image_url, image_variants = await image_ingest.process(file_bytes, PRODUCT_WIDTHS)
+        except ImageRejected as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ImageIngestBusy as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             logger.error(f"Помилка обробки зображення (Pillow): {e}")
             # Fallback: Спробувати зберегти оригінал, якщо оптимізація не вдалася
@@ -350,9 +343,11 @@ async def add_product(
         price=price, 
         description=description, 
         image_url=image_url, 
+        image_variants=image_variants,
         category_id=category_id, 
         production_warehouse_id=production_warehouse_id
     )
+    await assign_product_slug(session, product)
 
     # Додаємо модифікатори, якщо обрані
     if modifier_ids:
@@ -361,6 +356,7 @@ async def add_product(
 
     session.add(product)
     await session.commit()
+    menu_cache.invalidate()
     return RedirectResponse(url="/admin/products", status_code=303)
 
 @router.get("/admin/edit_product/{product_id}", response_class=HTMLResponse)
@@ -369,7 +365,7 @@ async def get_edit_product_form(
     session: AsyncSession = Depends(get_db_session), 
     username: str = Depends(check_credentials)
 ):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     # Завантажуємо продукт разом з його модифікаторами
     product = await session.get(Product, product_id, options=[selectinload(Product.modifiers)])
     if not product: 
@@ -477,12 +473,16 @@ async def edit_product(
     if not product: 
         raise HTTPException(status_code=404, detail="Товар не знайдено")
 
+    is_renamed = product.name != name
     product.name = name
     product.price = price
     product.description = description
     product.category_id = category_id
     product.production_warehouse_id = production_warehouse_id
 
+    if is_renamed or not product.slug:
+        await assign_product_slug(session, product)
+
     # Оновлюємо список модифікаторів
     if modifier_ids:
         modifiers = (await session.execute(select(Modifier).where(Modifier.id.in_(modifier_ids)))).scalars().all()
@@ -492,31 +492,16 @@ async def edit_product(
 
     # --- ОНОВЛЕННЯ ФОТО З ОПТИМІЗАЦІЄЮ ---
     if image and image.filename:
-        # Видаляємо старе фото
-        if product.image_url and os.path.exists(product.image_url):
-            try: 
-                os.remove(product.image_url)
-            except OSError: 
-                pass
+        old_image_url, old_variants = product.image_url, product.image_variants
         
         try:
-            # Читаємо та оптимізуємо
+            # Читаємо та робимо набір ширин/форматів для srcset (у пулі процесів)
             file_bytes = await image.read()
-            img = Image.open(io.BytesIO(file_bytes))
-            
-            img.thumbnail(IMG_MAX_SIZE)
-            
-            output = io.BytesIO()
-            img.save(output, format="WEBP", quality=IMG_QUALITY, optimize=True)
-            output.seek(0)
-            
-            filename = f"{secrets.token_hex(8)}.webp"
-            path = os.path.join("static/images", filename)
-            
-            async with aiofiles.open(path, 'wb') as f: 
-                await f.write(output.read())
-            
-            product.image_url = path
+            product.image_url, product.image_variants = await image_ingest.process(file_bytes, PRODUCT_WIDTHS)
+        except ImageRejected as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ImageIngestBusy as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             logger.error(f"Не вдалося оптимізувати/зберегти нове зображення: {e}")
             try:
@@ -527,9 +512,15 @@ async def edit_product(
                 async with aiofiles.open(path, 'wb') as f: 
                     await f.write(await image.read())
                 product.image_url = path
+                product.image_variants = None
             except: pass
 
+        # Видаляємо старе фото разом з похідними (нове вже збережене)
+        if product.image_url != old_image_url:
+            remove_image_files(old_image_url, old_variants)
+
     await session.commit()
+    menu_cache.invalidate()
     return RedirectResponse(url="/admin/products", status_code=303)
 
 @router.get("/admin/product/toggle_active/{product_id}")
@@ -542,6 +533,7 @@ async def toggle_product_active(
     if product:
         product.is_active = not product.is_active
         await session.commit()
+        menu_cache.invalidate()
     return RedirectResponse(url="/admin/products", status_code=303)
 
 @router.get("/admin/delete_product/{product_id}")
@@ -553,14 +545,12 @@ async def delete_product(
     product = await session.get(Product, product_id)
     if product:
         image_to_delete = product.image_url
+        variants_to_delete = product.image_variants
         await session.delete(product)
         await session.commit()
+        menu_cache.invalidate()
         
-        if image_to_delete and os.path.exists(image_to_delete):
-            try: 
-                os.remove(image_to_delete)
-            except OSError: 
-                pass
+        remove_image_files(image_to_delete, variants_to_delete)
                 
     return RedirectResponse(url="/admin/products", status_code=303)
 
@@ -572,7 +562,7 @@ async def admin_modifiers(
     username: str = Depends(check_credentials)
 ):
     """Список модифікаторів з можливістю додавання/редагування."""
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     # Отримуємо всі модифікатори
     modifiers_res = await session.execute(select(Modifier).order_by(Modifier.name))
@@ -658,6 +648,7 @@ async def add_modifier(
     mod = Modifier(name=name, price=price)
     session.add(mod)
     await session.commit()
+    menu_cache.invalidate()
     return RedirectResponse(url="/admin/modifiers", status_code=303)
 
 @router.get("/admin/modifiers/edit/{modifier_id}", response_class=HTMLResponse)
@@ -666,7 +657,7 @@ async def get_edit_modifier_form(
     session: AsyncSession = Depends(get_db_session),
     username: str = Depends(check_credentials)
 ):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     mod = await session.get(Modifier, modifier_id)
     if not mod: raise HTTPException(404, "Not found")
     
@@ -710,6 +701,7 @@ async def edit_modifier(
         mod.name = name
         mod.price = price
         await session.commit()
+        menu_cache.invalidate()
     return RedirectResponse(url="/admin/modifiers", status_code=303)
 
 @router.get("/admin/modifiers/delete/{modifier_id}")
@@ -724,6 +716,7 @@ async def delete_modifier(
         await session.execute(product_modifier_association.delete().where(product_modifier_association.c.modifier_id == modifier_id))
         await session.delete(mod)
         await session.commit()
+        menu_cache.invalidate()
     return RedirectResponse(url="/admin/modifiers", status_code=303)
 
 @router.get("/api/admin/products", response_class=JSONResponse)
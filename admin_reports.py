@@ -12,12 +12,15 @@ from sqlalchemy import select, func, and_, case, desc
 from sqlalchemy.orm import joinedload
 
 # Импортируем все необходимые модели, включая CashShift
-from models import Order, OrderStatus, CashTransaction, Employee, OrderItem, Role, Settings, CashShift
+from models import Order, CashTransaction, Employee, OrderItem, Role, CashShift
+from settings_cache import settings_cache
+from status_registry import status_registry
+from order_loading import ORDER_REPORT_ROW, ORDER_REPORT_ROW_WITH_ITEMS
 from templates import (
     ADMIN_HTML_TEMPLATE, ADMIN_REPORT_CASH_FLOW_BODY, 
     ADMIN_REPORT_WORKERS_BODY, ADMIN_REPORT_ANALYTICS_BODY
 )
-from dependencies import get_db_session, check_credentials
+from dependencies import get_read_db_session, check_credentials
 
 router = APIRouter()
 
@@ -38,17 +41,16 @@ async def get_date_range(date_from_str: str | None, date_to_str: str | None):
 async def report_cash_flow(
     date_from: str = Query(None),
     date_to: str = Query(None),
-    session: AsyncSession = Depends(get_db_session),
+    session: AsyncSession = Depends(get_read_db_session),
     username: str = Depends(check_credentials)
 ):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     d_from, d_to, dt_from, dt_to = await get_date_range(date_from, date_to)
 
-    completed_statuses = await session.execute(select(OrderStatus.id).where(OrderStatus.is_completed_status == True))
-    completed_ids = completed_statuses.scalars().all()
+    completed_ids = (await status_registry.get(session)).completed_ids
 
-    # Получаем все оплаченные заказы вместе с позициями (items подгрузятся благодаря lazy='selectin' в models)
-    orders_query = select(Order).where(
+    # Получаем все оплаченные заказы вместе с позициями (без истории и логов)
+    orders_query = select(Order).options(*ORDER_REPORT_ROW_WITH_ITEMS).where(
         Order.created_at >= dt_from,
         Order.created_at <= dt_to,
         Order.status_id.in_(completed_ids)
@@ -146,10 +148,9 @@ async def report_cash_flow(
         """
 
     # Таблица отмененных заказов (Прозрачность)
-    cancelled_statuses = await session.execute(select(OrderStatus.id).where(OrderStatus.is_cancelled_status == True))
-    canc_ids = cancelled_statuses.scalars().all()
+    canc_ids = (await status_registry.get(session)).cancelled_ids
     
-    canc_query = select(Order).where(
+    canc_query = select(Order).options(*ORDER_REPORT_ROW).where(
         Order.created_at >= dt_from,
         Order.created_at <= dt_to,
         Order.status_id.in_(canc_ids)
@@ -208,15 +209,14 @@ async def report_cash_flow(
 async def export_cash_flow_csv(
     date_from: str = Query(None),
     date_to: str = Query(None),
-    session: AsyncSession = Depends(get_db_session),
+    session: AsyncSession = Depends(get_read_db_session),
     username: str = Depends(check_credentials)
 ):
     d_from, d_to, dt_from, dt_to = await get_date_range(date_from, date_to)
     
-    completed_statuses = await session.execute(select(OrderStatus.id).where(OrderStatus.is_completed_status == True))
-    completed_ids = completed_statuses.scalars().all()
+    completed_ids = (await status_registry.get(session)).completed_ids
 
-    orders_query = select(Order).where(
+    orders_query = select(Order).options(*ORDER_REPORT_ROW_WITH_ITEMS).where(
         Order.created_at >= dt_from,
         Order.created_at <= dt_to,
         Order.status_id.in_(completed_ids)
@@ -264,14 +264,13 @@ async def export_cash_flow_csv(
 async def report_workers(
     date_from: str = Query(None),
     date_to: str = Query(None),
-    session: AsyncSession = Depends(get_db_session),
+    session: AsyncSession = Depends(get_read_db_session),
     username: str = Depends(check_credentials)
 ):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     d_from, d_to, dt_from, dt_to = await get_date_range(date_from, date_to)
     
-    completed_statuses = await session.execute(select(OrderStatus.id).where(OrderStatus.is_completed_status == True))
-    completed_ids = completed_statuses.scalars().all()
+    completed_ids = (await status_registry.get(session)).completed_ids
 
     # Курьеры
     courier_stats = await session.execute(
@@ -349,14 +348,13 @@ async def report_workers(
 async def report_analytics(
     date_from: str = Query(None),
     date_to: str = Query(None),
-    session: AsyncSession = Depends(get_db_session),
+    session: AsyncSession = Depends(get_read_db_session),
     username: str = Depends(check_credentials)
 ):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     d_from, d_to, dt_from, dt_to = await get_date_range(date_from, date_to)
     
-    completed_statuses = await session.execute(select(OrderStatus.id).where(OrderStatus.is_completed_status == True))
-    completed_ids = completed_statuses.scalars().all()
+    completed_ids = (await status_registry.get(session)).completed_ids
 
     query = select(
         OrderItem.product_name,
@@ -416,16 +414,15 @@ async def report_analytics(
 async def report_couriers(
     date_from: str = Query(None),
     date_to: str = Query(None),
-    session: AsyncSession = Depends(get_db_session),
+    session: AsyncSession = Depends(get_read_db_session),
     username: str = Depends(check_credentials)
 ):
     """Расширенный отчет по эффективности курьеров."""
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     d_from, d_to, dt_from, dt_to = await get_date_range(date_from, date_to)
     
     # Только завершенные заказы
-    completed_statuses = await session.execute(select(OrderStatus.id).where(OrderStatus.is_completed_status == True))
-    completed_ids = completed_statuses.scalars().all()
+    completed_ids = (await status_registry.get(session)).completed_ids
 
     # Запрос с разбивкой по методам оплаты (Cash vs Card) и общим итогам
     query = select(
@@ -9,7 +9,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 
-from models import OrderStatus, Settings
+from models import OrderStatus
+from settings_cache import settings_cache
+from status_registry import status_registry
 from templates import ADMIN_HTML_TEMPLATE
 from dependencies import get_db_session, check_credentials
 
@@ -27,7 +29,7 @@ async def admin_statuses(
     username: str = Depends(check_credentials)
 ):
     """Відображає сторінку управління статусами замовлень."""
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     # Завантажуємо статуси
     statuses_res = await session.execute(select(OrderStatus).order_by(OrderStatus.id))
@@ -262,6 +264,7 @@ async def add_status(
         is_cancelled_status=is_cancelled_status
     ))
     await session.commit()
+    status_registry.invalidate()
     return RedirectResponse(url="/admin/statuses", status_code=303)
 
 @router.post("/admin/edit_status/{status_id}")
@@ -280,6 +283,7 @@ async def edit_status(
         elif field: 
             setattr(status, field, value.lower() == 'true')
         await session.commit()
+        status_registry.invalidate()
     return RedirectResponse(url="/admin/statuses", status_code=303)
 
 @router.get("/admin/delete_status/{status_id}")
@@ -299,6 +303,7 @@ async def delete_status(
     try: 
         await session.delete(status)
         await session.commit()
+        status_registry.invalidate()
     except IntegrityError: 
         return RedirectResponse(url="/admin/statuses?error=in_use", status_code=303)
             
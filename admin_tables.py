@@ -10,7 +10,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
-from models import Table, Employee, Role, Settings
+from models import Table, Employee, Role
+from settings_cache import settings_cache
+from staff_roster import staff_roster
 from templates import ADMIN_HTML_TEMPLATE, ADMIN_TABLES_BODY
 from dependencies import get_db_session, check_credentials
 
@@ -23,7 +25,7 @@ async def admin_tables_list(
     username: str = Depends(check_credentials)
 ):
     """Відображає сторінку управління столиками."""
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     tables_res = await session.execute(
         select(Table).options(
@@ -32,19 +34,9 @@ async def admin_tables_list(
     )
     tables = tables_res.scalars().all()
 
-    # Отримуємо ID всіх ролей, які можуть обслуговувати столики
-    waiter_roles_res = await session.execute(select(Role.id).where(Role.can_serve_tables == True))
-    waiter_role_ids = waiter_roles_res.scalars().all()
-
-    waiters_on_shift = []
-    if waiter_role_ids:
-        waiters_res = await session.execute(
-            select(Employee).where(
-                Employee.role_id.in_(waiter_role_ids),
-                Employee.is_on_shift == True
-            ).order_by(Employee.full_name)
-        )
-        waiters_on_shift = [{"id": w.id, "full_name": w.full_name} for w in waiters_res.scalars().all()]
+    # Офіціанти на зміні (ролі з can_serve_tables) - з кешу складу зміни
+    roster = await staff_roster.get(session)
+    waiters_on_shift = [{"id": w.id, "full_name": w.full_name} for w in roster.on_shift("waiter")]
 
     waiters_json = json.dumps(waiters_on_shift)
 
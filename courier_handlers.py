@@ -10,7 +10,7 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 from aiogram.filters import CommandStart
 from aiogram.exceptions import TelegramBadRequest
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_
+from sqlalchemy import select
 from sqlalchemy.orm import joinedload, selectinload
 from typing import Dict, Any, Optional, List
 from urllib.parse import quote_plus
@@ -23,6 +23,8 @@ from models import Employee, Order, OrderStatus, Settings, OrderStatusHistory, T
 # Импорт модификаторов
 from inventory_models import Modifier
 from notification_manager import notify_new_order_to_staff, notify_all_parties_on_status_change, notify_station_completion
+from staff_roster import staff_roster
+from status_registry import status_registry
 from cash_service import link_order_to_shift, register_employee_debt
 
 logger = logging.getLogger(__name__)
@@ -196,10 +198,7 @@ async def show_courier_orders(message_or_callback: Message | CallbackQuery, sess
     if not employee or not employee.role.can_be_assigned:
          return await message.answer("❌ У вас немає прав кур'єра.")
 
-    final_statuses_res = await session.execute(
-        select(OrderStatus.id).where(or_(OrderStatus.is_completed_status == True, OrderStatus.is_cancelled_status == True))
-    )
-    final_status_ids = final_statuses_res.scalars().all()
+    final_status_ids = (await status_registry.get(session)).final_ids
 
     orders_res = await session.execute(
         select(Order).options(joinedload(Order.status)).where(
@@ -396,6 +395,7 @@ def register_courier_handlers(dp_admin: Dispatcher):
         if is_allowed:
             employee.telegram_user_id = message.from_user.id
             await session.commit()
+            staff_roster.invalidate()
             await state.clear()
             
             keyboard = get_staff_keyboard(employee)
@@ -419,6 +419,7 @@ def register_courier_handlers(dp_admin: Dispatcher):
         
         employee.is_on_shift = is_start
         await session.commit()
+        staff_roster.invalidate()
         
         action = "почали" if is_start else "завершили"
         
@@ -443,6 +444,7 @@ def register_courier_handlers(dp_admin: Dispatcher):
             employee.telegram_user_id = None
             employee.is_on_shift = False
             await session.commit()
+            staff_roster.invalidate()
             await message.answer("👋 Ви вийшли з системи.", reply_markup=get_staff_login_keyboard())
         else:
             await message.answer("❌ Ви не авторизовані.")
@@ -670,8 +672,7 @@ def register_courier_handlers(dp_admin: Dispatcher):
         table = await session.get(Table, table_id)
         if not table: return await callback.answer("Столик не знайдено!", show_alert=True)
 
-        final_statuses_res = await session.execute(select(OrderStatus.id).where(or_(OrderStatus.is_completed_status == True, OrderStatus.is_cancelled_status == True)))
-        final_statuses = final_statuses_res.scalars().all()
+        final_statuses = (await status_registry.get(session)).final_ids
         
         active_orders_res = await session.execute(select(Order).where(Order.table_id == table_id, Order.status_id.not_in(final_statuses)).options(joinedload(Order.status)))
         active_orders = active_orders_res.scalars().all()
@@ -727,7 +728,7 @@ def register_courier_handlers(dp_admin: Dispatcher):
         # ЛОГ ПРИЙНЯТТЯ
         session.add(OrderLog(order_id=order.id, message=f"Офіціант прийняв замовлення", actor=employee.full_name))
 
-        processing_status = await session.scalar(select(OrderStatus).where(OrderStatus.name == "В обробці").limit(1))
+        processing_status = (await status_registry.get(session)).named("В обробці")
         if processing_status:
             order.status_id = processing_status.id
             session.add(OrderStatusHistory(order_id=order.id, status_id=processing_status.id, actor_info=f"Офіціант: {employee.full_name}"))
@@ -1018,7 +1019,7 @@ def register_courier_handlers(dp_admin: Dispatcher):
         if not items_to_create:
              return await callback.answer("Помилка: товари не знайдено.", show_alert=True)
         
-        new_status = await session.scalar(select(OrderStatus).where(OrderStatus.name == "Новий").limit(1))
+        new_status = (await status_registry.get(session)).named("Новий")
         status_id = new_status.id if new_status else 1
 
         order = Order(
@@ -0,0 +1,125 @@
+# db_pool.py
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+logger = logging.getLogger(__name__)
+
+# Один пул обслуговує HTTP, обидва aiogram-диспетчери та WebSocket
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+# Перевідкривати з'єднання старші за N секунд (обриви з боку PgBouncer / хостингу)
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Кеш prepared statements asyncpg; за PgBouncer у transaction-режимі потрібно 0
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "100"))
+# Як часто писати стан пулу в лог (0 - не писати)
+DB_POOL_LOG_SECONDS = float(os.environ.get("DB_POOL_LOG_SECONDS", "60"))
+# Скільки останніх checkout зберігати для перцентилів
+WAIT_SAMPLES = 1000
+
+
+class PoolMetrics:
+    """Лічильники checkout: скільки разів, скільки чекали, скільки разів впали по таймауту."""
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.max_wait = 0.0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+
+    def record(self, wait: float, timed_out: bool = False):
+        if timed_out:
+            self.timeouts += 1
+        else:
+            self.checkouts += 1
+        self._waits.append(wait)
+        self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self, pool) -> dict:
+        waits = sorted(self._waits)
+        p50 = waits[len(waits) // 2] if waits else 0.0
+        p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+        data = {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_ms_p50": round(p50 * 1000, 2),
+            "wait_ms_p95": round(p95 * 1000, 2),
+            "wait_ms_max": round(self.max_wait * 1000, 2),
+        }
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            data.update({
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                # overflow() рахує від -pool_size, поки пул не заповнений
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+            })
+        return data
+
+
+# Глобальні екземпляри: основна БД та репліка для звітів (read_replica.py)
+pool_metrics = PoolMetrics()
+replica_pool_metrics = PoolMetrics()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, що міряє час видачі з'єднання (очікування в черзі + pre-ping)."""
+    metrics = pool_metrics
+    # Логи пулу лишаються під "sqlalchemy.pool" (за замовчуванням WARNING), а не "db_pool"
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.AsyncAdaptedQueuePool"
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - started)
+        return connection
+
+
+class ReplicaTimedQueuePool(TimedQueuePool):
+    metrics = replica_pool_metrics
+
+
+def engine_options(database_url: str) -> dict:
+    """Параметри create_async_engine з оточення."""
+    options = {
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    if ":memory:" in database_url:
+        # SQLite в пам'яті - одне з'єднання, розміри пулу не застосовуються
+        return options
+
+    options.update({
+        "poolclass": TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    })
+    if "+asyncpg" in database_url:
+        options["connect_args"] = {
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        }
+    return options
+
+
+async def run_pool_log_loop(engine):
+    """Періодично пише стан пулу в лог (запускається з lifespan)."""
+    if DB_POOL_LOG_SECONDS <= 0:
+        return
+    while True:
+        await asyncio.sleep(DB_POOL_LOG_SECONDS)
+        stats = pool_metrics.snapshot(engine.pool)
+        logger.info("DB pool: " + ", ".join(f"{key}={value}" for key, value in stats.items()))
@@ -8,6 +8,7 @@ from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models import async_session_maker
+from read_replica import replica_router
 
 security = HTTPBasic()
 
@@ -38,4 +39,13 @@ def check_credentials(credentials: HTTPBasicCredentials = Depends(security)):
 async def get_db_session() -> Generator[AsyncSession, None, None]:
     """Створює та надає сесію бази даних для ендпоінта."""
     async with async_session_maker() as session:
+        yield session
+
+async def get_read_db_session() -> Generator[AsyncSession, None, None]:
+    """
+    Сесія лише для читання (звіти, експорти): репліка, якщо вона налаштована
+    і не відстає, інакше - основна БД. Нічого не записувати через цю сесію.
+    """
+    session_maker = await replica_router.session_maker()
+    async with session_maker() as session:
         yield session
\ No newline at end of file
@@ -0,0 +1,159 @@
+# http_cache.py
+
+import asyncio
+import gzip
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli не обов'язковий: без нього віддаємо тільки gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Відповіді, менші за цей розмір, не стискаємо
+MIN_COMPRESS_SIZE = 1024
+
+
+class ContentVersion:
+    """
+    Лічильник версії контенту сайту (налаштування, банери, popup, інфо-сторінки).
+    Збільшується після кожного збереження в адмінці.
+    """
+    def __init__(self):
+        # Стартуємо з мітки часу (мс), щоб версії не повторювались після рестарту
+        self._version: int = int(time.time() * 1000)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def bump(self):
+        self._version += 1
+
+
+# Глобальний екземпляр: все, що впливає на вітрину, але не є меню
+site_content = ContentVersion()
+
+
+def make_etag(*parts) -> str:
+    """Строгий ETag з довільних частин (версії, шлях, параметри)."""
+    raw = "|".join(str(p) for p in parts)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Перевіряє заголовок If-None-Match (підтримує список тегів, W/ та *)."""
+    header: Optional[str] = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        # Стиснуті варіанти мають тег виду "<hash>-br" / "<hash>-gzip"
+        for encoding in ("-br\"", "-gzip\""):
+            if candidate.endswith(encoding):
+                candidate = candidate[:-len(encoding)] + '"'
+        if candidate == etag:
+            return True
+    return False
+
+
+def cache_headers(etag: str, private: bool = False) -> dict:
+    """Заголовки для відповіді, яку клієнт повинен ревалідувати при кожному запиті."""
+    return {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache" if private else "no-cache"
+    }
+
+
+def not_modified_response(etag: str, private: bool = False) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, private))
+
+
+def _accepted_encodings(request: Request) -> set:
+    """Кодування з Accept-Encoding, які клієнт приймає (q > 0)."""
+    accepted = set()
+    for item in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            accepted.add(name)
+    return accepted
+
+
+def _compress(body: bytes) -> Dict[str, bytes]:
+    variants = {"gzip": gzip.compress(body, compresslevel=9)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=11)
+    return variants
+
+
+class CompressedEntry:
+    """Тіло відповіді разом з заздалегідь стиснутими варіантами."""
+    def __init__(self, body: bytes, media_type: str, variants: Dict[str, bytes]):
+        self.body = body
+        self.media_type = media_type
+        self.variants = variants
+
+
+class CompressedResponseCache:
+    """
+    LRU-кеш готових відповідей (identity + gzip + br) за ключем ETag.
+    ETag вже містить версії контенту, тому після змін у адмінці
+    старі записи просто витісняються, а не інвалідуються вручну.
+    """
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CompressedEntry]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[CompressedEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    async def put(self, key: str, body: bytes, media_type: str) -> CompressedEntry:
+        variants = {}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            # Стискаємо один раз на версію, поза event loop
+            variants = await asyncio.to_thread(_compress, body)
+        entry = CompressedEntry(body, media_type, variants)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def response(self, request: Request, entry: CompressedEntry, etag: str, private: bool = False) -> Response:
+        headers = cache_headers(etag, private)
+        headers["Vary"] = "Accept-Encoding"
+        accepted = _accepted_encodings(request)
+        for encoding in ("br", "gzip"):
+            if encoding in entry.variants and encoding in accepted:
+                headers["Content-Encoding"] = encoding
+                headers["ETag"] = etag[:-1] + f'-{encoding}"'
+                return Response(content=entry.variants[encoding], media_type=entry.media_type, headers=headers)
+        return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+
+# Глобальний екземпляр: вітрина (SSR) та /api/menu
+compressed_responses = CompressedResponseCache()
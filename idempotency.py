@@ -0,0 +1,116 @@
+# idempotency.py
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import IdempotencyKey, async_session_maker
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 200
+# Скільки зберігаємо відповіді (клієнт повторює запит протягом секунд/хвилин)
+IDEMPOTENCY_TTL = timedelta(hours=int(os.environ.get("IDEMPOTENCY_TTL_HOURS", "24")))
+CLEANUP_INTERVAL_SECONDS = 3600
+
+
+def get_idempotency_key(request: Request, scope: str) -> Optional[str]:
+    """Ключ з заголовка у вигляді "<scope>:<ключ>" (None, якщо клієнт його не передав)."""
+    raw_key = (request.headers.get(IDEMPOTENCY_HEADER) or "").strip()
+    if not raw_key:
+        return None
+    if len(raw_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} задовгий.")
+    return f"{scope}:{raw_key}"
+
+
+def request_hash(payload: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def _replay_response(record: IdempotencyKey) -> JSONResponse:
+    return JSONResponse(
+        content=record.response_body,
+        status_code=record.response_status,
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+
+async def find_response(session: AsyncSession, key: Optional[str], payload: Any) -> Optional[JSONResponse]:
+    """
+    Якщо запит з цим ключем вже виконано - повертає збережену відповідь.
+    Той самий ключ з іншим тілом запиту - 422.
+    """
+    if not key:
+        return None
+
+    record = await session.get(IdempotencyKey, key)
+    if record is None:
+        return None
+
+    if record.created_at and record.created_at < datetime.now() - IDEMPOTENCY_TTL:
+        # Прострочений запис - звільняємо ключ (видалиться разом з новим записом)
+        await session.delete(record)
+        return None
+
+    if record.request_hash != request_hash(payload):
+        raise HTTPException(status_code=422, detail=f"{IDEMPOTENCY_HEADER} вже використано для іншого запиту.")
+    return _replay_response(record)
+
+
+def save_response(session: AsyncSession, key: Optional[str], payload: Any, body: dict,
+                  order_id: Optional[int] = None, status_code: int = 200):
+    """
+    Додає відповідь у сесію викликача: зберігається тим самим commit, що й замовлення.
+    Два паралельні повтори не створять двох замовлень - другий commit впаде на PK ключа.
+    """
+    if not key:
+        return
+    session.add(IdempotencyKey(
+        key=key, request_hash=request_hash(payload), order_id=order_id,
+        response_status=status_code, response_body=body
+    ))
+
+
+async def replay_after_conflict(session: AsyncSession, key: str, payload: Any) -> JSONResponse:
+    """Паралельний запит з тим самим ключем встиг першим: віддаємо його відповідь."""
+    await session.rollback()
+    response = await find_response(session, key, payload)
+    if response is None:
+        raise HTTPException(status_code=409, detail="Запит з цим ключем ще обробляється.")
+    return response
+
+
+async def purge_expired_keys() -> int:
+    async with async_session_maker() as session:
+        result = await session.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.created_at < datetime.now() - IDEMPOTENCY_TTL)
+        )
+        await session.commit()
+        return result.rowcount or 0
+
+
+async def run_cleanup_loop():
+    """Фонове прибирання прострочених ключів (запускається з lifespan)."""
+    while True:
+        try:
+            removed = await purge_expired_keys()
+            if removed:
+                logger.info(f"Idempotency: видалено {removed} прострочених ключів")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Помилка очищення idempotency_keys: {e}")
+        await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
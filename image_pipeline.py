@@ -0,0 +1,189 @@
+# image_pipeline.py
+
+import asyncio
+import io
+import logging
+import os
+import secrets
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+IMAGES_DIR = "static/images"
+IMG_QUALITY = 80
+
+# Ліміти для завантажень
+MAX_UPLOAD_BYTES = int(os.environ.get("IMAGE_MAX_UPLOAD_MB", "15")) * 1024 * 1024
+MAX_PIXELS = int(os.environ.get("IMAGE_MAX_MEGAPIXELS", "40")) * 1_000_000
+# Захист Pillow від "бомб" - з тим самим лімітом (за замовчуванням ~179 Мп і лише попередження)
+Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+
+# Пул процесів для Pillow
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+IMAGE_QUEUE_SIZE = int(os.environ.get("IMAGE_QUEUE_SIZE", "8"))
+IMAGE_QUEUE_TIMEOUT = 30
+
+# Ширини похідних зображень (px). Найбільша - основне фото (image_url)
+PRODUCT_WIDTHS = (320, 480, 800)
+BANNER_WIDTHS = (640, 1024, 1600)
+HEADER_WIDTHS = (640, 1024, 1600)
+
+# Підказки браузеру, яку ширину картинка займе на екрані
+PRODUCT_SIZES = "(max-width: 600px) 100vw, (max-width: 1200px) 50vw, 300px"
+BANNER_SIZES = "(max-width: 1200px) 100vw, 1200px"
+
+# AVIF - тільки якщо Pillow зібраний з його підтримкою
+try:
+    AVIF_SUPPORTED = features.check("avif")
+except ValueError:
+    AVIF_SUPPORTED = False
+
+FORMATS = ("avif", "webp") if AVIF_SUPPORTED else ("webp",)
+FORMAT_SAVE_OPTIONS = {
+    "webp": {"format": "WEBP", "quality": IMG_QUALITY, "optimize": True},
+    "avif": {"format": "AVIF", "quality": 60},
+}
+
+
+class ImageRejected(ValueError):
+    """Файл не пройшов ліміти (розмір/кількість пікселів) - оригінал не зберігаємо."""
+
+
+class ImageIngestBusy(RuntimeError):
+    """Черга обробки зображень переповнена."""
+
+
+def process_image(data: bytes, widths: Tuple[int, ...], prefix: str = "") -> Tuple[str, Dict[str, Dict[str, str]]]:
+    """
+    Створює набір похідних (ширини x формати) з завантаженого файлу.
+    Повертає (image_url, variants), де image_url - найбільший WebP,
+    а variants = {"webp": {"320": "static/images/..."}, "avif": {...}}.
+    Синхронна функція (Pillow), блокує потік - з обробників викликати через image_ingest.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            img = Image.open(io.BytesIO(data))
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+        raise ImageRejected(f"Зображення завелике: {e}")
+    # Розміри відомі з заголовка, ще до декодування пікселів
+    if img.width * img.height > MAX_PIXELS:
+        raise ImageRejected(f"Зображення завелике: {img.width}x{img.height}")
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+    os.makedirs(IMAGES_DIR, exist_ok=True)
+    token = f"{prefix}{secrets.token_hex(8)}"
+
+    # Не збільшуємо: ширини, більші за оригінал, замінюються самим оригіналом
+    target_widths = sorted({min(w, img.width) for w in widths})
+
+    variants: Dict[str, Dict[str, str]] = {fmt: {} for fmt in FORMATS}
+    for width in target_widths:
+        height = max(1, round(img.height * width / img.width))
+        resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+        for fmt in FORMATS:
+            path = f"{IMAGES_DIR}/{token}-{width}w.{fmt}"
+            resized.save(path, **FORMAT_SAVE_OPTIONS[fmt])
+            variants[fmt][str(width)] = path
+
+    image_url = variants["webp"][str(target_widths[-1])]
+    return image_url, variants
+
+
+def remove_image_files(image_url: Optional[str], variants: Optional[dict] = None):
+    """Видаляє основне фото та всі його похідні з диска."""
+    paths = {image_url} if image_url else set()
+    for by_width in (variants or {}).values():
+        paths.update(by_width.values())
+    for path in paths:
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def variant_paths(variants: Optional[dict]) -> list:
+    return [path for by_width in (variants or {}).values() for path in by_width.values()]
+
+
+def build_srcset(variants: Optional[dict], fmt: str, url: Callable[[str], str] = lambda p: "/" + p) -> str:
+    """'/static/images/x-320w.webp 320w, /static/images/x-800w.webp 800w'"""
+    by_width = (variants or {}).get(fmt) or {}
+    return ", ".join(f"{url(path)} {width}w" for width, path in sorted(by_width.items(), key=lambda i: int(i[0])))
+
+
+def picture_html(img_src: str, webp_srcset: str, avif_srcset: str, sizes: str, img_attrs: str) -> str:
+    """<img> з srcset/sizes (і <picture> з AVIF, якщо є) для SSR."""
+    if not webp_srcset:
+        return f'<img src="{img_src}" {img_attrs}>'
+
+    img_tag = f'<img src="{img_src}" srcset="{webp_srcset}" sizes="{sizes}" {img_attrs}>'
+    if not avif_srcset:
+        return img_tag
+    return (
+        f'<picture style="display:contents">'
+        f'<source type="image/avif" srcset="{avif_srcset}" sizes="{sizes}">'
+        f'{img_tag}</picture>'
+    )
+
+
+def header_media_css(variants: Optional[dict]) -> str:
+    """CSS-медіазапити, що підміняють --header-img меншою версією на вузьких екранах."""
+    by_width = (variants or {}).get("webp") or {}
+    widths = sorted(int(w) for w in by_width)
+    rules = []
+    # Від найбільшої до найменшої, щоб вужчі правила перекривали ширші.
+    # Поріг - половина ширини файлу (екрани з щільністю 2x)
+    for width in reversed(widths[:-1]):
+        rules.append(
+            f"@media (max-width: {width // 2}px) {{ :root {{ --header-img: url('/{by_width[str(width)]}'); }} }}"
+        )
+    return "\n".join(rules)
+
+
+class ImageIngestService:
+    """
+    Обробка завантажених фото в пулі процесів, щоб Pillow не блокував event loop.
+    Кількість одночасних задач обмежена (черга IMAGE_QUEUE_SIZE), обробники
+    лише чекають результат через await.
+    """
+    def __init__(self, workers: int = IMAGE_WORKERS, queue_size: int = IMAGE_QUEUE_SIZE):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(queue_size)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def process(self, data: bytes, widths: Tuple[int, ...], prefix: str = "") -> Tuple[str, Dict[str, Dict[str, str]]]:
+        if len(data) > MAX_UPLOAD_BYTES:
+            raise ImageRejected(f"Файл завеликий: {len(data) // (1024 * 1024)} МБ")
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=IMAGE_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise ImageIngestBusy("Черга обробки зображень переповнена, спробуйте пізніше")
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), process_image, data, widths, prefix)
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Глобальний екземпляр
+image_ingest = ImageIngestService()
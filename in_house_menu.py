@@ -8,17 +8,24 @@ from decimal import Decimal
 from fastapi import APIRouter, Depends, HTTPException, Request, Body
 from fastapi.responses import HTMLResponse, JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_
+from sqlalchemy import select
 from sqlalchemy.orm import joinedload, selectinload
-from aiogram import Bot, html as aiogram_html
-from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardButton
+from sqlalchemy.exc import IntegrityError
+from aiogram import Bot
 from urllib.parse import quote_plus as url_quote_plus
 
 # Added MenuItem to imports
-from models import Table, Product, Category, Order, Settings, Employee, OrderStatusHistory, OrderStatus, OrderItem, MenuItem
+from models import Table, Product, Category, Order, Employee, OrderStatusHistory, OrderStatus, OrderItem, MenuItem
+from settings_cache import settings_cache
+from status_registry import status_registry
+from static_assets import static_assets
+from image_pipeline import build_srcset, header_media_css, PRODUCT_SIZES
 from dependencies import get_db_session
+from idempotency import get_idempotency_key, find_response, save_response, replay_after_conflict
 from templates import IN_HOUSE_MENU_HTML_TEMPLATE
-from notification_manager import distribute_order_to_production, create_staff_notification
+from notification_manager import create_staff_notifications, commit_staff_notifications
+from notification_outbox import enqueue_notification, notification_dispatcher
+from telegram_fanout import telegram_fanout
 
 # ДОДАНО: Імпорт менеджера WebSocket
 from websocket_manager import manager
@@ -38,7 +45,7 @@ async def get_in_house_menu(access_token: str, request: Request, session: AsyncS
     if not table:
         raise HTTPException(status_code=404, detail="Столик не знайдено.")
 
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     logo_html = f'<img src="/{settings.logo_url}" alt="Логотип" class="header-logo">' if settings and settings.logo_url else ''
 
     # Отримуємо меню, яке показується в ресторані
@@ -74,16 +81,14 @@ async def get_in_house_menu(access_token: str, request: Request, session: AsyncS
             "name": p.name, 
             "description": p.description, 
             "price": float(p.price), 
-            "image_url": p.image_url, 
+            "image_url": static_assets.fingerprint(p.image_url), 
+            "srcset": build_srcset(p.image_variants, "webp", static_assets.url),
             "category_id": p.category_id,
             "modifiers": mods_list
         })
 
     # Отримуємо історію неоплачених замовлень для цього столика
-    final_statuses_res = await session.execute(
-        select(OrderStatus.id).where(or_(OrderStatus.is_completed_status == True, OrderStatus.is_cancelled_status == True))
-    )
-    final_status_ids = final_statuses_res.scalars().all()
+    final_status_ids = (await status_registry.get(session)).final_ids
 
     active_orders_res = await session.execute(
         select(Order)
@@ -161,7 +166,7 @@ async def get_in_house_menu(access_token: str, request: Request, session: AsyncS
         [f'<a href="#" class="footer-link menu-popup-trigger" data-item-id="{item.id}"><i class="fa-solid fa-file-lines"></i> <span>{html_module.escape(item.title)}</span></a>' for item in menu_items]
     )
 
-    return HTMLResponse(content=IN_HOUSE_MENU_HTML_TEMPLATE.format(
+    page_html = IN_HOUSE_MENU_HTML_TEMPLATE.format(
         table_name=html_module.escape(table.name),
         table_id=table.id,
         logo_html=logo_html,
@@ -185,6 +190,8 @@ async def get_in_house_menu(access_token: str, request: Request, session: AsyncS
         category_nav_bg_color=category_nav_bg_color,
         category_nav_text_color=category_nav_text_color,
         header_image_url=header_image_url,
+        header_image_media_css=header_media_css(settings.header_image_variants),
+        product_image_sizes=PRODUCT_SIZES,
         wifi_ssid=wifi_ssid,
         wifi_password=wifi_password,
         
@@ -198,16 +205,14 @@ async def get_in_house_menu(access_token: str, request: Request, session: AsyncS
         working_hours=html_module.escape(settings.working_hours or ""),
         social_links_html=social_links_html,
         menu_links_html=menu_links_html
-    ))
+    )
+    return HTMLResponse(content=static_assets.rewrite_html(page_html))
 
 @router.get("/api/menu/table/{table_id}/updates", response_class=JSONResponse)
 async def get_table_updates(table_id: int, session: AsyncSession = Depends(get_db_session)):
     """Повертає актуальний статус замовлень для оновлення фронтенду."""
     
-    final_statuses_res = await session.execute(
-        select(OrderStatus.id).where(or_(OrderStatus.is_completed_status == True, OrderStatus.is_cancelled_status == True))
-    )
-    final_status_ids = final_statuses_res.scalars().all()
+    final_status_ids = (await status_registry.get(session)).final_ids
 
     active_orders_res = await session.execute(
         select(Order)
@@ -263,9 +268,8 @@ async def call_waiter(
     pwa_msg = f"🔔 Вас викликають до столика: {table.name}"
     
     # 1. PWA Notification (DB)
-    for w in waiters:
-        if w.is_on_shift:
-            await create_staff_notification(session, w.id, pwa_msg)
+    await create_staff_notifications(session, [w.id for w in waiters if w.is_on_shift], pwa_msg)
+    await commit_staff_notifications(session)
 
     # 2. WebSocket Broadcast (Миттєве сповіщення)
     await manager.broadcast_staff({
@@ -293,11 +297,7 @@ async def call_waiter(
             except ValueError: pass
 
     if target_chat_ids:
-        for chat_id in target_chat_ids:
-            try:
-                await admin_bot.send_message(chat_id, message_text)
-            except Exception as e:
-                logger.error(f"Не вдалося надіслати виклик офіціанта в чат {chat_id}: {e}")
+        await telegram_fanout.broadcast(admin_bot, target_chat_ids, message_text)
         return JSONResponse(content={"message": "Офіціанта сповіщено. Будь ласка, зачекайте."})
     else:
         return JSONResponse(content={"message": "Офіціанта сповіщено."})
@@ -313,10 +313,7 @@ async def request_bill(
     table = await session.get(Table, table_id, options=[selectinload(Table.assigned_waiters)])
     if not table: raise HTTPException(status_code=404, detail="Столик не знайдено.")
 
-    final_statuses_res = await session.execute(
-        select(OrderStatus.id).where(or_(OrderStatus.is_completed_status == True, OrderStatus.is_cancelled_status == True))
-    )
-    final_status_ids = final_statuses_res.scalars().all()
+    final_status_ids = (await status_registry.get(session)).final_ids
 
     active_orders_res = await session.execute(
         select(Order).where(Order.table_id == table.id, Order.status_id.not_in(final_status_ids))
@@ -333,10 +330,9 @@ async def request_bill(
 
     pwa_msg = f"💰 Просять рахунок ({method_text}): Стіл {table.name}. Сума: {total_bill} грн"
     
-    # 1. PWA Notification
-    for w in waiters:
-        if w.is_on_shift:
-            await create_staff_notification(session, w.id, pwa_msg)
+    # 1. PWA Notification 
+    await create_staff_notifications(session, [w.id for w in waiters if w.is_on_shift], pwa_msg)
+    await commit_staff_notifications(session)
 
     # 2. WebSocket Broadcast
     await manager.broadcast_staff({
@@ -364,10 +360,7 @@ async def request_bill(
             except ValueError: pass
 
     if target_chat_ids:
-        for chat_id in target_chat_ids:
-            try:
-                await admin_bot.send_message(chat_id, message_text)
-            except Exception: pass
+        await telegram_fanout.broadcast(admin_bot, target_chat_ids, message_text)
         return JSONResponse(content={"message": "Запит надіслано. Офіціант незабаром підійде з рахунком."})
     else:
         return JSONResponse(content={"message": "Запит надіслано."})
@@ -384,6 +377,12 @@ async def place_in_house_order(
     if not table: raise HTTPException(status_code=404, detail="Столик не знайдено.")
     if not items: raise HTTPException(status_code=400, detail="Замовлення порожнє.")
 
+    # Повтор запиту (ретрай з телефону гостя) - без другого замовлення та сповіщень
+    idempotency_key = get_idempotency_key(request, f"table_order:{table_id}")
+    replayed = await find_response(session, idempotency_key, items)
+    if replayed:
+        return replayed
+
     try:
         product_ids = [int(item.get('id')) for item in items if item.get('id') is not None]
     except (ValueError, TypeError):
@@ -395,7 +394,6 @@ async def place_in_house_order(
 
     total_price = Decimal('0.00')
     new_order_items = []
-    products_str_for_msg = []
 
     for item in items:
         pid = str(item.get('id'))
@@ -415,11 +413,6 @@ async def place_in_house_order(
             item_price = product.price + mods_price
             total_price += item_price * qty
             
-            mod_names = [m.get('name') for m in modifiers_data]
-            mod_str = f" (+ {', '.join(mod_names)})" if mod_names else ""
-            
-            products_str_for_msg.append(f"{product.name}{mod_str} x {qty}")
-            
             new_order_items.append(OrderItem(
                 product_id=product.id,
                 product_name=product.name,
@@ -445,22 +438,28 @@ async def place_in_house_order(
         items=new_order_items
     )
     session.add(order)
-    await session.commit()
-    await session.refresh(order)
-    await session.refresh(order, ['status'])
+    await session.flush()
 
-    # --- PWA NOTIFICATION ---
-    pwa_msg = f"📝 Нове замовлення #{order.id} (Стіл: {table.name}). Сума: {total_price} грн"
-    for w in table.assigned_waiters:
-        if w.is_on_shift:
-            await create_staff_notification(session, w.id, pwa_msg)
-
-    history_entry = OrderStatusHistory(
+    admin_bot = request.app.state.admin_bot
+    if admin_bot:
+        response_message = "Замовлення прийнято! Офіціант незабаром його підтвердить."
+    else:
+        response_message = "Замовлення прийнято! Очікуйте."
+    response_body = {"message": response_message, "order_id": order.id}
+    save_response(session, idempotency_key, items, response_body, order_id=order.id)
+    session.add(OrderStatusHistory(
         order_id=order.id, status_id=order.status_id,
         actor_info=f"Гість за столиком {table.name}"
-    )
-    session.add(history_entry)
-    await session.commit()
+    ))
+    # PWA/Telegram сповіщення - через outbox, тим самим commit
+    enqueue_notification(session, "table_order", order_id=order.id)
+    try:
+        await session.commit()
+    except IntegrityError:
+        if not idempotency_key:
+            raise
+        return await replay_after_conflict(session, idempotency_key, items)
+    notification_dispatcher.wake()
 
     # --- WEBSOCKET BROADCAST (Миттєве сповіщення персоналу) ---
     await manager.broadcast_staff({
@@ -469,58 +468,4 @@ async def place_in_house_order(
         "message": f"📝 Замовлення #{order.id} (Стіл: {table.name})"
     })
 
-    # --- Telegram сповіщення ---
-    products_display = "\n- ".join(products_str_for_msg)
-    order_details_text = (f"📝 <b>Нове замовлення зі столика: {aiogram_html.bold(table.name)} (ID: #{order.id})</b>\n\n"
-                          f"<b>Склад:</b>\n- {aiogram_html.quote(products_display)}\n\n"
-                          f"<b>Сума:</b> {total_price} грн")
-
-    admin_bot = request.app.state.admin_bot
-    
-    if not admin_bot:
-        return JSONResponse(content={"message": "Замовлення прийнято! Очікуйте.", "order_id": order.id})
-
-    kb_waiter = InlineKeyboardBuilder()
-    kb_waiter.row(InlineKeyboardButton(text="✅ Прийняти замовлення", callback_data=f"waiter_accept_order_{order.id}"))
-
-    kb_admin = InlineKeyboardBuilder()
-    kb_admin.row(InlineKeyboardButton(text="⚙️ Керувати (Адмін)", callback_data=f"waiter_manage_order_{order.id}"))
-
-    waiters = table.assigned_waiters
-    admin_chat_id_str = os.environ.get('ADMIN_CHAT_ID')
-    admin_chat_id = None
-    if admin_chat_id_str:
-        try: admin_chat_id = int(admin_chat_id_str)
-        except ValueError: pass
-
-    waiter_chat_ids = set()
-    for w in waiters:
-        if w.telegram_user_id and w.is_on_shift:
-            waiter_chat_ids.add(w.telegram_user_id)
-
-    if waiter_chat_ids:
-        for chat_id in waiter_chat_ids:
-            try:
-                await admin_bot.send_message(chat_id, order_details_text, reply_markup=kb_waiter.as_markup())
-            except Exception as e:
-                logger.error(f"Не вдалося надіслати нове замовлення офіціанту {chat_id}: {e}")
-
-        if admin_chat_id and admin_chat_id not in waiter_chat_ids:
-            try:
-                await admin_bot.send_message(admin_chat_id, "✅ " + order_details_text, reply_markup=kb_admin.as_markup())
-            except Exception: pass
-    else:
-        if admin_chat_id:
-            await admin_bot.send_message(
-                admin_chat_id,
-                f"❗️ <b>Замовлення з вільного столика {aiogram_html.bold(table.name)} (ID: #{order.id})!</b>\n\n" + order_details_text,
-                reply_markup=kb_admin.as_markup()
-            )
-
-    if order.status.requires_kitchen_notify:
-        try:
-            await distribute_order_to_production(admin_bot, order, session)
-        except Exception as e:
-            logger.error(f"Помилка при розподілі замовлення #{order.id}: {e}")
-        
-    return JSONResponse(content={"message": "Замовлення прийнято! Офіціант незабаром його підтвердить.", "order_id": order.id})
+    return JSONResponse(content=response_body)
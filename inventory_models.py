@@ -166,6 +166,11 @@ class Stock(Base):
     warehouse: Mapped["Warehouse"] = relationship("Warehouse", back_populates="stocks", foreign_keys=[warehouse_id])
     ingredient: Mapped["Ingredient"] = relationship("Ingredient", back_populates="stocks")
 
+    __table_args__ = (
+        # Один рядок залишку на пару склад+інгредієнт (get_stock шукає саме по ній)
+        sa.UniqueConstraint('warehouse_id', 'ingredient_id', name='uq_stocks_warehouse_ingredient'),
+    )
+
 class InventoryDoc(Base):
     """Документ движения (Накладная)"""
     __tablename__ = 'inventory_docs'
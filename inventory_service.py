@@ -5,6 +5,7 @@ from datetime import datetime
 from decimal import Decimal
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload, selectinload
 
 from inventory_models import (
@@ -29,9 +30,24 @@ async def get_stock(session: AsyncSession, warehouse_id: int, ingredient_id: int
     stock = res.scalars().first()
     
     if not stock:
-        stock = Stock(warehouse_id=warehouse_id, ingredient_id=ingredient_id, quantity=0)
-        session.add(stock)
+        # Паралельна транзакція могла вже створити рядок (унікальна пара склад+інгредієнт):
+        # вставка в savepoint, при конфлікті - перечитуємо існуючий з блокуванням.
+        # Інші зміни сесії скидаємо до savepoint: їхня IntegrityError не є конфліктом залишків
         await session.flush()
+        try:
+            async with session.begin_nested():
+                stock = Stock(warehouse_id=warehouse_id, ingredient_id=ingredient_id, quantity=0)
+                session.add(stock)
+        except IntegrityError:
+            res = await session.execute(
+                select(Stock)
+                .where(Stock.warehouse_id == warehouse_id, Stock.ingredient_id == ingredient_id)
+                .with_for_update()
+            )
+            stock = res.scalars().first()
+            if stock is None:
+                # Рядка немає - помилка не через паралельну вставку
+                raise
         
     return stock
 
@@ -95,9 +111,17 @@ async def calculate_order_prime_cost(session: AsyncSession, order_id: int) -> De
 
     return total_cost
 
+async def _finish(session: AsyncSession, commit: bool):
+    """commit=False - лише flush: зміни фіксує викликач разом зі своєю транзакцією."""
+    if commit:
+        await session.commit()
+    else:
+        await session.flush()
+
 async def process_movement(session: AsyncSession, doc_type: str, items: list, 
                            source_wh_id: int = None, target_wh_id: int = None, 
-                           supplier_id: int = None, comment: str = "", order_id: int = None):
+                           supplier_id: int = None, comment: str = "", order_id: int = None,
+                           commit: bool = True):
     """
     Універсальна функція для створення та проведення документа.
     items = [{'ingredient_id': 1, 'qty': 1.5, 'price': 100}, ...]
@@ -130,10 +154,10 @@ async def process_movement(session: AsyncSession, doc_type: str, items: list,
     await session.flush() # Зберігаємо і отримуємо ID для doc та items
 
     # Відразу проводимо документ
-    await apply_doc_stock_changes(session, doc.id)
+    await apply_doc_stock_changes(session, doc.id, commit=commit)
     return doc
 
-async def apply_doc_stock_changes(session: AsyncSession, doc_id: int):
+async def apply_doc_stock_changes(session: AsyncSession, doc_id: int, commit: bool = True):
     """
     Проводит документ: обновляет остатки на складах.
     """
@@ -149,7 +173,7 @@ async def apply_doc_stock_changes(session: AsyncSession, doc_id: int):
     if not doc.items:
         # Пустой документ помечаем как проведенный, чтобы не висел
         doc.is_processed = True
-        await session.commit()
+        await _finish(session, commit)
         return
 
     for item in doc.items:
@@ -203,12 +227,13 @@ async def apply_doc_stock_changes(session: AsyncSession, doc_id: int):
             stock.quantity -= qty
 
     doc.is_processed = True
-    await session.commit()
+    await _finish(session, commit)
 
-async def deduct_products_by_tech_card(session: AsyncSession, order: Order):
+async def deduct_products_by_tech_card(session: AsyncSession, order: Order, commit: bool = True):
     """
     Автоматическое списание продуктов (включая модификаторы) с соответствующих складов.
     Исправлена ошибка с удаленными товарами и отсутствующими складами.
+    commit=False - без commit, в транзакции викликача (зміна статусу замовлення).
     """
     if order.is_inventory_deducted:
         logger.info(f"Склад для замовлення #{order.id} вже був списаний раніше.")
@@ -217,7 +242,7 @@ async def deduct_products_by_tech_card(session: AsyncSession, order: Order):
     # Проверка на наличие позиций
     if not order.items: 
         order.is_inventory_deducted = True
-        await session.commit()
+        await _finish(session, commit)
         return
 
     # --- Fallback склад (первый попавшийся), если не указан цех ---
@@ -346,7 +371,7 @@ async def deduct_products_by_tech_card(session: AsyncSession, order: Order):
 
     # Если нечего списывать, просто сохраняем флаг
     if not deduction_items_by_wh:
-        await session.commit()
+        await _finish(session, commit)
         return
 
     # Создаем документы списания
@@ -356,21 +381,22 @@ async def deduct_products_by_tech_card(session: AsyncSession, order: Order):
                 session, 'deduction', items, 
                 source_wh_id=wh_id, 
                 comment=f"Замовлення #{order.id} (Авто-списання: {trigger})", 
-                order_id=order.id
+                order_id=order.id, commit=commit
             )
     
     logger.info(f"Списання продуктів для замовлення #{order.id} завершено успішно.")
 
-async def reverse_deduction(session: AsyncSession, order: Order):
+async def reverse_deduction(session: AsyncSession, order: Order, commit: bool = True):
     """
     Возврат продуктов на склад (при отмене заказа).
+    commit=False - без commit, в транзакції викликача.
     """
     if not order.is_inventory_deducted:
         return
 
     if not order.items:
         order.is_inventory_deducted = False
-        await session.commit()
+        await _finish(session, commit)
         return
 
     # Fallback склад
@@ -471,11 +497,11 @@ async def reverse_deduction(session: AsyncSession, order: Order):
                 session, 'return', items, 
                 target_wh_id=wh_id, # Повертаємо НА цей склад
                 comment=f"Повернення (Скасування) замовлення #{order.id}", 
-                order_id=order.id
+                order_id=order.id, commit=commit
             )
 
     order.is_inventory_deducted = False
-    await session.commit()
+    await _finish(session, commit)
     logger.info(f"Склад успішно повернуто для замовлення #{order.id}")
 
 async def generate_cook_ticket(session: AsyncSession, order_id: int) -> str:
@@ -11,14 +11,12 @@ import json
 import html
 from contextlib import asynccontextmanager
 from decimal import Decimal
-from datetime import datetime
 from typing import Dict, Any, Optional
 from urllib.parse import quote_plus as url_quote_plus
 
 # --- FastAPI & Uvicorn ---
 from fastapi import FastAPI, Form, Request, Depends, HTTPException, File, UploadFile, Body, Query, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, FileResponse, PlainTextResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
 import uvicorn
 # Виправлення для Windows: перемикання на ProactorEventLoop
 if sys.platform == 'win32':
@@ -70,6 +68,21 @@ from auth_utils import get_password_hash
 
 # Імпорт менеджера WebSocket
 from websocket_manager import manager
+# Кеш меню (знімок категорій/страв/модифікаторів)
+from menu_cache import menu_cache
+from settings_cache import settings_cache
+from sitemap_cache import sitemap_cache, site_base_url
+from product_cards import product_card_cache
+from order_intake import price_cart, insert_order
+from notification_outbox import enqueue_notification, notification_dispatcher
+from idempotency import get_idempotency_key, find_response, save_response, replay_after_conflict, run_cleanup_loop
+from migrate import pending_migrations
+from db_pool import pool_metrics, run_pool_log_loop
+from read_replica import replica_router
+from search import name_or_phone, dialect_of
+from static_assets import static_assets, FingerprintedStaticFiles
+from image_pipeline import image_ingest, picture_html, build_srcset, header_media_css, PRODUCT_SIZES, BANNER_SIZES
+from http_cache import site_content, make_etag, is_not_modified, not_modified_response, cache_headers, compressed_responses
 
 # --- ІМПОРТИ РОУТЕРІВ ---
 from admin_order_management import router as admin_order_router
@@ -105,27 +118,6 @@ def normalize_phone(phone: str) -> Optional[str]:
         
     return '+' + digits
 
-# --- ФУНКЦІЯ ТРАНСЛІТЕРАЦІЇ ДЛЯ SEO (SLUG) ---
-def transliterate_slug(text: str) -> str:
-    converter = {
-        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'h', 'ґ': 'g', 'д': 'd', 'е': 'e', 'є': 'ye', 
-        'ж': 'zh', 'з': 'z', 'и': 'y', 'і': 'i', 'ї': 'yi', 'й': 'y', 'к': 'k', 'л': 'l', 
-        'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 
-        'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ь': '', 
-        'ю': 'yu', 'я': 'ya', ' ': '-', "'": '', '’': ''
-    }
-    text = text.lower()
-    result = []
-    for char in text:
-        if char in converter:
-            result.append(converter[char])
-        elif re.match(r'[a-z0-9\-]', char):
-            result.append(char)
-    
-    res_str = "".join(result)
-    res_str = re.sub(r'-+', '-', res_str)
-    return res_str.strip('-')
-
 class CheckoutStates(StatesGroup):
     waiting_for_delivery_type = State()
     waiting_for_name = State()
@@ -185,7 +177,7 @@ async def handle_dynamic_menu_item(message: Message, session: AsyncSession):
 @dp.message(CommandStart())
 async def command_start_handler(message: Message, state: FSMContext, session: AsyncSession):
     await state.clear()
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     default_welcome = f"Шановний {{user_name}}, ласкаво просимо! 👋\n\nМи раді вас бачити. Оберіть опцію:"
     welcome_template = settings.telegram_welcome_message or default_welcome
     try:
@@ -230,7 +222,7 @@ async def back_to_start_menu(callback: CallbackQuery, state: FSMContext, session
     try: await callback.message.delete()
     except TelegramBadRequest: pass
 
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     default_welcome = f"Шановний {{user_name}}, ласкаво просимо! 👋\n\nМи раді вас бачити. Оберіть опцію:"
     welcome_template = settings.telegram_welcome_message or default_welcome
     try:
@@ -1037,8 +1029,11 @@ async def lifespan(app: FastAPI):
     os.makedirs("static/images", exist_ok=True)
     os.makedirs("static/favicons", exist_ok=True)
     
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # Схема змінюється окремою командою `python migrate.py` (перед стартом воркерів).
+    # Без неї запити впадуть на відсутніх колонках/таблицях - краще не стартувати зовсім
+    pending = await pending_migrations(engine)
+    if pending:
+        raise RuntimeError(f"Є незастосовані міграції ({', '.join(m.version for m in pending)}): запустіть python migrate.py")
     
     async with async_session_maker() as session:
         result_status = await session.execute(select(OrderStatus).limit(1))
@@ -1053,6 +1048,9 @@ async def lifespan(app: FastAPI):
             for name, props in default_statuses.items():
                 session.add(OrderStatus(name=name, **props))
 
+        if not await session.get(Settings, 1):
+            session.add(Settings(id=1))
+
         result_roles = await session.execute(select(Role).limit(1))
         if not result_roles.scalars().first():
             session.add(Role(name="Адміністратор", can_manage_orders=True, can_be_assigned=True, can_serve_tables=True, can_receive_kitchen_orders=True, can_receive_bar_orders=True))
@@ -1108,10 +1106,17 @@ async def lifespan(app: FastAPI):
 
     app.state.client_bot = client_bot
     app.state.admin_bot = admin_bot
+
+    idempotency_cleanup_task = asyncio.create_task(run_cleanup_loop())
+    pool_log_task = asyncio.create_task(run_pool_log_loop(engine))
+    notification_dispatcher.start(admin_bot, client_bot)
     
     yield
     
     logging.info("Зупинка додатка...")
+    idempotency_cleanup_task.cancel()
+    pool_log_task.cancel()
+    await notification_dispatcher.stop()
     if bot_task:
         bot_task.cancel()
         try:
@@ -1121,11 +1126,14 @@ async def lifespan(app: FastAPI):
     
     if client_bot: await client_bot.session.close()
     if admin_bot: await admin_bot.session.close()
+    image_ingest.shutdown()
+    await replica_router.dispose()
 
 
 app = FastAPI(lifespan=lifespan)
 os.makedirs("static", exist_ok=True)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Файли з хешем у назві (див. static_assets.py) віддаються з Cache-Control: immutable
+app.mount("/static", FingerprintedStaticFiles(directory="static"), name="static")
 
 # --- ДОДАНО 404 HANDLER З ПОВНИМ ДИЗАЙНОМ ---
 @app.exception_handler(404)
@@ -1178,7 +1186,7 @@ async def custom_404_handler(request: Request, exc):
     }
     
     return HTMLResponse(
-        content=HTML_404_TEMPLATE.format(**template_params), 
+        content=static_assets.rewrite_html(HTML_404_TEMPLATE.format(**template_params)), 
         status_code=404
     )
 # --------------------------------------
@@ -1233,52 +1241,33 @@ async def get_service_worker():
 # --- SEO: ROBOTS.TXT & SITEMAP.XML ---
 @app.get("/robots.txt", response_class=PlainTextResponse)
 async def robots_txt(request: Request):
-    base_url = str(request.base_url).rstrip("/")
+    base_url = site_base_url(request.base_url)
     # МИ ДОДАЛИ: Allow: /api/menu та Allow: /api/page/
     # Це дозволяє ботам читати публічні дані, але все ще блокує інші технічні API
     return f"User-agent: *\nAllow: /\nAllow: /api/menu\nAllow: /api/page/\nDisallow: /api\nDisallow: /admin\nSitemap: {base_url}/sitemap.xml"
 
-@app.get("/sitemap.xml", response_class=HTMLResponse)
+async def _sitemap_response(request: Request, session: AsyncSession, name: str):
+    base_url = site_base_url(request.base_url)
+    etag = make_etag("sitemap", name, menu_cache.version, base_url)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    # Знімок меню вже в пам'яті, XML перебудовується тільки після змін страв
+    menu = await menu_cache.get(session)
+    documents = sitemap_cache.get(menu, base_url)
+    fragments = documents.get(name)
+    if fragments is None:
+        raise HTTPException(status_code=404, detail="Sitemap not found")
+
+    return StreamingResponse(iter(fragments), media_type="application/xml", headers=cache_headers(etag))
+
+@app.get("/sitemap.xml")
 async def sitemap_xml(request: Request, session: AsyncSession = Depends(get_db_session)):
-    base_url = str(request.base_url).rstrip("/")
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    
-    # Отримуємо всі активні товари з бази
-    products_res = await session.execute(select(Product).where(Product.is_active == True))
-    products = products_res.scalars().all()
-    
-    urls = []
-    
-    # Головна сторінка
-    urls.append(f"""
-    <url>
-        <loc>{base_url}/</loc>
-        <lastmod>{date_str}</lastmod>
-        <changefreq>daily</changefreq>
-        <priority>1.0</priority>
-    </url>
-    """)
-    
-    # Сторінки товарів
-    for product in products:
-        slug = transliterate_slug(product.name)
-        product_url = f"{base_url}/?p={url_quote_plus(slug)}"
-        
-        urls.append(f"""
-    <url>
-        <loc>{product_url}</loc>
-        <lastmod>{date_str}</lastmod>
-        <changefreq>weekly</changefreq>
-        <priority>0.8</priority>
-    </url>
-        """)
-    
-    content = f"""<?xml version="1.0" encoding="UTF-8"?>
-    <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
-        {"".join(urls)}
-    </urlset>
-    """
-    return HTMLResponse(content=content, media_type="application/xml")
+    return await _sitemap_response(request, session, "sitemap.xml")
+
+@app.get("/sitemap-{part}.xml")
+async def sitemap_part_xml(part: int, request: Request, session: AsyncSession = Depends(get_db_session)):
+    return await _sitemap_response(request, session, f"sitemap-{part}.xml")
 # -------------------------------------
 
 class DbSessionMiddleware:
@@ -1289,18 +1278,25 @@ class DbSessionMiddleware:
             return await handler(event, data)
 
 async def get_settings(session: AsyncSession) -> Settings:
-    settings = await session.get(Settings, 1)
-    if not settings:
-        settings = Settings(id=1)
-        session.add(settings)
-        try: await session.commit(); await session.refresh(settings)
-        except Exception: await session.rollback(); return Settings(id=1)
-    if not settings.telegram_welcome_message: settings.telegram_welcome_message = f"Шановний {{user_name}}, ласкаво просимо!"
-    return settings
+    # Копія з кешу, тільки для читання (для запису - session.get(Settings, 1))
+    return await settings_cache.get(session)
 
 # --- SSR: СЕРВЕРНИЙ РЕНДЕРИНГ ГОЛОВНОЇ СТОРІНКИ ---
 @app.api_route("/", methods=["GET", "HEAD"], response_class=HTMLResponse)
 async def get_web_ordering_page(request: Request, session: AsyncSession = Depends(get_db_session)):
+    # Сторінка залежить від меню, контенту сайту, страви з ?p= та base_url (Schema.org).
+    # Решта параметрів (utm_*, fbclid, gclid...) сторінку не змінює і в ключ не входить
+    menu = await menu_cache.get(session)
+    target_product = menu.delivery_product(request.query_params.get('p'))
+    etag = make_etag("page", menu.version, site_content.version, request.base_url, target_product["id"] if target_product else "")
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    # Ця версія сторінки вже відрендерена і стиснута
+    cached_page = compressed_responses.get(etag)
+    if cached_page is not None:
+        return compressed_responses.response(request, cached_page, etag)
+
     settings = await get_settings(session)
     logo_html = f'<img src="/{settings.logo_url}" alt="Логотип" class="header-logo">' if settings.logo_url else ''
     
@@ -1316,9 +1312,13 @@ async def get_web_ordering_page(request: Request, session: AsyncSession = Depend
         dots = []
         for idx, b in enumerate(banners):
             link_attr = f'onclick="window.location.href=\'{b.link}\'"' if b.link else ""
+            img_html = picture_html(
+                f"/{b.image_url}", build_srcset(b.image_variants, "webp"), build_srcset(b.image_variants, "avif"),
+                BANNER_SIZES, f'alt="{html.escape(b.title or "")}" loading="lazy"'
+            )
             slides.append(f'''
             <div class="hero-slide" {link_attr}>
-                <img src="/{b.image_url}" alt="{html.escape(b.title or '')}" loading="lazy">
+                {img_html}
             </div>
             ''')
             active_class = "active" if idx == 0 else ""
@@ -1335,86 +1335,29 @@ async def get_web_ordering_page(request: Request, session: AsyncSession = Depend
         </div>
         '''
 
-    # 2. Отримуємо категорії
-    categories_res = await session.execute(
-        select(Category)
-        .where(Category.show_on_delivery_site == True)
-        .order_by(Category.sort_order, Category.name)
-    )
-    categories = categories_res.scalars().all()
-
-    # 3. Отримуємо товари з модифікаторами
-    products_res = await session.execute(
-        select(Product)
-        .options(selectinload(Product.modifiers), joinedload(Product.category))
-        .join(Category)
-        .where(Product.is_active == True, Category.show_on_delivery_site == True)
-        .order_by(Product.name)
-    )
-    products = products_res.scalars().all()
+    # 2-3. Категорії та товари з модифікаторами (зі знімка меню, без запитів до БД)
+    categories = menu.delivery_categories
 
     # 4. Генерація HTML для навігації
     nav_html_parts = []
     for idx, cat in enumerate(categories):
         active_class = "active" if idx == 0 else ""
-        nav_html_parts.append(f'<a href="#cat-{cat.id}" class="{active_class}">{html.escape(cat.name)}</a>')
+        nav_html_parts.append(f'<a href="#cat-{cat["id"]}" class="{active_class}">{html.escape(cat["name"])}</a>')
     server_rendered_nav = "".join(nav_html_parts)
 
     # 5. Генерація HTML для меню
     menu_html_parts = []
     for cat in categories:
-        cat_products = [p for p in products if p.category_id == cat.id]
+        cat_products = menu.delivery_products_by_category.get(cat["id"])
         if not cat_products:
             continue
 
-        menu_html_parts.append(f'<div id="cat-{cat.id}" class="category-section">')
-        menu_html_parts.append(f'<h2 class="category-title">{html.escape(cat.name)}</h2>')
+        menu_html_parts.append(f'<div id="cat-{cat["id"]}" class="category-section">')
+        menu_html_parts.append(f'<h2 class="category-title">{html.escape(cat["name"])}</h2>')
         menu_html_parts.append('<div class="products-grid">')
 
-        for prod in cat_products:
-            img_src = f"/{prod.image_url}" if prod.image_url else "/static/images/placeholder.jpg"
-            
-            # Формуємо JSON для кнопки (щоб JS підхопив логіку)
-            mods_list = []
-            if prod.modifiers:
-                for m in prod.modifiers:
-                    mods_list.append({
-                        "id": m.id, "name": m.name, 
-                        "price": float(m.price if m.price is not None else 0)
-                    })
-            
-            prod_data = {
-                "id": prod.id, "name": prod.name, "description": prod.description,
-                "price": float(prod.price), "image_url": prod.image_url,
-                "category_id": prod.category_id,
-                "category_name": prod.category.name if prod.category else "",
-                "modifiers": mods_list,
-                "slug": transliterate_slug(prod.name) # Додаємо slug для посилань
-            }
-            # Екрануємо лапки для HTML атрибута
-            prod_json = json.dumps(prod_data).replace('"', '&quot;')
-
-            # HTML картки товару
-            menu_html_parts.append(f'''
-            <div class="product-card">
-                <div class="product-image-wrapper">
-                    <img src="{img_src}" alt="{html.escape(prod.name)}" class="product-image" loading="lazy">
-                </div>
-                <div class="product-info">
-                    <div class="product-header">
-                        <h3 class="product-name">{html.escape(prod.name)}</h3>
-                        <div class="product-desc">{html.escape(prod.description or "")}</div>
-                    </div>
-                    <div class="product-footer">
-                        <div class="product-price">{prod.price} грн</div>
-                        <button class="add-btn" data-product="{prod_json}" onclick="event.stopPropagation(); handleAddClick(this)">
-                            <span>Додати</span> <i class="fa-solid fa-plus"></i>
-                        </button>
-                    </div>
-                </div>
-                <a href="?p={prod_data['slug']}" style="display:none;">{html.escape(prod.name)}</a>
-            </div>
-            ''')
+        # Готові HTML-картки з кешу фрагментів (рендеряться лише змінені страви)
+        menu_html_parts.extend(product_card_cache.get_cards(menu, cat_products))
         
         menu_html_parts.append('</div></div>') # Закриваємо grid і section
 
@@ -1466,32 +1409,26 @@ async def get_web_ordering_page(request: Request, session: AsyncSession = Depend
     page_desc = settings.seo_description or ""
     page_image = settings.header_image_url or ""
     
-    # Перевіряємо, чи відкрито конкретний товар через ?p=slug
-    product_slug = request.query_params.get('p')
-    if product_slug:
-        # Шукаємо товар (серед вже завантажених products або окремим запитом)
-        # Оскільки ми вже завантажили products вище для меню, шукаємо в списку:
-        target_product = next((p for p in products if transliterate_slug(p.name) == product_slug or str(p.id) == product_slug), None)
+    # Конкретний товар через ?p=slug (знайдено вище, до ETag)
+    if target_product:
+        # Формуємо змінні для заміни
+        replacements = {
+            "{name}": target_product["name"],
+            "{price}": f"{target_product['price']:.2f}",
+            "{description}": (target_product["description"] or "").replace('"', '').replace('\n', ' '),
+            "{category}": target_product["category_name"],
+            "{site_title}": settings.site_title or ""
+        }
         
-        if target_product:
-            # Формуємо змінні для заміни
-            replacements = {
-                "{name}": target_product.name,
-                "{price}": f"{target_product.price:.2f}",
-                "{description}": (target_product.description or "").replace('"', '').replace('\n', ' '),
-                "{category}": target_product.category.name if target_product.category else "",
-                "{site_title}": settings.site_title or ""
-            }
-            
-            # Застосовуємо шаблон
-            page_title = mask_title
-            page_desc = mask_desc
-            for key, val in replacements.items():
-                page_title = page_title.replace(key, str(val))
-                page_desc = page_desc.replace(key, str(val))
-            
-            if target_product.image_url:
-                page_image = target_product.image_url
+        # Застосовуємо шаблон
+        page_title = mask_title
+        page_desc = mask_desc
+        for key, val in replacements.items():
+            page_title = page_title.replace(key, str(val))
+            page_desc = page_desc.replace(key, str(val))
+        
+        if target_product["image_url"]:
+            page_image = target_product["image_url"]
 
     # Передаємо шаблони в JS через змінну template_params
     seo_templates_json = json.dumps({
@@ -1555,6 +1492,9 @@ async def get_web_ordering_page(request: Request, session: AsyncSession = Depend
         "category_nav_bg_color": settings.category_nav_bg_color or "#ffffff",
         "category_nav_text_color": settings.category_nav_text_color or "#333333",
         "header_image_url": page_image,              # <-- DYNAMIC IMAGE
+        # Менші версії фото шапки (лише коли шапка - не фото товару з ?p=)
+        "header_image_media_css": header_media_css(settings.header_image_variants) if page_image == settings.header_image_url else "",
+        "product_image_sizes": PRODUCT_SIZES,
         "wifi_ssid": html.escape(settings.wifi_ssid or ""),
         "wifi_password": html.escape(settings.wifi_password or ""),
         "delivery_cost_val": float(settings.delivery_cost),
@@ -1574,60 +1514,40 @@ async def get_web_ordering_page(request: Request, session: AsyncSession = Depend
         "seo_templates_json": seo_templates_json  # <-- NEW: PASS TEMPLATES TO JS
     }
 
-    return HTMLResponse(content=WEB_ORDER_HTML.format(**template_params))
+    # Посилання на статику (фавікони, логотип, фото) - на версії з хешем у назві
+    page = static_assets.rewrite_html(WEB_ORDER_HTML.format(**template_params)).encode("utf-8")
+    entry = await compressed_responses.put(etag, page, "text/html; charset=utf-8")
+    return compressed_responses.response(request, entry, etag)
 
 @app.get("/api/page/{item_id}", response_class=JSONResponse)
-async def get_menu_page_content(item_id: int, session: AsyncSession = Depends(get_db_session)):
+async def get_menu_page_content(item_id: int, request: Request, session: AsyncSession = Depends(get_db_session)):
+    etag = make_etag("menu_page", item_id, site_content.version)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
     menu_item = await session.get(MenuItem, item_id)
     
     if not menu_item or (not menu_item.show_on_website and not menu_item.show_in_qr):
         raise HTTPException(status_code=404, detail="Сторінку не знайдено")
         
-    return {"title": menu_item.title, "content": menu_item.content}
+    return JSONResponse(content={"title": menu_item.title, "content": menu_item.content}, headers=cache_headers(etag))
 @app.get("/api/menu")
-async def get_menu_data(session: AsyncSession = Depends(get_db_session)):
+async def get_menu_data(request: Request, since: Optional[int] = Query(None), session: AsyncSession = Depends(get_db_session)):
+    etag = make_etag("api_menu", menu_cache.version, since)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
     try:
-        categories_res = await session.execute(
-            select(Category)
-            .where(Category.show_on_delivery_site == True)
-            .order_by(Category.sort_order, Category.name)
-        )
-        categories = [{"id": c.id, "name": c.name} for c in categories_res.scalars().all()]
-        
-        products_res = await session.execute(
-            select(Product)
-            .options(selectinload(Product.modifiers), joinedload(Product.category)) 
-            .join(Category)
-            .where(Product.is_active == True, Category.show_on_delivery_site == True)
-	    .order_by(Product.name)
-        )
-        
-        products = []
-        for p in products_res.scalars().all():
-            mods_list = []
-            if p.modifiers:
-                for m in p.modifiers:
-                    price_val = m.price if m.price is not None else 0
-                    mods_list.append({
-                        "id": m.id, 
-                        "name": m.name, 
-                        "price": float(price_val)
-                    })
-            
-            products.append({
-                "id": p.id, 
-                "name": p.name, 
-                "description": p.description, 
-                "price": float(p.price), 
-                "image_url": p.image_url, 
-                "category_id": p.category_id,
-                "category_name": p.category.name if p.category else "", # Added category name
-                "modifiers": mods_list,
-                # ДОДАЄМО SLUG ТАКОЖ В API (для сумісності)
-                "slug": transliterate_slug(p.name)
-            })
-
-        return JSONResponse(content={"categories": categories, "products": products})
+        if since is not None:
+            # Тільки зміни з версії since (або маркер full_reload)
+            delta = await menu_cache.get_delta(session, since, "api")
+            return JSONResponse(content=delta, headers=cache_headers(etag))
+
+        entry = compressed_responses.get(etag)
+        if entry is None:
+            menu = await menu_cache.get(session)
+            body = json.dumps(menu.api_menu, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            entry = await compressed_responses.put(etag, body, "application/json")
+        return compressed_responses.response(request, entry, etag)
     except Exception as e:
         logging.error(f"Error in /api/menu: {e}", exc_info=True)
         return JSONResponse(status_code=500, content={"detail": "Internal Server Error", "error": str(e)})
@@ -1639,70 +1559,17 @@ async def place_web_order(request: Request, order_data: dict = Body(...), sessio
     if not items:
         raise HTTPException(status_code=400, detail="Кошик порожній")
 
-    try:
-        product_ids = [int(item['id']) for item in items]
-        
-        all_mod_ids = set()
-        for item in items:
-            for mod in item.get('modifiers', []):
-                if 'id' in mod:
-                    all_mod_ids.add(int(mod['id']))
-        
-    except (ValueError, TypeError):
-        raise HTTPException(status_code=400, detail="Невірний формат ID.")
-
-    products_res = await session.execute(select(Product).where(Product.id.in_(product_ids)))
-    db_products = {str(p.id): p for p in products_res.scalars().all()}
+    # Повтор запиту (ретрай з мобільного) - повертаємо вже створене замовлення
+    idempotency_key = get_idempotency_key(request, "web_order")
+    replayed = await find_response(session, idempotency_key, order_data)
+    if replayed:
+        return replayed
 
-    db_modifiers = {}
-    if all_mod_ids:
-        mods_res = await session.execute(select(Modifier).where(Modifier.id.in_(all_mod_ids)))
-        for m in mods_res.scalars().all():
-            db_modifiers[m.id] = m
-
-    total_price = Decimal('0.00')
-    order_items_objects = []
-    log_items = [] # Для логу
-
-    for item in items:
-        pid = str(item['id'])
-        if pid in db_products:
-            product = db_products[pid]
-            qty = int(item.get('quantity', 1))
-            
-            final_modifiers_data = []
-            mods_price_sum = Decimal(0)
-            
-            raw_mods = item.get('modifiers', [])
-            for raw_mod in raw_mods:
-                mid = int(raw_mod.get('id'))
-                if mid in db_modifiers:
-                    mod_db = db_modifiers[mid]
-                    mods_price_sum += mod_db.price
-                    final_modifiers_data.append({
-                        "id": mod_db.id,
-                        "name": mod_db.name,
-                        "price": float(mod_db.price),
-                        "ingredient_id": mod_db.ingredient_id,
-                        "ingredient_qty": float(mod_db.ingredient_qty),
-                        "warehouse_id": mod_db.warehouse_id 
-                    })
-            
-            item_total_price = (product.price + mods_price_sum)
-            total_price += item_total_price * qty
-            
-            log_items.append(f"{product.name} x{qty}")
-
-            order_items_objects.append(OrderItem(
-                product_id=product.id,
-                product_name=product.name,
-                quantity=qty,
-                price_at_moment=item_total_price,
-                preparation_area=product.preparation_area,
-                modifiers=final_modifiers_data 
-            ))
+    # Ціни та модифікатори - зі знімка меню, без окремих запитів до БД
+    menu = await menu_cache.get(session)
+    total_price, item_rows, log_items = price_cart(menu, items)
 
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     delivery_cost = Decimal(0)
 
     is_delivery = order_data.get('is_delivery', True)
@@ -1723,7 +1590,7 @@ async def place_web_order(request: Request, order_data: dict = Body(...), sessio
     # НОРМАЛІЗАЦІЯ ПРИ ЗАМОВЛЕННІ ЧЕРЕЗ WEB
     phone_number = normalize_phone(order_data.get('phone_number'))
 
-    order = Order(
+    order_values = dict(
         customer_name=customer_name, 
         phone_number=phone_number, # <-- Використовуємо нормалізований
         address=address, 
@@ -1732,28 +1599,29 @@ async def place_web_order(request: Request, order_data: dict = Body(...), sessio
         order_type=order_type,
         payment_method=payment_method,
         # ДОДАЄМО КОМЕНТАР
-        comment=order_data.get('comment'),
-        items=order_items_objects
+        comment=order_data.get('comment')
     )
-    session.add(order)
-    
-    # --- ВАЖЛИВО: Отримуємо ID замовлення ---
-    await session.flush() 
-    # ----------------------------------------
     
-    # --- ЛОГУВАННЯ СТВОРЕННЯ (WEB) ---
+    # --- Замовлення, позиції та лог (WEB) - одна транзакція, ID через RETURNING ---
     items_str = ", ".join(log_items)
-    # Тепер order.id вже існує
-    session.add(OrderLog(order_id=order.id, message=f"Замовлення створено через сайт/QR. Склад: {items_str}", actor=f"{customer_name} (Web)"))
-    # ---------------------------------
-
-    await session.commit()
-    await session.refresh(order)
-
-    if request.app.state.admin_bot:
-        await notify_new_order_to_staff(request.app.state.admin_bot, order, session)
+    order_id = await insert_order(
+        session, order_values, item_rows,
+        log_message=f"Замовлення створено через сайт/QR. Склад: {items_str}",
+        log_actor=f"{customer_name} (Web)"
+    )
+    response_body = {"message": "Замовлення успішно розміщено", "order_id": order_id}
+    save_response(session, idempotency_key, order_data, response_body, order_id=order_id)
+    # Сповіщення персоналу - через outbox, відповідь не чекає на Telegram
+    enqueue_notification(session, "new_order", order_id=order_id)
+    try:
+        await session.commit()
+    except IntegrityError:
+        if not idempotency_key:
+            raise
+        return await replay_after_conflict(session, idempotency_key, order_data)
+    notification_dispatcher.wake()
 
-    return JSONResponse(content={"message": "Замовлення успішно розміщено", "order_id": order.id})
+    return JSONResponse(content=response_body)
 
 # --- НАСТУПНИЙ БЛОК БУВ ПРОПУЩЕНИЙ У ПОПЕРЕДНІЙ ВЕРСІЇ ---
 
@@ -1799,6 +1667,7 @@ async def admin_categories(session: AsyncSession = Depends(get_db_session), user
 async def add_category(name: str = Form(...), sort_order: int = Form(100), show_on_delivery_site: bool = Form(False), show_in_restaurant: bool = Form(False), session: AsyncSession = Depends(get_db_session), username: str = Depends(check_credentials)):
     session.add(Category(name=name, sort_order=sort_order, show_on_delivery_site=show_on_delivery_site, show_in_restaurant=show_in_restaurant))
     await session.commit()
+    menu_cache.invalidate()
     return RedirectResponse(url="/admin/categories", status_code=303)
 
 @app.post("/admin/edit_category/{cat_id}")
@@ -1811,6 +1680,7 @@ async def edit_category(cat_id: int, name: Optional[str] = Form(None), sort_orde
         elif field in ["show_on_delivery_site", "show_in_restaurant"]:
             setattr(category, field, value.lower() == 'true')
         await session.commit()
+        menu_cache.invalidate()
     return RedirectResponse(url="/admin/categories", status_code=303)
 
 @app.get("/admin/delete_category/{cat_id}")
@@ -1822,6 +1692,7 @@ async def delete_category(cat_id: int, session: AsyncSession = Depends(get_db_se
              return RedirectResponse(url="/admin/categories?error=category_in_use", status_code=303)
         await session.delete(category)
         await session.commit()
+        menu_cache.invalidate()
     return RedirectResponse(url="/admin/categories", status_code=303)
 
 @app.get("/admin/orders", response_class=HTMLResponse)
@@ -1834,11 +1705,12 @@ async def admin_orders(page: int = Query(1, ge=1), q: str = Query(None, alias="s
     
     filters = []
     if q:
-        search_term = q.replace('#', '')
+        search_term = q.strip().replace('#', '')
+        # Ім'я - trigram-індекс, телефон - за цифрами (див. search.py)
+        condition = name_or_phone(Order.customer_name, Order.phone_number, search_term, dialect_of(session))
         if search_term.isdigit():
-             filters.append(or_(Order.id == int(search_term), Order.customer_name.ilike(f"%{q}%"), Order.phone_number.ilike(f"%{q}%")))
-        else:
-             filters.append(or_(Order.customer_name.ilike(f"%{q}%"), Order.phone_number.ilike(f"%{q}%")))
+             condition = or_(Order.id == int(search_term), condition)
+        filters.append(condition)
     if filters:
         query = query.where(*filters)
 
@@ -2088,6 +1960,13 @@ async def api_update_order(order_id: int, request: Request, session: AsyncSessio
         logging.error(f"Update order error: {e}", exc_info=True)
         raise HTTPException(500, "Failed to update order")
 
+@app.get("/admin/api/db_pool", response_class=JSONResponse)
+async def api_db_pool_stats(username: str = Depends(check_credentials)):
+    """Стан пулу з'єднань: зайняті / вільні / overflow та час очікування checkout."""
+    stats = pool_metrics.snapshot(engine.pool)
+    stats["replica"] = replica_router.stats()
+    return JSONResponse(stats)
+
 @app.get("/admin/reports", response_class=HTMLResponse)
 async def admin_reports_menu(session: AsyncSession = Depends(get_db_session), username: str = Depends(check_credentials)):
     settings = await get_settings(session)
@@ -2139,7 +2018,10 @@ async def save_admin_settings(
     icon_192: UploadFile = File(None),   # <-- Додано
     icon_512: UploadFile = File(None)    # <-- Додано
 ):
-    settings = await get_settings(session)
+    settings = await session.get(Settings, 1)
+    if not settings:
+        settings = Settings(id=1)
+        session.add(settings)
     if logo_file and logo_file.filename:
         if settings.logo_url and os.path.exists(settings.logo_url):
             try: os.remove(settings.logo_url)
@@ -2174,6 +2056,8 @@ async def save_admin_settings(
                 logging.error(f"Save favicon error: {e}")
 
     await session.commit()
+    settings_cache.invalidate()
+    site_content.bump()
     return RedirectResponse(url="/admin/settings?saved=true", status_code=303)
 
 
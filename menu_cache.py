@@ -0,0 +1,272 @@
+# menu_cache.py
+
+import asyncio
+import logging
+import time
+from decimal import Decimal
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from models import Category, Product, transliterate_slug
+from read_replica import is_replica_session
+from inventory_models import Modifier
+from static_assets import static_assets
+from image_pipeline import build_srcset, variant_paths
+
+logger = logging.getLogger(__name__)
+
+# Скільки попередніх знімків тримати для дельта-синхронізації (?since=)
+MENU_HISTORY_SIZE = 10
+
+
+def _diff(old: Dict[int, dict], new: Dict[int, dict]):
+    """Змінені/нові записи та ID видалених між двома версіями."""
+    changed = [item for item_id, item in new.items() if old.get(item_id) != item]
+    removed = [item_id for item_id in old if item_id not in new]
+    return changed, removed
+
+
+class MenuSnapshot:
+    """
+    Незмінний знімок меню (категорії + активні страви з модифікаторами).
+    Будується один раз і віддається всім точкам входу без звернень до БД.
+    """
+    def __init__(self, version: int, categories: List[dict], products: List[dict], modifiers: List[dict]):
+        self.version = version
+        # Всі категорії (відсортовані за sort_order, name)
+        self.categories = categories
+        # Всі активні страви (відсортовані за назвою)
+        self.products = products
+        self.products_by_id: Dict[int, dict] = {p["id"]: p for p in products}
+        self.products_by_slug: Dict[str, dict] = {p["slug"]: p for p in products}
+        # Довідник цін для прийому замовлень (всі модифікатори, ціни в Decimal)
+        self.modifiers_by_id: Dict[int, dict] = {m["id"]: m for m in modifiers}
+
+        # --- Сайт / Бот (доставка) ---
+        self.delivery_categories = [c for c in categories if c["show_on_delivery_site"]]
+        delivery_cat_ids = {c["id"] for c in self.delivery_categories}
+        self.delivery_products = [p for p in products if p["category_id"] in delivery_cat_ids]
+        # Страви доставки, згруповані за категорією (будується один раз на знімок)
+        self.delivery_products_by_category: Dict[int, List[dict]] = {}
+        for p in self.delivery_products:
+            self.delivery_products_by_category.setdefault(p["category_id"], []).append(p)
+
+        # Готовий payload для /api/menu
+        self.api_menu = {
+            "version": version,
+            "categories": [{"id": c["id"], "name": c["name"]} for c in self.delivery_categories],
+            "products": [{
+                "id": p["id"],
+                "name": p["name"],
+                "description": p["description"],
+                "price": p["price"],
+                "image_url": p["image_url"],
+                "srcset": p["srcset"],
+                "srcset_avif": p["srcset_avif"],
+                "category_id": p["category_id"],
+                "category_name": p["category_name"],
+                "modifiers": p["modifiers"],
+                "slug": p["slug"]
+            } for p in self.delivery_products]
+        }
+
+        # --- Заклад (PWA офіціанта) ---
+        staff_menu = []
+        for c in categories:
+            if not c["show_in_restaurant"]:
+                continue
+            staff_menu.append({
+                "id": c["id"],
+                "name": c["name"],
+                "products": [{
+                    "id": p["id"],
+                    "name": p["name"],
+                    "price": p["price"],
+                    "preparation_area": p["preparation_area"],
+                    "production_warehouse_id": p["production_warehouse_id"],
+                    "modifiers": p["modifiers"]
+                } for p in products if p["category_id"] == c["id"]]
+            })
+        # Готовий payload для /staff/api/menu/full
+        self.staff_menu = {"version": version, "menu": staff_menu}
+
+        # Плоскі індекси за ID для дельта-синхронізації
+        self.api_categories_by_id = {c["id"]: c for c in self.api_menu["categories"]}
+        self.api_products_by_id = {p["id"]: p for p in self.api_menu["products"]}
+        self.staff_categories_by_id = {c["id"]: {"id": c["id"], "name": c["name"]} for c in staff_menu}
+        self.staff_products_by_id = {
+            p["id"]: {**p, "category_id": c["id"]} for c in staff_menu for p in c["products"]
+        }
+
+    def delivery_product(self, slug: Optional[str]) -> Optional[dict]:
+        """Страва сайту за ?p= (slug або ID зі старих посилань); None - невідома або прихована."""
+        if not slug:
+            return None
+        product = self.products_by_slug.get(slug)
+        if not product and slug.isdigit():
+            product = self.products_by_id.get(int(slug))
+        if product and product["category_id"] not in self.delivery_products_by_category:
+            return None
+        return product
+
+    def delta_from(self, old: "MenuSnapshot", view: str) -> dict:
+        """Зміни відносно старішого знімка для view 'api' (сайт) або 'staff' (PWA)."""
+        changed_categories, removed_categories = _diff(
+            getattr(old, f"{view}_categories_by_id"), getattr(self, f"{view}_categories_by_id")
+        )
+        changed_products, removed_products = _diff(
+            getattr(old, f"{view}_products_by_id"), getattr(self, f"{view}_products_by_id")
+        )
+        return {
+            "version": self.version,
+            "since": old.version,
+            "full_reload": False,
+            "categories": changed_categories,
+            "products": changed_products,
+            "removed_categories": removed_categories,
+            "removed_products": removed_products
+        }
+
+
+class MenuCache:
+    """
+    Версіонований in-process кеш меню.
+    Версія монотонно зростає при кожній інвалідації (запис з адмінки),
+    знімок перебудовується ліниво при першому зверненні після інвалідації.
+    """
+    def __init__(self):
+        # Стартуємо з мітки часу (мс), щоб версії не повторювались після рестарту
+        self._version: int = int(time.time() * 1000)
+        self._snapshot: Optional[MenuSnapshot] = None
+        self._lock = asyncio.Lock()
+        # Журнал останніх знімків: версія -> знімок
+        self._history: "OrderedDict[int, MenuSnapshot]" = OrderedDict()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self):
+        """Викликати ПІСЛЯ commit у всіх місцях, що змінюють страви, категорії або модифікатори."""
+        self._version += 1
+        self._snapshot = None
+
+    async def get(self, session: AsyncSession) -> MenuSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+
+        async with self._lock:
+            # Поки чекали на lock, знімок міг побудувати інший запит
+            if self._snapshot is not None:
+                return self._snapshot
+
+            version = self._version
+            snapshot = await self._build(session, version)
+
+            # Якщо під час побудови була інвалідація - не кешуємо застарілі дані (і дані з репліки)
+            if version == self._version and not is_replica_session(session):
+                self._snapshot = snapshot
+                self._history[version] = snapshot
+                while len(self._history) > MENU_HISTORY_SIZE:
+                    self._history.popitem(last=False)
+            return snapshot
+
+    async def get_delta(self, session: AsyncSession, since: int, view: str) -> dict:
+        """
+        Дельта меню від версії since до поточної.
+        Якщо версії вже немає в журналі (давно або після рестарту) - full_reload.
+        """
+        snapshot = await self.get(session)
+        old = self._history.get(since)
+        if old is None:
+            return {"version": snapshot.version, "since": since, "full_reload": True}
+        return snapshot.delta_from(old, view)
+
+    async def _build(self, session: AsyncSession, version: int) -> MenuSnapshot:
+        categories_res = await session.execute(
+            select(Category).order_by(Category.sort_order, Category.name)
+        )
+        categories = [{
+            "id": c.id,
+            "name": c.name,
+            "sort_order": c.sort_order,
+            "show_on_delivery_site": bool(c.show_on_delivery_site),
+            "show_in_restaurant": bool(c.show_in_restaurant)
+        } for c in categories_res.scalars().all()]
+        cat_names = {c["id"]: c["name"] for c in categories}
+
+        products_res = await session.execute(
+            select(Product)
+            .options(selectinload(Product.modifiers))
+            .where(Product.is_active == True)
+            .order_by(Product.name)
+        )
+
+        product_rows = products_res.scalars().all()
+        # Адреси фото з хешем вмісту (хешування файлів - поза event loop)
+        image_urls = await asyncio.to_thread(
+            static_assets.fingerprint_many,
+            [p.image_url for p in product_rows] + [path for p in product_rows for path in variant_paths(p.image_variants)]
+        )
+        fingerprinted = lambda path: "/" + image_urls.get(path, path)
+
+        products = []
+        for p in product_rows:
+            mods_list = []
+            for m in p.modifiers or []:
+                mods_list.append({
+                    "id": m.id,
+                    "name": m.name,
+                    "price": float(m.price if m.price is not None else 0)
+                })
+
+            category_name = cat_names.get(p.category_id, "")
+            image_url = image_urls.get(p.image_url, p.image_url)
+            srcset = build_srcset(p.image_variants, "webp", fingerprinted)
+            srcset_avif = build_srcset(p.image_variants, "avif", fingerprinted)
+            products.append({
+                "id": p.id,
+                "name": p.name,
+                "description": p.description,
+                "price": float(p.price),
+                "price_text": f"{p.price}",
+                "price_decimal": p.price,
+                "image_url": image_url,
+                "srcset": srcset,
+                "srcset_avif": srcset_avif,
+                "category_id": p.category_id,
+                "category_name": category_name,
+                "preparation_area": p.preparation_area,
+                "production_warehouse_id": p.production_warehouse_id,
+                "modifiers": mods_list,
+                # Для рядків без збереженого slug (до міграції) рахуємо на льоту
+                "slug": p.slug or transliterate_slug(p.name),
+                "updated_at": p.updated_at,
+                # Версія для кешу HTML-карток: все, що потрапляє в картку
+                "version": (
+                    p.updated_at, p.name, f"{p.price}", p.description, image_url, srcset, srcset_avif, p.slug, category_name,
+                    tuple((m["id"], m["name"], m["price"]) for m in mods_list)
+                )
+            })
+
+        modifiers_res = await session.execute(select(Modifier))
+        modifiers = [{
+            "id": m.id,
+            "name": m.name,
+            "price": m.price if m.price is not None else Decimal(0),
+            "ingredient_id": m.ingredient_id,
+            "ingredient_qty": float(m.ingredient_qty or 0),
+            "warehouse_id": m.warehouse_id
+        } for m in modifiers_res.scalars().all()]
+
+        logger.info(f"Меню перебудовано (версія {version}): {len(categories)} категорій, {len(products)} страв")
+        return MenuSnapshot(version, categories, products, modifiers)
+
+
+# Глобальний екземпляр
+menu_cache = MenuCache()
@@ -0,0 +1,433 @@
+# migrate.py
+
+"""
+Версійні міграції схеми.
+
+Запускається окремою командою перед стартом воркерів (не в lifespan):
+    python migrate.py              # застосувати нові міграції
+    python migrate.py --dry-run    # лише показати SQL
+    python migrate.py --status     # список застосованих / очікуючих
+
+Застосовані версії записуються в таблицю schema_migrations.
+Кроки мають бути ідемпотентними: якщо міграція впала посередині,
+повторний запуск проходить вже виконані кроки без помилок.
+Онлайн-кроки (CREATE INDEX CONCURRENTLY, пакетне заповнення) виконуються
+поза транзакцією і не тримають довгого блокування таблиці.
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime
+from typing import Callable, List, Optional, Sequence
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from models import Base, engine, transliterate_slug, make_unique_slug
+import inventory_models  # noqa: F401 - таблиці складу мають потрапити в Base.metadata
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_TABLE = "schema_migrations"
+DEFAULT_BATCH_SIZE = 1000
+# Щоб два деплої одночасно не застосовували міграції (лише PostgreSQL)
+ADVISORY_LOCK_ID = 7_314_001
+
+
+# --- Кроки міграцій ---
+
+class Step:
+    """Базовий крок. online=True - виконується поза транзакцією (AUTOCOMMIT)."""
+    online = False
+
+    def describe(self, dialect: str) -> str:
+        raise NotImplementedError
+
+    async def run(self, conn: AsyncConnection, dialect: str):
+        raise NotImplementedError
+
+
+class Sql(Step):
+    """Довільний SQL у транзакції міграції."""
+    def __init__(self, sql: str, dialects: Optional[Sequence[str]] = None):
+        self.sql = sql.strip()
+        self.dialects = dialects
+
+    def _applies(self, dialect: str) -> bool:
+        return self.dialects is None or dialect in self.dialects
+
+    def describe(self, dialect: str) -> str:
+        return self.sql if self._applies(dialect) else f"-- пропущено для {dialect}"
+
+    async def run(self, conn, dialect):
+        if self._applies(dialect):
+            await conn.execute(text(self.sql))
+
+
+class CreateTables(Step):
+    """Створює відсутні таблиці з моделей (на порожній БД - всю схему з індексами)."""
+    def describe(self, dialect):
+        return "-- Base.metadata.create_all (лише відсутні таблиці)"
+
+    async def run(self, conn, dialect):
+        await conn.run_sync(Base.metadata.create_all)
+
+
+class AddColumn(Step):
+    """ADD COLUMN, якщо колонки ще немає (SQLite не знає ADD COLUMN IF NOT EXISTS)."""
+    def __init__(self, table: str, column: str, ddl: str):
+        self.table = table
+        self.column = column
+        self.ddl = ddl
+
+    def _sql(self) -> str:
+        return f"ALTER TABLE {self.table} ADD COLUMN {self.column} {self.ddl};"
+
+    def describe(self, dialect):
+        return f"{self._sql()}  -- якщо колонки ще немає"
+
+    async def run(self, conn, dialect):
+        columns = await conn.run_sync(lambda c: [col["name"] for col in inspect(c).get_columns(self.table)])
+        if self.column not in columns:
+            await conn.execute(text(self._sql()))
+
+
+class CreateIndex(Step):
+    """
+    Індекс без блокування записів: на PostgreSQL - CREATE INDEX CONCURRENTLY.
+    Невалідний індекс від перерваної побудови спочатку видаляється.
+    """
+    online = True
+
+    def __init__(self, name: str, table: str, columns: str, unique: bool = False,
+                 using: Optional[str] = None, dialects: Optional[Sequence[str]] = None):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.unique = unique
+        # Метод індексу (gin, gist...) та діалекти, де він є (напр. лише postgresql для pg_trgm)
+        self.using = using
+        self.dialects = dialects
+
+    def _applies(self, dialect: str) -> bool:
+        return self.dialects is None or dialect in self.dialects
+
+    def describe(self, dialect):
+        if not self._applies(dialect):
+            return f"-- пропущено для {dialect}: {self.name}"
+        concurrently = " CONCURRENTLY" if dialect == "postgresql" else ""
+        unique = "UNIQUE " if self.unique else ""
+        using = f" USING {self.using}" if self.using else ""
+        return f"CREATE {unique}INDEX{concurrently} IF NOT EXISTS {self.name} ON {self.table}{using} ({self.columns});"
+
+    async def run(self, conn, dialect):
+        if not self._applies(dialect):
+            return
+        # Таблиця, створена create_all, вже має однойменне унікальне обмеження
+        constraints = await conn.run_sync(lambda c: [uc["name"] for uc in inspect(c).get_unique_constraints(self.table)])
+        if self.name in constraints:
+            return
+        if dialect == "postgresql":
+            invalid = (await conn.execute(text(
+                "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ), {"name": self.name})).first()
+            if invalid:
+                logger.warning(f"Індекс {self.name} невалідний (перервана побудова) - перебудовуємо")
+                await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.name};"))
+        await conn.execute(text(self.describe(dialect)))
+
+
+class DropIndex(Step):
+    online = True
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def describe(self, dialect):
+        concurrently = " CONCURRENTLY" if dialect == "postgresql" else ""
+        return f"DROP INDEX{concurrently} IF EXISTS {self.name};"
+
+    async def run(self, conn, dialect):
+        await conn.execute(text(self.describe(dialect)))
+
+
+class AttachUniqueConstraint(Step):
+    """
+    Робить вже побудований (CONCURRENTLY) унікальний індекс обмеженням таблиці.
+    На SQLite достатньо самого унікального індексу.
+    """
+    def __init__(self, table: str, name: str):
+        self.table = table
+        self.name = name
+
+    def describe(self, dialect):
+        if dialect != "postgresql":
+            return f"-- пропущено для {dialect}: унікальний індекс {self.name} вже діє як обмеження"
+        return f"ALTER TABLE {self.table} ADD CONSTRAINT {self.name} UNIQUE USING INDEX {self.name};"
+
+    async def run(self, conn, dialect):
+        if dialect != "postgresql":
+            return
+        exists = (await conn.execute(
+            text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {"name": self.name}
+        )).first()
+        if not exists:
+            await conn.execute(text(self.describe(dialect)))
+
+
+class Backfill(Step):
+    """
+    Пакетне заповнення: UPDATE по batch_size рядків, кожна пачка - окрема транзакція,
+    поки оновлювати нічого.
+    """
+    online = True
+
+    def __init__(self, table: str, set_sql: str, where_sql: str, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.table = table
+        self.set_sql = set_sql
+        self.where_sql = where_sql
+        self.batch_size = batch_size
+
+    def _batch_sql(self) -> str:
+        return (
+            f"UPDATE {self.table} SET {self.set_sql} WHERE id IN "
+            f"(SELECT id FROM {self.table} WHERE {self.where_sql} LIMIT {self.batch_size});"
+        )
+
+    def describe(self, dialect):
+        return f"{self._batch_sql()}  -- повторюється, поки оновлено > 0 рядків"
+
+    async def run(self, conn, dialect):
+        total = 0
+        while True:
+            result = await conn.execute(text(self._batch_sql()))
+            total += result.rowcount or 0
+            if not result.rowcount:
+                break
+        logger.info(f"Backfill {self.table}: оновлено {total} рядків")
+
+
+class PythonBackfill(Step):
+    """Пакетне заповнення з логікою на Python: fn(conn, batch_size) -> кількість оброблених рядків."""
+    online = True
+
+    def __init__(self, description: str, fn: Callable, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.description = description
+        self.fn = fn
+        self.batch_size = batch_size
+
+    def describe(self, dialect):
+        return f"-- python: {self.description} (пачками по {self.batch_size})"
+
+    async def run(self, conn, dialect):
+        while await self.fn(conn, self.batch_size):
+            pass
+
+
+class Migration:
+    def __init__(self, version: str, description: str, steps: List[Step]):
+        self.version = version
+        self.description = description
+        self.steps = steps
+
+
+# --- Python-заповнення ---
+
+async def _backfill_product_slugs(conn: AsyncConnection, batch_size: int) -> int:
+    taken = {row[0] for row in await conn.execute(text("SELECT slug FROM products WHERE slug IS NOT NULL"))}
+    rows = (await conn.execute(
+        text("SELECT id, name FROM products WHERE slug IS NULL ORDER BY id LIMIT :n"), {"n": batch_size}
+    )).all()
+    for product_id, name in rows:
+        base = transliterate_slug(name or "")[:200] or "product"
+        slug = make_unique_slug(base, taken)
+        taken.add(slug)
+        await conn.execute(text("UPDATE products SET slug = :slug WHERE id = :id"), {"slug": slug, "id": product_id})
+    return len(rows)
+
+
+# --- Реєстр міграцій (лише додавати в кінець, застосовані не змінювати) ---
+
+MIGRATIONS: List[Migration] = [
+    Migration("0001", "Базова схема з моделей", [
+        CreateTables(),
+    ]),
+    Migration("0002", "orders.comment", [
+        AddColumn("orders", "comment", "VARCHAR(500)"),
+    ]),
+    Migration("0003", "products.slug для посилань ?p=slug", [
+        AddColumn("products", "slug", "VARCHAR(255)"),
+        PythonBackfill("заповнення products.slug з назви", _backfill_product_slugs, batch_size=500),
+        CreateIndex("ix_products_slug", "products", "slug", unique=True),
+    ]),
+    Migration("0004", "products.updated_at для sitemap <lastmod>", [
+        AddColumn("products", "updated_at", "TIMESTAMP WITHOUT TIME ZONE"),
+        Backfill("products", "updated_at = CURRENT_TIMESTAMP", "updated_at IS NULL"),
+    ]),
+    Migration("0005", "Похідні фото (srcset)", [
+        AddColumn("products", "image_variants", "JSON"),
+        AddColumn("banners", "image_variants", "JSON"),
+        AddColumn("settings", "header_image_variants", "JSON"),
+    ]),
+    Migration("0006", "Унікальний залишок склад + інгредієнт", [
+        # Дублікати могли з'явитися при паралельному першому надходженні:
+        # сумуємо кількість у найменший id, решту видаляємо
+        Sql("""
+            UPDATE stocks SET quantity = (
+                SELECT SUM(s2.quantity) FROM stocks s2
+                WHERE s2.warehouse_id = stocks.warehouse_id AND s2.ingredient_id = stocks.ingredient_id
+            )
+            WHERE id IN (SELECT MIN(id) FROM stocks GROUP BY warehouse_id, ingredient_id HAVING COUNT(*) > 1);
+        """),
+        Sql("DELETE FROM stocks WHERE id NOT IN (SELECT MIN(id) FROM stocks GROUP BY warehouse_id, ingredient_id);"),
+        CreateIndex("uq_stocks_warehouse_ingredient", "stocks", "warehouse_id, ingredient_id", unique=True),
+        AttachUniqueConstraint("stocks", "uq_stocks_warehouse_ingredient"),
+    ]),
+    Migration("0007", "Складені індекси для списків, звітів, каси та сповіщень", [
+        CreateIndex("ix_orders_courier_status", "orders", "courier_id, status_id"),
+        CreateIndex("ix_orders_table_status", "orders", "table_id, status_id"),
+        CreateIndex("ix_orders_waiter_status", "orders", "accepted_by_waiter_id, status_id"),
+        CreateIndex("ix_orders_status_created", "orders", "status_id, created_at"),
+        CreateIndex("ix_orders_cash_shift_payment", "orders", "cash_shift_id, payment_method, is_cash_turned_in"),
+        CreateIndex("ix_staff_notifications_employee_created", "staff_notifications", "employee_id, created_at DESC"),
+        # Старий індекс лише по employee_id покривається новим складеним
+        DropIndex("ix_staff_notifications_employee_id"),
+    ]),
+    Migration("0008", "Trigram-індекси для пошуку замовлень, клієнтів та інгредієнтів", [
+        # Вирази мають збігатися з search.py, інакше планувальник не візьме індекс
+        Sql("CREATE EXTENSION IF NOT EXISTS pg_trgm;", dialects=["postgresql"]),
+        CreateIndex("ix_orders_customer_name_trgm", "orders", "customer_name gin_trgm_ops",
+                    using="gin", dialects=["postgresql"]),
+        CreateIndex("ix_orders_phone_digits_trgm", "orders",
+                    "(regexp_replace(phone_number, '[^0-9]', '', 'g')) gin_trgm_ops",
+                    using="gin", dialects=["postgresql"]),
+        CreateIndex("ix_ingredients_name_trgm", "ingredients", "name gin_trgm_ops",
+                    using="gin", dialects=["postgresql"]),
+    ]),
+]
+
+
+# --- Виконання ---
+
+async def _ensure_migrations_table(conn: AsyncConnection):
+    await conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+        "version VARCHAR(50) PRIMARY KEY, "
+        "description VARCHAR(255) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+async def applied_versions(db_engine: AsyncEngine = engine) -> set:
+    async with db_engine.connect() as conn:
+        has_table = await conn.run_sync(lambda c: inspect(c).has_table(MIGRATIONS_TABLE))
+        if not has_table:
+            return set()
+        return {row[0] for row in await conn.execute(text(f"SELECT version FROM {MIGRATIONS_TABLE}"))}
+
+
+async def pending_migrations(db_engine: AsyncEngine = engine) -> List[Migration]:
+    applied = await applied_versions(db_engine)
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+
+async def _run_migration(db_engine: AsyncEngine, migration: Migration, dialect: str):
+    # Транзакційні кроки поспіль - одна транзакція; онлайн-крок - окреме AUTOCOMMIT-з'єднання
+    conn = None
+    try:
+        for step in migration.steps:
+            if step.online:
+                if conn is not None:
+                    await conn.commit()
+                    await conn.close()
+                    conn = None
+                async with db_engine.connect() as online_conn:
+                    online_conn = await online_conn.execution_options(isolation_level="AUTOCOMMIT")
+                    await step.run(online_conn, dialect)
+            else:
+                if conn is None:
+                    conn = await db_engine.connect()
+                await step.run(conn, dialect)
+
+        if conn is None:
+            conn = await db_engine.connect()
+        await conn.execute(
+            text(f"INSERT INTO {MIGRATIONS_TABLE} (version, description, applied_at) VALUES (:v, :d, :t)"),
+            {"v": migration.version, "d": migration.description, "t": datetime.now()}
+        )
+        await conn.commit()
+    finally:
+        if conn is not None:
+            await conn.close()
+
+
+async def migrate(dry_run: bool = False, db_engine: AsyncEngine = engine) -> int:
+    """Застосовує очікуючі міграції по черзі. Повертає кількість застосованих."""
+    dialect = db_engine.dialect.name
+    pending = await pending_migrations(db_engine)
+    if not pending:
+        print("✅ Схема актуальна, нових міграцій немає.")
+        return 0
+
+    if dry_run:
+        for migration in pending:
+            print(f"-- {migration.version}: {migration.description}")
+            for step in migration.steps:
+                marker = "  -- онлайн (поза транзакцією)" if step.online else ""
+                print(f"{step.describe(dialect)}{marker}")
+            print()
+        return 0
+
+    async with db_engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        if dialect == "postgresql":
+            await lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+        try:
+            await _ensure_migrations_table(lock_conn)
+            # Після очікування блокування інший процес міг вже щось застосувати
+            pending = await pending_migrations(db_engine)
+            for migration in pending:
+                print(f"🔄 {migration.version}: {migration.description}...")
+                await _run_migration(db_engine, migration, dialect)
+                print(f"✅ {migration.version} застосовано.")
+        finally:
+            if dialect == "postgresql":
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+    return len(pending)
+
+
+async def print_status(db_engine: AsyncEngine = engine):
+    applied = await applied_versions(db_engine)
+    for migration in MIGRATIONS:
+        mark = "✅" if migration.version in applied else "⏳"
+        print(f"{mark} {migration.version}  {migration.description}")
+
+
+async def main(args):
+    try:
+        if args.status:
+            await print_status()
+        else:
+            await migrate(dry_run=args.dry_run)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Міграції схеми бази даних")
+    parser.add_argument("--dry-run", action="store_true", help="Показати SQL очікуючих міграцій без виконання")
+    parser.add_argument("--status", action="store_true", help="Показати застосовані та очікуючі міграції")
+    args = parser.parse_args()
+
+    # Налаштування для Windows, щоб уникнути помилок EventLoop
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(main(args))
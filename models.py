@@ -8,8 +8,11 @@ from typing import Optional, List, TYPE_CHECKING
 from datetime import datetime
 import secrets
 import os
+import re
 from decimal import Decimal
 
+from db_pool import engine_options
+
 # Якщо потрібно для тайп-хінтингу (щоб IDE розуміла, що таке Modifier),
 # але уникаючи циклічного імпорту в рантаймі
 if TYPE_CHECKING:
@@ -20,13 +23,45 @@ DATABASE_URL = os.environ.get('DATABASE_URL')
 if not DATABASE_URL:
     raise ValueError("Помилка: Змінна оточення DATABASE_URL не встановлена.")
 
-engine = create_async_engine(DATABASE_URL)
+# Розміри пулу, pre-ping та кеш asyncpg - зі змінних оточення (див. db_pool.py)
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
 class Base(DeclarativeBase):
     pass
 
+# --- ФУНКЦІЯ ТРАНСЛІТЕРАЦІЇ ДЛЯ SEO (SLUG) ---
+def transliterate_slug(text: str) -> str:
+    converter = {
+        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'h', 'ґ': 'g', 'д': 'd', 'е': 'e', 'є': 'ye', 
+        'ж': 'zh', 'з': 'z', 'и': 'y', 'і': 'i', 'ї': 'yi', 'й': 'y', 'к': 'k', 'л': 'l', 
+        'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 
+        'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ь': '', 
+        'ю': 'yu', 'я': 'ya', ' ': '-', "'": '', '’': ''
+    }
+    text = text.lower()
+    result = []
+    for char in text:
+        if char in converter:
+            result.append(converter[char])
+        elif re.match(r'[a-z0-9\-]', char):
+            result.append(char)
+    
+    res_str = "".join(result)
+    res_str = re.sub(r'-+', '-', res_str)
+    return res_str.strip('-')
+
+def make_unique_slug(base: str, taken: set) -> str:
+    """Додає числовий суфікс (-2, -3, ...), якщо slug вже зайнятий іншою стравою."""
+    if base not in taken:
+        return base
+    i = 2
+    while f"{base}-{i}" in taken:
+        i += 1
+    return f"{base}-{i}"
+
+
 # Асоціативна таблиця для зв'язку "багато-до-багатьох" (Офіціанти <-> Столи)
 waiter_table_association = sa.Table(
     'waiter_table_association',
@@ -140,13 +175,18 @@ class StaffNotification(Base):
     """Сповіщення для PWA (червона крапка, тости)"""
     __tablename__ = 'staff_notifications'
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    employee_id: Mapped[int] = mapped_column(sa.ForeignKey('employees.id'), nullable=False, index=True)
+    employee_id: Mapped[int] = mapped_column(sa.ForeignKey('employees.id'), nullable=False)
     message: Mapped[str] = mapped_column(sa.Text, nullable=False)
     is_read: Mapped[bool] = mapped_column(sa.Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(sa.DateTime, default=func.now())
     
     employee: Mapped["Employee"] = relationship("Employee", back_populates="notifications")
 
+    __table_args__ = (
+        # Опитування PWA: останні сповіщення співробітника (замінює індекс лише по employee_id)
+        sa.Index('ix_staff_notifications_employee_created', 'employee_id', sa.text('created_at DESC')),
+    )
+
 
 class Category(Base):
     __tablename__ = 'categories'
@@ -178,6 +218,12 @@ class Product(Base):
     # --- SEO НАЛАШТУВАННЯ (ІНДИВІДУАЛЬНІ) ---
     seo_title: Mapped[Optional[str]] = mapped_column(sa.String(255), nullable=True)
     seo_description_meta: Mapped[Optional[str]] = mapped_column(sa.String(500), nullable=True)
+    # ЧПУ для посилань ?p=slug (рахується при створенні/перейменуванні)
+    slug: Mapped[Optional[str]] = mapped_column(sa.String(255), nullable=True, unique=True, index=True)
+    # Похідні фото різних ширин/форматів для srcset: {"webp": {"320": "static/images/..."}, ...}
+    image_variants: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    # Час останньої зміни (для <lastmod> у sitemap.xml)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(sa.DateTime, default=func.now(), onupdate=func.now(), server_default=func.now(), nullable=True)
     # ----------------------------------------
 
     category: Mapped["Category"] = relationship("Category", back_populates="products")
@@ -319,10 +365,11 @@ class Order(Base):
     completed_by_courier_id: Mapped[Optional[int]] = mapped_column(sa.ForeignKey('employees.id'), nullable=True)
     completed_by_courier: Mapped[Optional["Employee"]] = relationship("Employee", foreign_keys="Order.completed_by_courier_id")
     
-    history: Mapped[list["OrderStatusHistory"]] = relationship("OrderStatusHistory", back_populates="order", cascade="all, delete-orphan", lazy='selectin')
+    # Історія та логи потрібні лише в детальній картці - завантажуються явно (order_loading.ORDER_FULL_DETAIL)
+    history: Mapped[list["OrderStatusHistory"]] = relationship("OrderStatusHistory", back_populates="order", cascade="all, delete-orphan", lazy='raise', passive_deletes=True)
     
     # --- НОВЕ: Зв'язок з логами ---
-    logs: Mapped[list["OrderLog"]] = relationship("OrderLog", back_populates="order", cascade="all, delete-orphan", lazy='selectin')
+    logs: Mapped[list["OrderLog"]] = relationship("OrderLog", back_populates="order", cascade="all, delete-orphan", lazy='raise', passive_deletes=True)
     # ------------------------------
 
     table_id: Mapped[Optional[int]] = mapped_column(sa.ForeignKey('tables.id'), nullable=True)
@@ -352,6 +399,17 @@ class Order(Base):
     # --- СКЛАД: Прапор списання інгредієнтів ---
     # Запобігає повторному списанню при багаторазовій зміні статусу
     is_inventory_deducted: Mapped[bool] = mapped_column(sa.Boolean, default=False, server_default=text("false"))
+
+    __table_args__ = (
+        # Списки PWA: "мої активні замовлення" (кур'єр / столики / офіціант) з фільтром по статусу
+        sa.Index('ix_orders_courier_status', 'courier_id', 'status_id'),
+        sa.Index('ix_orders_table_status', 'table_id', 'status_id'),
+        sa.Index('ix_orders_waiter_status', 'accepted_by_waiter_id', 'status_id'),
+        # Звіти: статус (рівність / IN) + діапазон дат
+        sa.Index('ix_orders_status_created', 'status_id', 'created_at'),
+        # Каса: готівка зміни, яку ще не здали
+        sa.Index('ix_orders_cash_shift_payment', 'cash_shift_id', 'payment_method', 'is_cash_turned_in'),
+    )
     
     # --- ДОДАТКОВО: Для логіки повернення ---
     # Не зберігається в БД (property або тимчасовий атрибут), але в SQLAlchemy
@@ -383,7 +441,7 @@ class OrderStatusHistory(Base):
     timestamp: Mapped[datetime] = mapped_column(sa.DateTime, default=func.now(), server_default=func.now(), nullable=False)
 
     order: Mapped["Order"] = relationship("Order", back_populates="history")
-    status: Mapped["OrderStatus"] = relationship("OrderStatus", back_populates="history_entries", lazy='selectin')
+    status: Mapped["OrderStatus"] = relationship("OrderStatus", back_populates="history_entries")
 
 
 class Customer(Base):
@@ -441,6 +499,7 @@ class Settings(Base):
     font_family_sans: Mapped[Optional[str]] = mapped_column(sa.String(100), default="Golos Text")
     font_family_serif: Mapped[Optional[str]] = mapped_column(sa.String(100), default="Playfair Display")
     header_image_url: Mapped[Optional[str]] = mapped_column(sa.String(255), nullable=True)
+    header_image_variants: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
     category_nav_bg_color: Mapped[Optional[str]] = mapped_column(sa.String(7), default="#ffffff")
     category_nav_text_color: Mapped[Optional[str]] = mapped_column(sa.String(7), default="#333333")
     
@@ -500,11 +559,45 @@ class Banner(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     title: Mapped[Optional[str]] = mapped_column(sa.String(100), nullable=True)
     image_url: Mapped[str] = mapped_column(sa.String(255), nullable=False)
+    image_variants: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
     link: Mapped[Optional[str]] = mapped_column(sa.String(255), nullable=True) # Посилання при кліку (наприклад, на категорію або товар)
     sort_order: Mapped[int] = mapped_column(sa.Integer, default=0)
     is_active: Mapped[bool] = mapped_column(sa.Boolean, default=True)
 
 
+class IdempotencyKey(Base):
+    """Збережені відповіді на запити з заголовком Idempotency-Key (повтори не створюють дублів)"""
+    __tablename__ = 'idempotency_keys'
+    # "<scope>:<ключ від клієнта>", напр. "web_order:4f1c..."
+    key: Mapped[str] = mapped_column(sa.String(255), primary_key=True)
+    # Хеш тіла запиту: той самий ключ з іншим тілом - помилка клієнта
+    request_hash: Mapped[str] = mapped_column(sa.String(64), nullable=False)
+    order_id: Mapped[Optional[int]] = mapped_column(sa.Integer, nullable=True)
+    response_status: Mapped[int] = mapped_column(sa.Integer, default=200)
+    response_body: Mapped[dict] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(sa.DateTime, default=func.now(), server_default=func.now(), index=True)
+
+
+class NotificationOutbox(Base):
+    """Черга сповіщень (Telegram/PWA): пишеться в одній транзакції зі зміною замовлення"""
+    __tablename__ = 'notification_outbox'
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    # new_order / table_order / status_changed
+    event_type: Mapped[str] = mapped_column(sa.String(50), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    # pending -> sent | failed
+    status: Mapped[str] = mapped_column(sa.String(20), default='pending', nullable=False)
+    attempts: Mapped[int] = mapped_column(sa.Integer, default=0, nullable=False)
+    next_attempt_at: Mapped[datetime] = mapped_column(sa.DateTime, nullable=False)
+    last_error: Mapped[Optional[str]] = mapped_column(sa.Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(sa.DateTime, default=func.now(), server_default=func.now())
+    sent_at: Mapped[Optional[datetime]] = mapped_column(sa.DateTime, nullable=True)
+
+    __table_args__ = (
+        sa.Index('ix_notification_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+
 async def create_db_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
@@ -3,32 +3,65 @@
 import logging
 import os
 import html as html_module
+from typing import List
 from aiogram import Bot
 from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardButton
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert
 from sqlalchemy.orm import selectinload, joinedload
 
-from models import Order, OrderStatus, Employee, Role, OrderItem, StaffNotification
+from models import Order, OrderStatus, Employee, OrderItem, StaffNotification, Table
 # --- СКЛАД: Импорт функций списания и возврата ---
 from inventory_service import deduct_products_by_tech_card, reverse_deduction
 from inventory_models import InventoryDoc 
 
 # Импорт менеджера WebSocket для отправки событий
 from websocket_manager import manager
+from telegram_fanout import telegram_fanout
+from staff_roster import staff_roster
+from status_registry import status_registry
 
 logger = logging.getLogger(__name__)
 
+# Кому додано PWA-сповіщення в цій сесії (для одного WS-сигналу після commit)
+PWA_RECIPIENTS_KEY = "pwa_notification_recipients"
+
+
+async def create_staff_notifications(session: AsyncSession, employee_ids, message: str) -> List[int]:
+    """
+    Создает уведомления PWA (красная точка и Toast) для нескольких сотрудников
+    одним INSERT в транзакции вызывающего кода. Коммит делает вызывающий.
+    """
+    recipients = list(dict.fromkeys(eid for eid in employee_ids if eid))
+    if not recipients:
+        return []
+    await session.execute(
+        insert(StaffNotification),
+        [{"employee_id": eid, "message": message} for eid in recipients]
+    )
+    session.info.setdefault(PWA_RECIPIENTS_KEY, set()).update(recipients)
+    return recipients
+
+
 async def create_staff_notification(session: AsyncSession, employee_id: int, message: str):
+    """Уведомление одному сотруднику (без коммита)."""
+    await create_staff_notifications(session, [employee_id], message)
+
+
+async def announce_staff_notifications(session: AsyncSession):
     """
-    Создает запись уведомления в БД для PWA (красная точка и Toast).
+    После коммита: один WebSocket-сигнал, чтобы PWA сразу перечитала уведомления
+    (вместо ожидания поллинга).
     """
-    try:
-        session.add(StaffNotification(employee_id=employee_id, message=message))
-        # Важно: делаем коммит сразу, чтобы поллинг PWA увидел новое уведомление
-        await session.commit() 
-    except Exception as e:
-        logger.error(f"Error creating PWA notification for emp {employee_id}: {e}")
+    recipients = session.info.pop(PWA_RECIPIENTS_KEY, None)
+    if recipients:
+        await manager.broadcast_staff({"type": "staff_notifications", "employee_ids": sorted(recipients)})
+
+
+async def commit_staff_notifications(session: AsyncSession):
+    await session.commit()
+    await announce_staff_notifications(session)
+
 
 async def notify_new_order_to_staff(admin_bot: Bot, order: Order, session: AsyncSession):
     """
@@ -48,18 +81,12 @@ async def notify_new_order_to_staff(admin_bot: Bot, order: Order, session: Async
     result = await session.execute(query)
     order = result.scalar_one()
 
+    # Оператори на зміні - з кешу складу зміни, без запитів
+    roster = await staff_roster.get(session)
+
     # --- 1. PWA NOTIFICATION (Операторам) ---
-    operator_roles_res = await session.execute(select(Role.id).where(Role.can_manage_orders == True))
-    operator_role_ids = operator_roles_res.scalars().all()
-    
-    if operator_role_ids:
-        operators = (await session.execute(
-            select(Employee).where(Employee.role_id.in_(operator_role_ids), Employee.is_on_shift == True)
-        )).scalars().all()
-        
-        pwa_msg = f"🆕 Нове замовлення #{order.id} ({order.total_price} грн)"
-        for emp in operators:
-            await create_staff_notification(session, emp.id, pwa_msg)
+    pwa_msg = f"🆕 Нове замовлення #{order.id} ({order.total_price} грн)"
+    await create_staff_notifications(session, roster.ids("operator"), pwa_msg)
     # ---------------------------------------
 
     # --- 2. TELEGRAM NOTIFICATION ---
@@ -128,22 +155,9 @@ async def notify_new_order_to_staff(admin_bot: Bot, order: Order, session: Async
         except ValueError:
             logger.warning(f"Некоректний ADMIN_CHAT_ID: {admin_chat_id_str}")
 
-    if operator_role_ids:
-        operators_tg = await session.execute(
-            select(Employee).where(
-                Employee.role_id.in_(operator_role_ids),
-                Employee.is_on_shift == True,
-                Employee.telegram_user_id.is_not(None)
-            )
-        )
-        for operator in operators_tg.scalars().all():
-            target_chat_ids.add(operator.telegram_user_id)
-            
-    for chat_id in target_chat_ids:
-        try:
-            await admin_bot.send_message(chat_id, admin_text, reply_markup=kb_admin.as_markup(), parse_mode="HTML")
-        except Exception as e:
-            logger.error(f"Не вдалося відправити нове замовлення в TG {chat_id}: {e}")
+    target_chat_ids.update(roster.chat_ids("operator"))
+
+    await telegram_fanout.broadcast(admin_bot, target_chat_ids, admin_text, reply_markup=kb_admin.as_markup(), parse_mode="HTML")
 
     # 3. РОЗПОДІЛ НА ВИРОБНИЦТВО
     if order.status and order.status.requires_kitchen_notify:
@@ -151,6 +165,9 @@ async def notify_new_order_to_staff(admin_bot: Bot, order: Order, session: Async
     else:
         logger.info(f"Замовлення #{order.id} створено, чекає обробки.")
 
+    # Всі PWA-сповіщення цієї розсилки - одним commit
+    await commit_staff_notifications(session)
+
     # --- 4. WEBSOCKET BROADCAST ---
     await manager.broadcast_staff({
         "type": "new_order",
@@ -166,6 +183,86 @@ async def notify_new_order_to_staff(admin_bot: Bot, order: Order, session: Async
         })
 
 
+async def notify_new_table_order(admin_bot: Bot | None, order_id: int, session: AsyncSession):
+    """
+    Уведомления о заказе гостя из QR-меню:
+    1. PWA: Официантам стола на смене.
+    2. Telegram: Официантам (или в админ-чат, если стол свободный).
+    3. Распределение на производство.
+    """
+    query = select(Order).where(Order.id == order_id).options(
+        selectinload(Order.items),
+        joinedload(Order.status),
+        joinedload(Order.table).selectinload(Table.assigned_waiters)
+    )
+    order = (await session.execute(query)).scalar_one_or_none()
+    if not order or not order.table:
+        return
+    table = order.table
+
+    # --- 1. PWA NOTIFICATION ---
+    pwa_msg = f"📝 Нове замовлення #{order.id} (Стіл: {table.name}). Сума: {order.total_price} грн"
+    await create_staff_notifications(session, [w.id for w in table.assigned_waiters if w.is_on_shift], pwa_msg)
+
+    if not admin_bot:
+        await commit_staff_notifications(session)
+        return
+
+    # --- 2. TELEGRAM NOTIFICATION ---
+    products_str_for_msg = []
+    for item in order.items:
+        mod_names = [m.get('name') for m in (item.modifiers or [])]
+        mod_str = f" (+ {', '.join(mod_names)})" if mod_names else ""
+        products_str_for_msg.append(f"{item.product_name}{mod_str} x {item.quantity}")
+
+    products_display = "\n- ".join(products_str_for_msg)
+    order_details_text = (f"📝 <b>Нове замовлення зі столика: <b>{html_module.escape(table.name)}</b> (ID: #{order.id})</b>\n\n"
+                          f"<b>Склад:</b>\n- {html_module.escape(products_display)}\n\n"
+                          f"<b>Сума:</b> {order.total_price} грн")
+
+    kb_waiter = InlineKeyboardBuilder()
+    kb_waiter.row(InlineKeyboardButton(text="✅ Прийняти замовлення", callback_data=f"waiter_accept_order_{order.id}"))
+
+    kb_admin = InlineKeyboardBuilder()
+    kb_admin.row(InlineKeyboardButton(text="⚙️ Керувати (Адмін)", callback_data=f"waiter_manage_order_{order.id}"))
+
+    admin_chat_id_str = os.environ.get('ADMIN_CHAT_ID')
+    admin_chat_id = None
+    if admin_chat_id_str:
+        try: admin_chat_id = int(admin_chat_id_str)
+        except ValueError: pass
+
+    waiter_chat_ids = set()
+    for w in table.assigned_waiters:
+        if w.telegram_user_id and w.is_on_shift:
+            waiter_chat_ids.add(w.telegram_user_id)
+
+    messages = []
+    if waiter_chat_ids:
+        for chat_id in waiter_chat_ids:
+            messages.append((chat_id, order_details_text, {"reply_markup": kb_waiter.as_markup()}))
+
+        if admin_chat_id and admin_chat_id not in waiter_chat_ids:
+            messages.append((admin_chat_id, "✅ " + order_details_text, {"reply_markup": kb_admin.as_markup()}))
+    else:
+        if admin_chat_id:
+            messages.append((
+                admin_chat_id,
+                f"❗️ <b>Замовлення з вільного столика <b>{html_module.escape(table.name)}</b> (ID: #{order.id})!</b>\n\n" + order_details_text,
+                {"reply_markup": kb_admin.as_markup()}
+            ))
+    await telegram_fanout.fan_out(admin_bot, messages)
+
+    # --- 3. РОЗПОДІЛ НА ВИРОБНИЦТВО ---
+    if order.status and order.status.requires_kitchen_notify:
+        try:
+            await distribute_order_to_production(admin_bot, order, session)
+        except Exception as e:
+            logger.error(f"Помилка при розподілі замовлення #{order.id}: {e}")
+
+    await commit_staff_notifications(session)
+
+
 async def distribute_order_to_production(bot: Bot, order: Order, session: AsyncSession):
     """
     Распределяет товары заказа между Кухней и Баром для уведомлений.
@@ -194,53 +291,36 @@ async def distribute_order_to_production(bot: Bot, order: Order, session: AsyncS
         else:
             kitchen_items.append(item_str)
 
+    roster = await staff_roster.get(session)
+
     # --- PWA NOTIFICATION ---
     if kitchen_items:
-        chefs = (await session.execute(
-            select(Employee).join(Role).where(Role.can_receive_kitchen_orders==True, Employee.is_on_shift==True)
-        )).scalars().all()
-        for emp in chefs:
-            await create_staff_notification(session, emp.id, f"🍳 Кухня: Нове замовлення #{order.id}")
+        await create_staff_notifications(session, roster.ids("kitchen"), f"🍳 Кухня: Нове замовлення #{order.id}")
             
     if bar_items:
-        barmen = (await session.execute(
-            select(Employee).join(Role).where(Role.can_receive_bar_orders==True, Employee.is_on_shift==True)
-        )).scalars().all()
-        for emp in barmen:
-            await create_staff_notification(session, emp.id, f"🍹 Бар: Нове замовлення #{order.id}")
+        await create_staff_notifications(session, roster.ids("bar"), f"🍹 Бар: Нове замовлення #{order.id}")
 
     # --- TELEGRAM NOTIFICATION ---
     if kitchen_items:
         await send_group_notification(
             bot=bot, order=loaded_order, items=kitchen_items,
-            role_filter=Role.can_receive_kitchen_orders == True,
+            capability="kitchen",
             title="🧑‍🍳 ЗАМОВЛЕННЯ НА КУХНЮ", session=session, area="kitchen"
         )
 
     if bar_items:
         await send_group_notification(
             bot=bot, order=loaded_order, items=bar_items,
-            role_filter=Role.can_receive_bar_orders == True,
+            capability="bar",
             title="🍹 ЗАМОВЛЕННЯ НА БАР", session=session, area="bar"
         )
 
 
-async def send_group_notification(bot: Bot, order: Order, items: list, role_filter, title: str, session: AsyncSession, area: str = "kitchen"):
-    roles_res = await session.execute(select(Role.id).where(role_filter))
-    role_ids = roles_res.scalars().all()
-
-    if not role_ids: return
-
-    employees_res = await session.execute(
-        select(Employee).where(
-            Employee.role_id.in_(role_ids),
-            Employee.is_on_shift == True,
-            Employee.telegram_user_id.is_not(None)
-        )
-    )
-    employees = employees_res.scalars().all()
+async def send_group_notification(bot: Bot, order: Order, items: list, capability: str, title: str, session: AsyncSession, area: str = "kitchen"):
+    """capability - ключ зі staff_roster.CAPABILITIES ("kitchen", "bar", ...)."""
+    chat_ids = (await staff_roster.get(session)).chat_ids(capability)
 
-    if employees:
+    if chat_ids:
         is_delivery = order.is_delivery
         items_formatted = "\n".join(items)
         
@@ -257,11 +337,7 @@ async def send_group_notification(bot: Bot, order: Order, items: list, role_filt
         kb = InlineKeyboardBuilder()
         kb.row(InlineKeyboardButton(text=f"✅ Видача #{order.id}", callback_data=f"chef_ready_{order.id}_{area}"))
         
-        for emp in employees:
-            try:
-                await bot.send_message(emp.telegram_user_id, text, reply_markup=kb.as_markup(), parse_mode="HTML")
-            except Exception as e:
-                logger.error(f"Не вдалося відправити в TG працівнику {emp.id}: {e}")
+        await telegram_fanout.broadcast(bot, chat_ids, text, reply_markup=kb.as_markup(), parse_mode="HTML")
 
 
 async def notify_station_completion(bot: Bot, order: Order, area: str, session: AsyncSession, employee_id: int = None):
@@ -324,10 +400,7 @@ async def notify_station_completion(bot: Bot, order: Order, area: str, session:
     pwa_msg = f"✅ Готово #{order.id}: {short_items}"
 
     # PWA
-    if order.accepted_by_waiter_id:
-        await create_staff_notification(session, order.accepted_by_waiter_id, pwa_msg)
-    if order.courier_id:
-        await create_staff_notification(session, order.courier_id, pwa_msg)
+    await create_staff_notifications(session, [order.accepted_by_waiter_id, order.courier_id], pwa_msg)
 
     # Telegram
     target_chat_ids = set()
@@ -344,9 +417,7 @@ async def notify_station_completion(bot: Bot, order: Order, area: str, session:
              except ValueError: pass
              message_text += "\n(Виконавець не призначений)"
 
-    for chat_id in target_chat_ids:
-        try: await bot.send_message(chat_id, message_text, parse_mode="HTML")
-        except Exception: pass
+    await telegram_fanout.broadcast(bot, target_chat_ids, message_text, parse_mode="HTML")
 
     await manager.broadcast_staff({
         "type": "item_ready",
@@ -355,16 +426,62 @@ async def notify_station_completion(bot: Bot, order: Order, area: str, session:
     })
 
 
+async def apply_status_inventory(session: AsyncSession, order: Order, new_status: OrderStatus, skip_inventory_return: bool = False) -> bool:
+    """
+    Складська частина зміни статусу: повернення або перетворення на списання при скасуванні,
+    списання при "Готовий до видачі" / завершенні.
+    Нічого не комітить: викликач фіксує зміну статусу, подію outbox і рух складу одним commit.
+    Рух складу йде в savepoint - помилка складу відкочує лише його, зміна статусу зберігається.
+    Повертає True, якщо товари повернуто на склад (для повідомлення в адмін-чат).
+    """
+    # Зміни викликача - до savepoint: їхня помилка не повинна виглядати як помилка складу
+    await session.flush()
+    order_id = order.id
+    returned = False
+    try:
+        async with session.begin_nested():
+            if new_status.is_cancelled_status and order.is_inventory_deducted:
+                if not skip_inventory_return:
+                    await reverse_deduction(session, order, commit=False)
+                    returned = True
+                else:
+                    docs_to_update = await session.execute(
+                        select(InventoryDoc).where(
+                            InventoryDoc.linked_order_id == order.id,
+                            InventoryDoc.doc_type == 'deduction'
+                        )
+                    )
+                    for doc in docs_to_update.scalars().all():
+                        doc.doc_type = 'writeoff'
+                        doc.comment = f"Списання (Скасування) замовлення #{order.id}"
+
+            should_deduct = (new_status.name == "Готовий до видачі" or new_status.is_completed_status)
+            if should_deduct and not order.is_inventory_deducted:
+                await deduct_products_by_tech_card(session, order, commit=False)
+    except Exception as e:
+        logger.error(f"Помилка складу при зміні статусу #{order_id} на '{new_status.name}': {e}")
+        # Відкат savepoint прострочує змінені в ньому об'єкти - перечитуємо замовлення для викликача
+        await session.refresh(order)
+        return False
+    return returned
+
+
 async def notify_all_parties_on_status_change(
     order: Order,
     old_status_name: str,
     actor_info: str,
     admin_bot: Bot,
     client_bot: Bot | None,
-    session: AsyncSession
+    session: AsyncSession,
+    new_status_id: int | None = None,
+    inventory_returned: bool = False,
+    apply_inventory: bool = True
 ):
     """
     Централизованная функция уведомлений и логики склада при смене статуса.
+    new_status_id - статус, про який сповіщаємо (outbox передає той, що був встановлений
+    подією, а не поточний). apply_inventory=False - склад вже оброблено в транзакції
+    зміни статусу (apply_status_inventory), inventory_returned - чи були повернення.
     """
     skip_return_flag = getattr(order, 'skip_inventory_return', False)
     await session.refresh(order)
@@ -380,64 +497,33 @@ async def notify_all_parties_on_status_change(
     result = await session.execute(query)
     order = result.scalar_one()
     
-    order.skip_inventory_return = skip_return_flag
     admin_chat_id_str = os.environ.get('ADMIN_CHAT_ID')
     new_status = order.status
-    
+    if new_status_id is not None and new_status_id != order.status_id:
+        new_status = (await status_registry.get(session)).get(new_status_id) or await session.get(OrderStatus, new_status_id)
+
     # --- 1. ЛОГИКА СКЛАДА (Списание и Возврат) ---
-    if new_status.is_cancelled_status and order.is_inventory_deducted:
-        if not order.skip_inventory_return:
-            try:
-                await reverse_deduction(session, order)
-                if admin_chat_id_str:
-                    try: await admin_bot.send_message(admin_chat_id_str, f"♻️ <b>[Склад]</b> Товари замовлення #{order.id} повернуто на склад.", parse_mode="HTML")
-                    except Exception: pass
-            except Exception as e:
-                logger.error(f"Помилка повернення на склад для #{order.id}: {e}")
-        else:
-            try:
-                docs_to_update = await session.execute(
-                    select(InventoryDoc).where(
-                        InventoryDoc.linked_order_id == order.id,
-                        InventoryDoc.doc_type == 'deduction'
-                    )
-                )
-                updated_count = 0
-                docs = docs_to_update.scalars().all()
-                for doc in docs:
-                    doc.doc_type = 'writeoff'
-                    doc.comment = f"Списання (Скасування) замовлення #{order.id}"
-                    updated_count += 1
-                
-                if updated_count > 0:
-                    await session.commit()
-            except Exception as e:
-                logger.error(f"Помилка конвертації документів для #{order.id}: {e}")
-
-    should_deduct = (new_status.name == "Готовий до видачі" or new_status.is_completed_status)
-    if should_deduct and not order.is_inventory_deducted:
-        try:
-            await deduct_products_by_tech_card(session, order)
-            await session.commit()
-        except Exception as e:
-            logger.error(f"Помилка списання складу для #{order.id}: {e}")
+    if apply_inventory:
+        inventory_returned = await apply_status_inventory(session, order, new_status, skip_return_flag)
+        await session.commit()
 
     # --- 2. PWA NOTIFICATION ---
     pwa_msg = f"ℹ️ Замовлення #{order.id}: Статус -> '{new_status.name}'"
-    if order.accepted_by_waiter_id:
-        await create_staff_notification(session, order.accepted_by_waiter_id, pwa_msg)
-    if order.courier_id:
-        await create_staff_notification(session, order.courier_id, pwa_msg)
+    await create_staff_notifications(session, [order.accepted_by_waiter_id, order.courier_id], pwa_msg)
+
+    # Повідомлення персоналу збираємо і відправляємо однією паралельною розсилкою
+    staff_messages = []
 
     # --- 3. LOG TO ADMIN CHAT ---
     if admin_chat_id_str:
+        if inventory_returned:
+            staff_messages.append((admin_chat_id_str, f"♻️ <b>[Склад]</b> Товари замовлення #{order.id} повернуто на склад.", {"parse_mode": "HTML"}))
         log_message = (
             f"🔄 <b>[Статус змінено]</b> Замовлення #{order.id}\n"
             f"<b>Ким:</b> {html_module.escape(actor_info)}\n"
             f"<b>Статус:</b> {html_module.escape(old_status_name)} ➡️ {html_module.escape(new_status.name)}"
         )
-        try: await admin_bot.send_message(admin_chat_id_str, log_message, parse_mode="HTML")
-        except Exception: pass
+        staff_messages.append((admin_chat_id_str, log_message, {"parse_mode": "HTML"}))
 
     # --- 4. DISTRIBUTE TO PRODUCTION ---
     if new_status.requires_kitchen_notify:
@@ -464,36 +550,32 @@ async def notify_all_parties_on_status_change(
             ready_message += f"Кур'єр: {html_module.escape(order.courier.full_name)}"
 
         if not target_employees:
-             operator_roles_res = await session.execute(select(Role.id).where(Role.can_manage_orders == True))
-             op_ids = operator_roles_res.scalars().all()
-             if op_ids:
-                 ops = (await session.execute(select(Employee).where(Employee.role_id.in_(op_ids), Employee.is_on_shift==True))).scalars().all()
-                 target_employees.extend(ops)
+             target_employees.extend((await staff_roster.get(session)).on_shift("operator"))
              ready_message += f"Тип: {'Самовивіз' if order.order_type == 'pickup' else 'Доставка'}. Потрібна видача."
              
         for employee in target_employees:
             if employee.telegram_user_id:
-                try: await admin_bot.send_message(employee.telegram_user_id, ready_message, parse_mode="HTML")
-                except Exception: pass
+                staff_messages.append((employee.telegram_user_id, ready_message, {"parse_mode": "HTML"}))
 
     # --- 6. NOTIFY STAFF (Status Change) ---
     # ИСПРАВЛЕНИЕ: Убрана проверка "Кур'єр" not in actor_info, чтобы куртер гарантированно получал сообщение.
     if order.courier and order.courier.telegram_user_id and new_status.name != "Готовий до видачі":
         if new_status.visible_to_courier:
             courier_text = f"❗️ Статус замовлення #{order.id} змінено на: <b>{new_status.name}</b>"
-            try: await admin_bot.send_message(order.courier.telegram_user_id, courier_text, parse_mode="HTML")
-            except Exception: pass
+            staff_messages.append((order.courier.telegram_user_id, courier_text, {"parse_mode": "HTML"}))
 
     if order.order_type != 'delivery' and order.accepted_by_waiter and order.accepted_by_waiter.telegram_user_id and "Офіціант" not in actor_info and new_status.name != "Готовий до видачі":
         waiter_text = f"📢 Замовлення #{order.id} (Стіл: {html_module.escape(order.table.name if order.table else 'N/A')}) має новий статус: <b>{new_status.name}</b>"
-        try: await admin_bot.send_message(order.accepted_by_waiter.telegram_user_id, waiter_text, parse_mode="HTML")
-        except Exception: pass
+        staff_messages.append((order.accepted_by_waiter.telegram_user_id, waiter_text, {"parse_mode": "HTML"}))
+
+    await telegram_fanout.fan_out(admin_bot, staff_messages)
 
     # --- 7. NOTIFY CUSTOMER ---
     if new_status.notify_customer and order.user_id and client_bot:
         client_text = f"Статус вашого замовлення #{order.id} змінено на: <b>{new_status.name}</b>"
-        try: await client_bot.send_message(order.user_id, client_text, parse_mode="HTML")
-        except Exception: pass
+        await telegram_fanout.send(client_bot, order.user_id, client_text, parse_mode="HTML")
+
+    await commit_staff_notifications(session)
 
     # --- 8. WEBSOCKET BROADCAST ---
     await manager.broadcast_staff({
@@ -0,0 +1,238 @@
+# notification_outbox.py
+
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from aiogram import Bot
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import NotificationOutbox, Order, async_session_maker
+from notification_manager import (
+    notify_new_order_to_staff, notify_new_table_order, notify_all_parties_on_status_change
+)
+from telegram_fanout import DeliveryLog, delivery_log
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_POLL_SECONDS = float(os.environ.get("NOTIFY_OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_BATCH_SIZE = 20
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("NOTIFY_OUTBOX_MAX_ATTEMPTS", "8"))
+# Подію взято в роботу: інший процес не чіпає її, поки не мине оренда
+OUTBOX_LEASE = timedelta(seconds=120)
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 600
+# Скільки тримати відправлені події (для розбору інцидентів)
+SENT_RETENTION = timedelta(days=3)
+CLEANUP_INTERVAL_SECONDS = 3600
+
+
+class DeliveryFailed(Exception):
+    """Частину повідомлень не доставлено через тимчасову помилку Telegram - подію треба повторити."""
+
+
+def enqueue_notification(session: AsyncSession, event_type: str, **payload):
+    """
+    Додає подію в outbox у поточній транзакції викликача.
+    Після commit викликати notification_dispatcher.wake(), щоб не чекати опитування.
+    """
+    session.add(NotificationOutbox(
+        event_type=event_type, payload=payload,
+        status='pending', attempts=0, next_attempt_at=datetime.now()
+    ))
+
+
+def backoff_delay(attempts: int) -> float:
+    """5с, 10с, 20с ... до 10 хв, з невеликим розкидом."""
+    delay = min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+    return delay + random.uniform(0, delay * 0.1)
+
+
+class NotificationDispatcher:
+    """
+    Фоновий розсильник outbox: бере події, що настали, виконує обробник,
+    при помилці планує повтор з експоненційною затримкою.
+    """
+    def __init__(self):
+        self.admin_bot: Optional[Bot] = None
+        self.client_bot: Optional[Bot] = None
+        self._handlers: Dict[str, Callable[[AsyncSession, dict], Awaitable[None]]] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_cleanup = 0.0
+
+    def register(self, event_type: str, handler: Callable[[AsyncSession, dict], Awaitable[None]]):
+        self._handlers[event_type] = handler
+
+    def start(self, admin_bot: Optional[Bot], client_bot: Optional[Bot]):
+        self.admin_bot = admin_bot
+        self.client_bot = client_bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.drain()
+                await self._cleanup()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox: помилка розсилки: {e}")
+                processed = 0
+
+            # Повна пачка - одразу беремо наступну
+            if processed >= OUTBOX_BATCH_SIZE:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _claim_due(self) -> list:
+        now = datetime.now()
+        async with async_session_maker() as session:
+            due_ids = (await session.execute(
+                select(NotificationOutbox.id)
+                .where(NotificationOutbox.status == 'pending', NotificationOutbox.next_attempt_at <= now)
+                .order_by(NotificationOutbox.id)
+                .limit(OUTBOX_BATCH_SIZE)
+            )).scalars().all()
+
+            claimed = []
+            for event_id in due_ids:
+                # Умовний UPDATE: якщо подію вже взяв інший воркер, rowcount == 0
+                result = await session.execute(
+                    update(NotificationOutbox)
+                    .where(
+                        NotificationOutbox.id == event_id,
+                        NotificationOutbox.status == 'pending',
+                        NotificationOutbox.next_attempt_at <= now
+                    )
+                    .values(next_attempt_at=now + OUTBOX_LEASE, attempts=NotificationOutbox.attempts + 1)
+                )
+                if result.rowcount:
+                    claimed.append(event_id)
+            await session.commit()
+            return claimed
+
+    async def drain(self) -> int:
+        """Обробляє одну пачку подій. Повертає кількість взятих подій."""
+        claimed = await self._claim_due()
+        # Послідовно: "нове замовлення" має прийти раніше за "зміну статусу"
+        for event_id in claimed:
+            await self._dispatch(event_id)
+        return len(claimed)
+
+    async def _dispatch(self, event_id: int):
+        async with async_session_maker() as session:
+            event = await session.get(NotificationOutbox, event_id)
+            if event is None:
+                return
+            event_type, payload, attempts = event.event_type, dict(event.payload or {}), event.attempts
+
+            handler = self._handlers.get(event_type)
+            error = None
+            # Кому вже відправлено при попередніх спробах - повтор після часткової помилки не дублює
+            log = DeliveryLog(payload.get("delivered", []))
+            if handler is None:
+                error = f"Невідомий тип події: {event_type}"
+            else:
+                try:
+                    with delivery_log(log):
+                        await handler(session, payload)
+                    # notify_* не кидають винятків на помилках Telegram - перевіряємо результати відправки
+                    if log.failed:
+                        details = "; ".join(f"{o.chat_id}: {o.error}" for o in log.failed)
+                        raise DeliveryFailed(f"не доставлено {len(log.failed)}: {details}")
+                    await session.commit()
+                except Exception as e:
+                    await session.rollback()
+                    error = f"{type(e).__name__}: {e}"
+
+        async with async_session_maker() as session:
+            if error is None:
+                values = {"status": 'sent', "sent_at": datetime.now(), "last_error": None}
+            elif attempts >= OUTBOX_MAX_ATTEMPTS or handler is None:
+                logger.error(f"Outbox: подію #{event_id} ({event_type}) не доставлено після {attempts} спроб: {error}")
+                values = {"status": 'failed', "last_error": error}
+            else:
+                delay = backoff_delay(attempts)
+                logger.warning(f"Outbox: подія #{event_id} ({event_type}), спроба {attempts}: {error}. Повтор через {delay:.0f}с")
+                values = {"next_attempt_at": datetime.now() + timedelta(seconds=delay), "last_error": error}
+            if error is not None and log.delivered:
+                values["payload"] = {**payload, "delivered": sorted(log.delivered)}
+            await session.execute(update(NotificationOutbox).where(NotificationOutbox.id == event_id).values(**values))
+            await session.commit()
+
+    async def _cleanup(self):
+        if time.monotonic() - self._last_cleanup < CLEANUP_INTERVAL_SECONDS:
+            return
+        self._last_cleanup = time.monotonic()
+        async with async_session_maker() as session:
+            await session.execute(
+                delete(NotificationOutbox).where(
+                    NotificationOutbox.status == 'sent',
+                    NotificationOutbox.sent_at < datetime.now() - SENT_RETENTION
+                )
+            )
+            await session.commit()
+
+
+# Глобальний екземпляр
+notification_dispatcher = NotificationDispatcher()
+
+
+# --- Обробники подій ---
+
+async def _handle_new_order(session: AsyncSession, payload: dict):
+    if not notification_dispatcher.admin_bot:
+        return
+    # notify_new_order_to_staff сама довантажує замовлення за ID
+    await notify_new_order_to_staff(notification_dispatcher.admin_bot, Order(id=payload["order_id"]), session)
+
+
+async def _handle_table_order(session: AsyncSession, payload: dict):
+    await notify_new_table_order(notification_dispatcher.admin_bot, payload["order_id"], session)
+
+
+async def _handle_status_changed(session: AsyncSession, payload: dict):
+    """
+    Сповіщає про статус, встановлений подією (не поточний - він міг вже змінитися).
+    Склад обробляється в транзакції зміни статусу (apply_status_inventory), тут - лише сповіщення.
+    """
+    order = await session.get(Order, payload["order_id"])
+    if not order:
+        return
+    order.skip_inventory_return = payload.get("skip_inventory_return", False)
+    await notify_all_parties_on_status_change(
+        order, payload["old_status_name"], payload["actor_info"],
+        notification_dispatcher.admin_bot, notification_dispatcher.client_bot, session,
+        new_status_id=payload.get("new_status_id"),
+        inventory_returned=payload.get("inventory_returned", False),
+        # Події, поставлені до перенесення складу в транзакцію, ще обробляють склад тут
+        apply_inventory="new_status_id" not in payload
+    )
+
+
+notification_dispatcher.register("new_order", _handle_new_order)
+notification_dispatcher.register("table_order", _handle_table_order)
+notification_dispatcher.register("status_changed", _handle_status_changed)
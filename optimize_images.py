@@ -1,113 +1,279 @@
+import argparse
 import asyncio
+import hashlib
+import json
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 
 # Завантажуємо змінні оточення
 load_dotenv()
 
-from models import async_session_maker, Product
+from models import async_session_maker, Product, Banner, MarketingPopup, Settings
 import inventory_models  # Важливо для коректної роботи SQLAlchemy
 
-from sqlalchemy import select
-from PIL import Image
+from sqlalchemy import select, update
+from image_pipeline import (
+    process_image, remove_image_files, variant_paths, IMAGES_DIR,
+    PRODUCT_WIDTHS, BANNER_WIDTHS, HEADER_WIDTHS
+)
 
 # Налаштування оптимізації
-MAX_SIZE = (800, 800)
-QUALITY = 80
-TARGET_FORMAT = "WEBP"
+MANIFEST_PATH = os.path.join(IMAGES_DIR, ".optimize_manifest.json")
+# Оригінали, замінені в БД; видаляються окремо (--delete-sources) після перезапуску застосунку
+REPLACED_SOURCES_PATH = os.path.join(IMAGES_DIR, ".optimize_replaced.json")
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+DEFAULT_BATCH_SIZE = 50
 
-async def optimize_existing_images():
-    async with async_session_maker() as session:
-        result = await session.execute(select(Product).where(Product.image_url.is_not(None)))
-        products = result.scalars().all()
-        
-        print(f"Знайдено {len(products)} товарів з фото. Перевірка шляхів та оптимізація...")
-        
-        optimized_count = 0
-        fixed_path_count = 0
-        skipped = 0
-        errors = 0
-
-        for product in products:
-            if not product.image_url:
+# Поля з фото: (модель, поле URL, поле похідних або None, ширини, префікс файлу)
+IMAGE_FIELDS = [
+    (Product, "image_url", "image_variants", PRODUCT_WIDTHS, ""),
+    (Banner, "image_url", "image_variants", BANNER_WIDTHS, "banner_"),
+    (MarketingPopup, "image_url", None, (800,), "popup_"),
+    (Settings, "header_image_url", "header_image_variants", HEADER_WIDTHS, "header_bg_"),
+    (Settings, "logo_url", None, (400,), "logo_"),
+]
+
+
+def load_manifest() -> dict:
+    """Маніфест: '<sha1 вмісту>:<ширини>' -> {"image_url": ..., "variants": ...}"""
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(manifest: dict):
+    save_json(MANIFEST_PATH, manifest)
+
+
+def save_json(path: str, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def load_replaced_sources() -> list:
+    if os.path.exists(REPLACED_SOURCES_PATH):
+        with open(REPLACED_SOURCES_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return []
+
+
+def outputs_exist(entry: dict) -> bool:
+    paths = [entry["image_url"]] + [p for by_width in (entry.get("variants") or {}).values() for p in by_width.values()]
+    return all(os.path.exists(p) for p in paths)
+
+
+def resolve_path(image_url: str):
+    """Шлях до файлу на диску (у БД міг бути записаний з Windows-слешами)."""
+    if os.path.exists(image_url):
+        return image_url
+    windows_path = image_url.replace("/", "\\")
+    if os.path.exists(windows_path):
+        return windows_path
+    return None
+
+
+async def collect_jobs(session, stats: dict) -> list:
+    """Всі фото, які ще не оптимізовані. Записи з одним файлом-джерелом - одна задача."""
+    jobs = {}
+    for model, url_field, variants_field, widths, prefix in IMAGE_FIELDS:
+        columns = [model.id, getattr(model, url_field)]
+        if variants_field:
+            columns.append(getattr(model, variants_field))
+        rows = (await session.execute(select(*columns).where(getattr(model, url_field).is_not(None)))).all()
+
+        for row in rows:
+            record_id, image_url = row[0], row[1]
+            variants = row[2] if variants_field else None
+            if not image_url:
                 continue
 
-            original_url = product.image_url
-            is_changed = False
-
-            # --- ЕТАП 1: Виправлення слешів (Windows -> Linux/Web) ---
-            if "\\" in product.image_url:
-                product.image_url = product.image_url.replace("\\", "/")
-                is_changed = True
-                fixed_path_count += 1
-                # print(f"🔧 Шлях виправлено: {product.name}")
-
-            # Перевіряємо, чи існує файл (Python на Windows розуміє і прямі слеші /)
-            if not os.path.exists(product.image_url):
-                # Спробуємо знайти файл, якщо шлях був записаний "криво"
-                # (наприклад, якщо в БД /, а на диску Windows хоче \)
-                windows_path = product.image_url.replace("/", "\\")
-                if os.path.exists(windows_path):
-                    # Файл є, працюємо з ним
-                    current_file_path = windows_path
-                else:
-                    # print(f"⚠️ Файл не знайдено: {product.image_url}")
-                    continue
-            else:
-                current_file_path = product.image_url
+            # Вже оброблено: є похідні, або (для полів без похідних) це вже WebP
+            if variants or (not variants_field and image_url.lower().endswith(".webp")):
+                stats["skipped"] += 1
+                continue
+
+            source_path = resolve_path(image_url)
+            if not source_path:
+                stats["missing"] += 1
+                continue
+
+            key = (model, url_field, os.path.normpath(source_path))
+            if key in jobs:
+                jobs[key]["ids"].append(record_id)
+                continue
+            jobs[key] = {
+                "model": model, "ids": [record_id],
+                "url_field": url_field, "variants_field": variants_field,
+                "widths": widths, "prefix": prefix,
+                "image_url": image_url, "source_path": source_path
+            }
+    return list(jobs.values())
+
+
+async def commit_batch(batch: list, manifest: dict):
+    """
+    Записує нові шляхи в БД однією транзакцією. Оригінали не видаляються: запущений
+    застосунок ще віддає старі шляхи зі своїх кешів (меню, налаштування, стиснуті сторінки)
+    до перезапуску - вони лише записуються в список для --delete-sources.
+    """
+    if not batch:
+        return
+    # Маніфест - до commit: якщо скрипт впаде, наступний запуск підхопить готові файли
+    save_manifest(manifest)
+
+    async with async_session_maker() as session:
+        for job, entry in batch:
+            values = {job["url_field"]: entry["image_url"]}
+            if job["variants_field"]:
+                values[job["variants_field"]] = entry["variants"]
+            await session.execute(update(job["model"]).where(job["model"].id.in_(job["ids"])).values(**values))
+        await session.commit()
+
+    replaced = load_replaced_sources()
+    for job, entry in batch:
+        source = os.path.normpath(job["source_path"])
+        if source != os.path.normpath(entry["image_url"]) and source not in replaced:
+            replaced.append(source)
+    save_json(REPLACED_SOURCES_PATH, replaced)
+    print(f"💾 Збережено пакет: {len(batch)} фото")
+
+
+async def optimize_existing_images(workers: int = DEFAULT_WORKERS, batch_size: int = DEFAULT_BATCH_SIZE):
+    stats = {"optimized": 0, "reused": 0, "skipped": 0, "missing": 0, "errors": 0}
+
+    async with async_session_maker() as session:
+        jobs = await collect_jobs(session, stats)
+
+    print(f"Знайдено {len(jobs)} фото для оптимізації (процесів: {workers}, пакет: {batch_size})...")
 
-            # --- ЕТАП 2: Конвертація у WebP (якщо це ще не WebP) ---
-            if not product.image_url.lower().endswith('.webp'):
+    manifest = load_manifest()
+    loop = asyncio.get_running_loop()
+    # Не читаємо в пам'ять більше файлів, ніж встигають обробити процеси
+    slots = asyncio.Semaphore(workers * 2)
+    batch = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+
+        async def run_job(job):
+            async with slots:
                 try:
-                    with Image.open(current_file_path) as img:
-                        if img.mode in ("RGBA", "P"):
-                            img = img.convert("RGB")
-                        
-                        img.thumbnail(MAX_SIZE)
-                        
-                        directory = os.path.dirname(current_file_path)
-                        filename_no_ext = os.path.splitext(os.path.basename(current_file_path))[0]
-                        new_filename = f"{filename_no_ext}.webp"
-                        new_file_path = os.path.join(directory, new_filename)
-                        
-                        # Зберігаємо
-                        img.save(new_file_path, format=TARGET_FORMAT, quality=QUALITY, optimize=True)
-                    
-                    # Оновлюємо посилання в БД (обов'язково з правильними слешами)
-                    product.image_url = new_file_path.replace("\\", "/")
-                    is_changed = True
-                    optimized_count += 1
-                    
-                    # Видаляємо старий файл, якщо ім'я змінилося
-                    if current_file_path != new_file_path:
-                        try:
-                            os.remove(current_file_path)
-                        except Exception as e:
-                            print(f"Не вдалося видалити старий файл: {e}")
-
-                    print(f"✅ Оптимізовано: {product.name}")
+                    with open(job["source_path"], "rb") as f:
+                        data = f.read()
+                except FileNotFoundError as e:
+                    return job, None, False, e
+                job["key"] = f"{hashlib.sha1(data).hexdigest()}:{','.join(map(str, job['widths']))}"
+
+                # Цей вміст вже конвертували в попередньому (перерваному) запуску
+                entry = manifest.get(job["key"])
+                if entry and outputs_exist(entry):
+                    return job, entry, True, None
 
+                try:
+                    image_url, variants = await loop.run_in_executor(
+                        executor, process_image, data, job["widths"], job["prefix"]
+                    )
                 except Exception as e:
-                    errors += 1
-                    print(f"❌ Помилка обробки {product.name}: {e}")
+                    return job, None, False, e
+                if not job["variants_field"]:
+                    # Поле без похідних (popup, логотип) - лишаємо тільки основний WebP
+                    for path in variant_paths(variants):
+                        if path != image_url:
+                            remove_image_files(path)
+                    variants = None
+                entry = {"image_url": image_url, "variants": variants}
+                return job, entry, False, None
+
+        for task in asyncio.as_completed([run_job(job) for job in jobs]):
+            job, entry, reused, error = await task
+            if isinstance(error, FileNotFoundError):
+                stats["missing"] += 1
+                print(f"⚠️ Файл зник під час обробки: {job['source_path']}")
+                continue
+            if error:
+                stats["errors"] += 1
+                print(f"❌ Помилка обробки {job['image_url']}: {error}")
+                continue
+
+            if reused:
+                stats["reused"] += 1
             else:
-                skipped += 1
+                manifest[job["key"]] = entry
+                stats["optimized"] += 1
+                print(f"✅ Оптимізовано: {job['image_url']}")
 
-            # Якщо ми виправили шлях АБО оптимізували фото -> зберігаємо в БД
-            if is_changed:
-                session.add(product)
+            batch.append((job, entry))
+            if len(batch) >= batch_size:
+                await commit_batch(batch, manifest)
+                batch = []
+
+    await commit_batch(batch, manifest)
+
+    print("-" * 30)
+    print(f"🏁 Готово!")
+    print(f"Оптимізовано: {stats['optimized']}")
+    print(f"Взято з маніфесту (попередній запуск): {stats['reused']}")
+    print(f"Вже оптимізовані: {stats['skipped']}")
+    print(f"Файл не знайдено: {stats['missing']}")
+    print(f"Помилок: {stats['errors']}")
+    if stats["optimized"] or stats["reused"]:
+        print("ℹ️ Перезапустіть застосунок, щоб кеш меню та сторінок підхопив нові фото.")
+        print("ℹ️ Після перезапуску видаліть оригінали: python optimize_images.py --delete-sources")
+
+
+async def referenced_paths(session) -> set:
+    """Усі шляхи до фото, на які зараз посилається БД (основні та похідні)."""
+    paths = set()
+    for model, url_field, variants_field, _, _ in IMAGE_FIELDS:
+        columns = [getattr(model, url_field)]
+        if variants_field:
+            columns.append(getattr(model, variants_field))
+        for row in (await session.execute(select(*columns))).all():
+            if row[0]:
+                paths.add(os.path.normpath(row[0]))
+            if variants_field:
+                paths.update(os.path.normpath(p) for p in variant_paths(row[1]))
+    return paths
+
+
+async def delete_replaced_sources():
+    """Видаляє оригінали, замінені попередніми запусками (запускати після перезапуску застосунку)."""
+    replaced = load_replaced_sources()
+    if not replaced:
+        print("Немає оригіналів для видалення.")
+        return
+
+    async with async_session_maker() as session:
+        in_use = await referenced_paths(session)
+
+    removed, kept = 0, []
+    for path in replaced:
+        # На файл знову посилається запис (напр. завантажили те саме фото) - не чіпаємо
+        if path in in_use:
+            kept.append(path)
+            continue
+        if os.path.exists(path):
+            remove_image_files(path)
+            removed += 1
+    save_json(REPLACED_SOURCES_PATH, kept)
+    print(f"🗑 Видалено оригіналів: {removed}, залишено (ще використовуються): {len(kept)}")
 
-        await session.commit()
-        
-        print("-" * 30)
-        print(f"🏁 Готово!")
-        print(f"Виправлено шляхів (слешів): {fixed_path_count}")
-        print(f"Оптимізовано (конвертовано): {optimized_count}")
-        print(f"Вже були WebP: {skipped}")
-        print(f"Помилок: {errors}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетна оптимізація фото (похідні WebP/AVIF для srcset)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Кількість процесів")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Скільки оновлень писати в БД за один commit")
+    parser.add_argument("--delete-sources", action="store_true",
+                        help="Видалити оригінали, замінені попередніми запусками (після перезапуску застосунку)")
+    args = parser.parse_args()
+
     if sys.platform == 'win32':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    asyncio.run(optimize_existing_images())
\ No newline at end of file
+    if args.delete_sources:
+        asyncio.run(delete_replaced_sources())
+    else:
+        asyncio.run(optimize_existing_images(args.workers, args.batch_size))
@@ -0,0 +1,87 @@
+# order_intake.py
+
+import logging
+from decimal import Decimal
+from typing import List, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Order, OrderItem, OrderLog
+from menu_cache import MenuSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Верхня межа кількості однієї страви в замовленні (захист від помилок і підробених запитів)
+MAX_ITEM_QUANTITY = 100
+
+
+def price_cart(menu: MenuSnapshot, items: list) -> Tuple[Decimal, List[dict], List[str]]:
+    """
+    Рахує кошик за цінами зі знімка меню (без запитів до БД).
+    Повертає (сума, рядки для order_items, назви для логу).
+    Невідомі/неактивні страви та модифікатори пропускаються.
+    Кількість поза 1..MAX_ITEM_QUANTITY - 400.
+    """
+    total_price = Decimal('0.00')
+    item_rows = []
+    log_items = []
+
+    try:
+        for item in items:
+            product = menu.products_by_id.get(int(item['id']))
+            if not product:
+                continue
+            qty = int(item.get('quantity', 1))
+            if not 1 <= qty <= MAX_ITEM_QUANTITY:
+                raise HTTPException(status_code=400, detail=f"Невірна кількість: {qty} (від 1 до {MAX_ITEM_QUANTITY}).")
+
+            final_modifiers_data = []
+            mods_price_sum = Decimal(0)
+            for raw_mod in item.get('modifiers', []):
+                mod = menu.modifiers_by_id.get(int(raw_mod.get('id')))
+                if not mod:
+                    continue
+                mods_price_sum += mod["price"]
+                final_modifiers_data.append({
+                    "id": mod["id"],
+                    "name": mod["name"],
+                    "price": float(mod["price"]),
+                    "ingredient_id": mod["ingredient_id"],
+                    "ingredient_qty": mod["ingredient_qty"],
+                    "warehouse_id": mod["warehouse_id"]
+                })
+
+            item_total_price = product["price_decimal"] + mods_price_sum
+            total_price += item_total_price * qty
+            log_items.append(f"{product['name']} x{qty}")
+
+            item_rows.append({
+                "product_id": product["id"],
+                "product_name": product["name"],
+                "quantity": qty,
+                "price_at_moment": item_total_price,
+                "preparation_area": product["preparation_area"],
+                "modifiers": final_modifiers_data
+            })
+    except (KeyError, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Невірний формат ID.")
+
+    return total_price, item_rows, log_items
+
+
+async def insert_order(session: AsyncSession, order_values: dict, item_rows: List[dict], log_message: str, log_actor: str) -> int:
+    """
+    Записує замовлення, його позиції та лог у поточній транзакції.
+    ID повертається через RETURNING - без flush/refresh ORM-об'єкта.
+    Commit робить викликач.
+    """
+    order_id = (await session.execute(
+        insert(Order).values(**order_values).returning(Order.id)
+    )).scalar_one()
+
+    if item_rows:
+        await session.execute(insert(OrderItem), [{**row, "order_id": order_id} for row in item_rows])
+    await session.execute(insert(OrderLog).values(order_id=order_id, message=log_message, actor=log_actor))
+    return order_id
@@ -0,0 +1,51 @@
+# order_loading.py
+
+"""
+Профілі завантаження Order.
+
+Історія статусів і лог дій у моделі мають lazy='raise': кожен запит явно
+обирає потрібний профіль і не тягне зайвих IN-запитів по тисячах ID.
+Використання: select(Order).options(*ORDER_LIST_CARD)
+"""
+
+from sqlalchemy.orm import joinedload, selectinload, raiseload
+
+from models import Order, OrderItem, OrderStatusHistory
+
+# Рядок звіту: тільки колонки замовлення (суми, дати, оплата)
+ORDER_REPORT_ROW = (
+    raiseload(Order.items),
+    raiseload(Order.status),
+)
+
+# Рядок звіту зі складом (розгортання в звіті, експорт CSV)
+ORDER_REPORT_ROW_WITH_ITEMS = (
+    selectinload(Order.items),
+    raiseload(Order.status),
+)
+
+# Картка у списках PWA (офіціант, кур'єр, оператор)
+ORDER_LIST_CARD = (
+    joinedload(Order.status),
+    joinedload(Order.table),
+    joinedload(Order.accepted_by_waiter),
+    joinedload(Order.courier),
+    selectinload(Order.items),
+)
+
+# Чек для кухні/бару: страви разом з продуктом (цех приготування)
+ORDER_KITCHEN_TICKET = (
+    joinedload(Order.status),
+    joinedload(Order.table),
+    selectinload(Order.items).joinedload(OrderItem.product),
+)
+
+# Повна картка замовлення в адмінці: історія статусів і лог дій
+ORDER_FULL_DETAIL = (
+    joinedload(Order.status),
+    joinedload(Order.courier),
+    joinedload(Order.table),
+    selectinload(Order.items),
+    selectinload(Order.history).joinedload(OrderStatusHistory.status),
+    selectinload(Order.logs),
+)
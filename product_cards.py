@@ -0,0 +1,84 @@
+# product_cards.py
+
+import html
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from menu_cache import MenuSnapshot
+from image_pipeline import picture_html, PRODUCT_SIZES
+
+logger = logging.getLogger(__name__)
+
+
+def render_product_card(prod: dict) -> str:
+    """HTML картки страви для SSR-вітрини (сайт доставки)."""
+    img_src = f"/{prod['image_url']}" if prod["image_url"] else "/static/images/placeholder.jpg"
+    # srcset/sizes: телефон завантажить 320-480px замість повного фото
+    img_html = picture_html(
+        img_src, prod["srcset"], prod["srcset_avif"], PRODUCT_SIZES,
+        f'alt="{html.escape(prod["name"])}" class="product-image" loading="lazy"'
+    )
+
+    # Формуємо JSON для кнопки (щоб JS підхопив логіку)
+    prod_data = {
+        "id": prod["id"], "name": prod["name"], "description": prod["description"],
+        "price": prod["price"], "image_url": prod["image_url"],
+        "srcset": prod["srcset"], "srcset_avif": prod["srcset_avif"],
+        "category_id": prod["category_id"],
+        "category_name": prod["category_name"],
+        "modifiers": prod["modifiers"],
+        "slug": prod["slug"] # Додаємо slug для посилань
+    }
+    # Екрануємо лапки для HTML атрибута
+    prod_json = json.dumps(prod_data).replace('"', '&quot;')
+
+    return f'''
+            <div class="product-card">
+                <div class="product-image-wrapper">
+                    {img_html}
+                </div>
+                <div class="product-info">
+                    <div class="product-header">
+                        <h3 class="product-name">{html.escape(prod['name'])}</h3>
+                        <div class="product-desc">{html.escape(prod['description'] or "")}</div>
+                    </div>
+                    <div class="product-footer">
+                        <div class="product-price">{prod['price_text']} грн</div>
+                        <button class="add-btn" data-product="{prod_json}" onclick="event.stopPropagation(); handleAddClick(this)">
+                            <span>Додати</span> <i class="fa-solid fa-plus"></i>
+                        </button>
+                    </div>
+                </div>
+                <a href="?p={prod_data['slug']}" style="display:none;">{html.escape(prod['name'])}</a>
+            </div>
+            '''
+
+
+class ProductCardCache:
+    """
+    Кеш готових HTML-карток: product_id -> (версія страви, HTML).
+    Після перебудови меню повторно рендеряться лише змінені страви.
+    """
+    def __init__(self):
+        self._cards: Dict[int, Tuple[tuple, str]] = {}
+        self._menu_version: Optional[int] = None
+
+    def get_cards(self, menu: MenuSnapshot, products: List[dict]) -> List[str]:
+        if self._menu_version != menu.version:
+            # Нове меню - прибираємо картки видалених/вимкнених страв
+            self._menu_version = menu.version
+            self._cards = {pid: card for pid, card in self._cards.items() if pid in menu.products_by_id}
+
+        cards = []
+        for prod in products:
+            cached = self._cards.get(prod["id"])
+            if cached is None or cached[0] != prod["version"]:
+                cached = (prod["version"], render_product_card(prod))
+                self._cards[prod["id"]] = cached
+            cards.append(cached[1])
+        return cards
+
+
+# Глобальний екземпляр
+product_card_cache = ProductCardCache()
@@ -0,0 +1,113 @@
+# read_replica.py
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from db_pool import engine_options, replica_pool_metrics, ReplicaTimedQueuePool
+from models import async_session_maker
+
+logger = logging.getLogger(__name__)
+
+# Необов'язкова репліка для важких звітів; без неї все читається з основної БД
+DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+# Якщо репліка відстає більше - звіти йдуть на основну БД
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get("DB_REPLICA_MAX_LAG_SECONDS", "30"))
+# Як часто перевіряти відставання (результат кешується між запитами)
+REPLICA_CHECK_SECONDS = float(os.environ.get("DB_REPLICA_CHECK_SECONDS", "5"))
+
+# Позначка в session.info: кеші не зберігають знімки, прочитані з репліки
+READ_REPLICA_KEY = "read_replica"
+
+# Відставання в секундах; 0 - якщо репліка повністю наздогнала основну БД
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def is_replica_session(session: AsyncSession) -> bool:
+    return bool(session.info.get(READ_REPLICA_KEY))
+
+
+class ReplicaRouter:
+    """
+    Обирає, звідки читати звіти: репліка, якщо вона налаштована, доступна
+    і не відстає більше REPLICA_MAX_LAG_SECONDS; інакше - основна БД.
+    """
+    def __init__(self, database_url: Optional[str]):
+        self.engine = None
+        self._session_maker = None
+        if database_url:
+            options = engine_options(database_url)
+            if "poolclass" in options:
+                options["poolclass"] = ReplicaTimedQueuePool
+            self.engine = create_async_engine(database_url, **options)
+            self._session_maker = sessionmaker(
+                self.engine, class_=AsyncSession, expire_on_commit=False,
+                info={READ_REPLICA_KEY: True}
+            )
+        self._usable = False
+        self._checked_at = 0.0
+        self.last_lag: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def _check(self) -> bool:
+        try:
+            async with self.engine.connect() as conn:
+                if self.engine.dialect.name == "postgresql":
+                    lag = float((await conn.execute(text(REPLICA_LAG_SQL))).scalar() or 0)
+                else:
+                    await conn.execute(text("SELECT 1"))
+                    lag = 0.0
+        except Exception as e:
+            logger.warning(f"Репліка недоступна, звіти читаються з основної БД: {e}")
+            self.last_lag = None
+            return False
+
+        self.last_lag = lag
+        if lag > REPLICA_MAX_LAG_SECONDS:
+            logger.warning(f"Репліка відстає на {lag:.0f}с (ліміт {REPLICA_MAX_LAG_SECONDS:.0f}с), звіти читаються з основної БД")
+            return False
+        return True
+
+    async def is_usable(self) -> bool:
+        if self.engine is None:
+            return False
+        if time.monotonic() - self._checked_at < REPLICA_CHECK_SECONDS:
+            return self._usable
+        async with self._lock:
+            # Поки чекали на lock, перевірку міг зробити інший запит
+            if time.monotonic() - self._checked_at >= REPLICA_CHECK_SECONDS:
+                self._usable = await self._check()
+                self._checked_at = time.monotonic()
+            return self._usable
+
+    async def session_maker(self):
+        if await self.is_usable():
+            return self._session_maker
+        return async_session_maker
+
+    def stats(self) -> Optional[dict]:
+        if self.engine is None:
+            return None
+        data = replica_pool_metrics.snapshot(self.engine.pool)
+        data.update({"usable": self._usable, "lag_seconds": self.last_lag})
+        return data
+
+    async def dispose(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+
+
+# Глобальний екземпляр
+replica_router = ReplicaRouter(DATABASE_REPLICA_URL)
@@ -0,0 +1,66 @@
+# search.py
+
+"""
+Пошук в адмінці: замовлення, клієнти, інгредієнти.
+
+PostgreSQL: ILIKE '%...%' обслуговують trigram GIN-індекси (pg_trgm, міграція 0008),
+телефон порівнюється лише за цифрами - тим самим виразом, що й в індексі,
+тому "067 123" знаходить "+38 (067) 123-45-67".
+SQLite: ті самі запити працюють без індексів.
+"""
+
+import re
+from typing import Optional
+
+from sqlalchemy import func, literal_column, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Менше 3 цифр - занадто загально, триграм з такого не побудувати
+MIN_PHONE_DIGITS = 3
+# Символи, що прибираються з телефону на SQLite (немає regexp_replace)
+PHONE_STRIP_CHARS = (" ", "-", "(", ")", "+", ".")
+
+
+def phone_digits(value: Optional[str]) -> str:
+    """Лише цифри номера: '+38 (067) 123-45-67' -> '380671234567'."""
+    return re.sub(r"\D", "", value or "")
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def contains(column, q: str):
+    """Підрядок без урахування регістру; % та _ у запиті - звичайні символи."""
+    return column.ilike(f"%{escape_like(q)}%", escape="\\")
+
+
+def phone_digits_expr(column, dialect_name: str):
+    if dialect_name == "postgresql":
+        # Літерали, а не параметри: вираз має збігатися з індексом ix_orders_phone_digits_trgm
+        return func.regexp_replace(column, literal_column("'[^0-9]'"), literal_column("''"), literal_column("'g'"))
+    expr = column
+    for char in PHONE_STRIP_CHARS:
+        expr = func.replace(expr, char, "")
+    return expr
+
+
+def phone_contains(column, q: str, dialect_name: str):
+    """Умова по цифрах телефону або None, якщо в запиті замало цифр."""
+    digits = phone_digits(q)
+    if len(digits) < MIN_PHONE_DIGITS:
+        return None
+    return phone_digits_expr(column, dialect_name).like(f"%{digits}%")
+
+
+def name_or_phone(name_column, phone_column, q: str, dialect_name: str):
+    """Пошук клієнта: ім'я містить запит або цифри телефону містять цифри запиту."""
+    conditions = [contains(name_column, q)]
+    phone_condition = phone_contains(phone_column, q, dialect_name)
+    if phone_condition is not None:
+        conditions.append(phone_condition)
+    return or_(*conditions)
+
+
+def dialect_of(session: AsyncSession) -> str:
+    return session.bind.dialect.name
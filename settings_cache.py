@@ -0,0 +1,56 @@
+# settings_cache.py
+
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Settings
+from read_replica import is_replica_session
+
+logger = logging.getLogger(__name__)
+
+
+class SettingsCache:
+    """
+    In-process кеш рядка Settings (id=1).
+    Віддає від'єднану копію (не прив'язану до сесії) - тільки для читання.
+    Обробники, що зберігають налаштування, працюють з рядком з БД напряму
+    і викликають invalidate() після commit.
+    """
+    def __init__(self):
+        self._version: int = 0
+        self._settings: Optional[Settings] = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._version += 1
+        self._settings = None
+
+    async def get(self, session: AsyncSession) -> Settings:
+        settings = self._settings
+        if settings is not None:
+            return settings
+
+        async with self._lock:
+            if self._settings is not None:
+                return self._settings
+
+            version = self._version
+            row = await session.get(Settings, 1)
+            if row is None:
+                # Рядок створюється при старті (lifespan), тут лише запасний варіант без запису в БД
+                settings = Settings(id=1)
+            else:
+                settings = Settings(**{attr.key: getattr(row, attr.key) for attr in Settings.__mapper__.column_attrs})
+
+            # Якщо під час читання налаштування зберегли - не кешуємо застарілу копію
+            # (як і копію з репліки, що може відставати від щойно збереженого)
+            if version == self._version and not is_replica_session(session):
+                self._settings = settings
+            return settings
+
+
+# Глобальний екземпляр
+settings_cache = SettingsCache()
@@ -0,0 +1,92 @@
+# sitemap_cache.py
+
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import quote_plus as url_quote_plus
+from xml.sax.saxutils import escape as xml_escape
+
+from menu_cache import MenuSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Скільки URL в одному файлі sitemap (ліміт протоколу - 50 000)
+SITEMAP_CHUNK_SIZE = 10000
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+# Канонічна адреса сайту (напр. https://example.com). Без неї береться з запиту (заголовок Host)
+SITE_URL = os.environ.get("SITE_URL", "").rstrip("/")
+
+
+def site_base_url(request_base_url) -> str:
+    return SITE_URL or str(request_base_url).rstrip("/")
+
+
+def _lastmod(value: Optional[datetime]) -> str:
+    return (value or datetime.now()).strftime("%Y-%m-%d")
+
+
+def _url_entry(loc: str, lastmod: str, changefreq: str, priority: str) -> str:
+    return (
+        f"<url><loc>{xml_escape(loc)}</loc><lastmod>{lastmod}</lastmod>"
+        f"<changefreq>{changefreq}</changefreq><priority>{priority}</priority></url>\n"
+    )
+
+
+class SitemapCache:
+    """
+    Готові фрагменти sitemap.xml, побудовані зі знімку меню.
+    Перебудовуються тільки коли змінюється версія меню (страви/категорії).
+    Якщо страв більше за SITEMAP_CHUNK_SIZE, /sitemap.xml віддає sitemap index,
+    а самі URL розбиваються на /sitemap-{n}.xml.
+    Зберігається один набір: base_url без SITE_URL приходить з Host і кешувати
+    по копії на кожне значення заголовка не можна.
+    """
+    def __init__(self):
+        self._version: Optional[int] = None
+        self._base_url: Optional[str] = None
+        # ім'я файлу -> список фрагментів
+        self._documents: Optional[Dict[str, List[str]]] = None
+
+    def get(self, menu: MenuSnapshot, base_url: str) -> Dict[str, List[str]]:
+        if self._documents is None or self._version != menu.version or self._base_url != base_url:
+            self._documents = self._build(menu, base_url)
+            self._version = menu.version
+            self._base_url = base_url
+        return self._documents
+
+    def _build(self, menu: MenuSnapshot, base_url: str) -> Dict[str, List[str]]:
+        products = sorted(menu.products, key=lambda p: p["id"])
+        site_lastmod = _lastmod(max((p["updated_at"] for p in products if p["updated_at"]), default=None))
+
+        entries = [_url_entry(f"{base_url}/", site_lastmod, "daily", "1.0")]
+        for p in products:
+            entries.append(_url_entry(
+                f"{base_url}/?p={url_quote_plus(p['slug'])}", _lastmod(p["updated_at"]), "weekly", "0.8"
+            ))
+
+        urlset_open = XML_HEADER + '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        urlset_close = "</urlset>\n"
+
+        if len(entries) <= SITEMAP_CHUNK_SIZE:
+            documents = {"sitemap.xml": [urlset_open, *entries, urlset_close]}
+        else:
+            documents = {}
+            index = [XML_HEADER + '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+            for n, start in enumerate(range(0, len(entries), SITEMAP_CHUNK_SIZE), start=1):
+                name = f"sitemap-{n}.xml"
+                documents[name] = [urlset_open, *entries[start:start + SITEMAP_CHUNK_SIZE], urlset_close]
+                index.append(
+                    f"<sitemap><loc>{xml_escape(f'{base_url}/{name}')}</loc><lastmod>{site_lastmod}</lastmod></sitemap>\n"
+                )
+            index.append("</sitemapindex>\n")
+            documents["sitemap.xml"] = index
+
+        logger.info(f"Sitemap перебудовано (версія меню {menu.version}): {len(entries)} URL, файлів: {len(documents)}")
+        return documents
+
+
+# Глобальний екземпляр
+sitemap_cache = SitemapCache()
@@ -4,9 +4,10 @@ import html
 import logging
 import json
 import urllib.parse
+from typing import Optional
 from decimal import Decimal
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, Form, Request, Response, status, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Form, Request, Response, status, WebSocket, WebSocketDisconnect, Query
 from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, or_, func, delete, and_, desc
@@ -19,8 +20,8 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardButton
 
 # Імпорт моделей і залежностей
 from models import (
-    Employee, Settings, Order, OrderStatus, Role, OrderItem, Table, 
-    Category, Product, OrderStatusHistory, StaffNotification, BalanceHistory,
+    Employee, Order, OrderStatus, OrderItem, Table, 
+    Product, OrderStatusHistory, StaffNotification, BalanceHistory,
     OrderLog
 )
 # Імпорт моделей інвентаря
@@ -37,11 +38,14 @@ from staff_templates import (
 
 # Імпорт менеджерів сповіщень та каси
 from notification_manager import (
-    notify_all_parties_on_status_change, 
-    notify_new_order_to_staff, 
     notify_station_completion,
-    create_staff_notification
+    create_staff_notification,
+    create_staff_notifications,
+    announce_staff_notifications,
+    commit_staff_notifications,
+    apply_status_inventory
 )
+from notification_outbox import enqueue_notification, notification_dispatcher
 from cash_service import (
     link_order_to_shift, register_employee_debt, unregister_employee_debt,
     get_any_open_shift, open_new_shift, close_active_shift, 
@@ -53,6 +57,13 @@ from inventory_service import (
     generate_cook_ticket, calculate_order_prime_cost
 )
 from websocket_manager import manager
+from menu_cache import menu_cache
+from settings_cache import settings_cache
+from staff_roster import staff_roster
+from status_registry import status_registry
+from order_loading import ORDER_LIST_CARD, ORDER_KITCHEN_TICKET
+from static_assets import static_assets
+from http_cache import make_etag, is_not_modified, not_modified_response, cache_headers
 
 # Налаштування роутера та логера
 router = APIRouter(prefix="/staff", tags=["staff_pwa"])
@@ -132,7 +143,7 @@ async def check_and_update_order_readiness(session: AsyncSession, order_id: int,
 
     # Якщо ВСЕ готово, змінюємо глобальний статус замовлення
     if all_items_ready:
-        ready_status = await session.scalar(select(OrderStatus).where(OrderStatus.name == "Готовий до видачі").limit(1))
+        ready_status = (await status_registry.get(session)).named("Готовий до видачі")
         
         # Змінюємо статус тільки якщо він ще не фінальний і не "Готов"
         if ready_status and order.status_id != ready_status.id and not order.status.is_completed_status:
@@ -140,14 +151,20 @@ async def check_and_update_order_readiness(session: AsyncSession, order_id: int,
             order.status_id = ready_status.id
             session.add(OrderStatusHistory(order_id=order.id, status_id=ready_status.id, actor_info="Система (Авто-готовність)"))
             
-            # Сповіщаємо всіх про зміну статусу
-            await notify_all_parties_on_status_change(
-                order, old_status, "Система", bot, None, session
+            # Сповіщаємо всіх про зміну статусу (outbox, тим самим commit)
+            enqueue_notification(
+                session, "status_changed",
+                order_id=order.id, old_status_name=old_status, actor_info="Система",
+                new_status_id=ready_status.id
             )
+            # Списання зі складу - в цій же транзакції, а не в розсилці
+            await apply_status_inventory(session, order, ready_status)
             updated = True
 
     if updated:
         await session.commit()
+        await announce_staff_notifications(session)
+        notification_dispatcher.wake()
 
 # --- WEBSOCKET ДЛЯ ПЕРСОНАЛУ ---
 @router.websocket("/ws")
@@ -172,7 +189,7 @@ async def login_page(request: Request):
     token = request.cookies.get("staff_access_token")
     if token:
         return RedirectResponse(url="/staff/dashboard")
-    return STAFF_LOGIN_HTML
+    return static_assets.rewrite_html(STAFF_LOGIN_HTML)
 
 @router.post("/login")
 async def login_action(
@@ -235,7 +252,7 @@ async def dashboard(request: Request, session: AsyncSession = Depends(get_db_ses
         response.delete_cookie("staff_access_token")
         return response
 
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     
     if 'role' not in employee.__dict__:
         await session.refresh(employee, ['role'])
@@ -305,14 +322,14 @@ async def dashboard(request: Request, session: AsyncSession = Depends(get_db_ses
     </div>
     """
     
-    return STAFF_DASHBOARD_HTML.format(
+    return static_assets.rewrite_html(STAFF_DASHBOARD_HTML.format(
         site_title=settings.site_title or "Staff App",
         content=content
-    )
+    ))
 
 @router.get("/manifest.json")
 async def get_manifest(session: AsyncSession = Depends(get_db_session)):
-    settings = await session.get(Settings, 1) or Settings()
+    settings = await settings_cache.get(session)
     return JSONResponse({
         "name": f"{settings.site_title} Staff",
         "short_name": "Staff",
@@ -321,9 +338,9 @@ async def get_manifest(session: AsyncSession = Depends(get_db_session)):
         "background_color": "#ffffff",
         "theme_color": settings.primary_color or "#333333",
         "icons": [
-            {"src": "/static/favicons/icon-192.png", "sizes": "192x192", "type": "image/png"},
-            {"src": "/static/favicons/icon-512.png", "sizes": "512x512", "type": "image/png"},
-            {"src": "/static/favicons/apple-touch-icon.png", "sizes": "180x180", "type": "image/png"}
+            {"src": static_assets.url("static/favicons/icon-192.png"), "sizes": "192x192", "type": "image/png"},
+            {"src": static_assets.url("static/favicons/icon-512.png"), "sizes": "512x512", "type": "image/png"},
+            {"src": static_assets.url("static/favicons/apple-touch-icon.png"), "sizes": "180x180", "type": "image/png"}
         ]
     })
 
@@ -333,6 +350,7 @@ async def get_manifest(session: AsyncSession = Depends(get_db_session)):
 async def toggle_shift_api(session: AsyncSession = Depends(get_db_session), employee: Employee = Depends(get_current_staff)):
     employee.is_on_shift = not employee.is_on_shift
     await session.commit()
+    staff_roster.invalidate()
     return JSONResponse({"status": "ok", "is_on_shift": employee.is_on_shift})
 
 @router.get("/api/notifications")
@@ -449,9 +467,9 @@ async def _render_tables_view(session: AsyncSession, employee: Employee):
     if not tables: 
         return JSONResponse({"html": "<div class='empty-state'><i class='fa-solid fa-chair'></i>За вами не закріплено столиків.</div>"})
     
+    final_ids = (await status_registry.get(session)).final_ids
     html_content = "<div class='grid-container'>"
     for t in tables:
-        final_ids = select(OrderStatus.id).where(or_(OrderStatus.is_completed_status==True, OrderStatus.is_cancelled_status==True))
         active_count = await session.scalar(
             select(func.count(Order.id)).where(Order.table_id == t.id, Order.status_id.not_in(final_ids))
         )
@@ -473,14 +491,11 @@ async def _render_tables_view(session: AsyncSession, employee: Employee):
     return JSONResponse({"html": html_content})
 
 async def _get_waiter_orders_grouped(session: AsyncSession, employee: Employee):
-    final_ids = (await session.execute(select(OrderStatus.id).where(or_(OrderStatus.is_completed_status == True, OrderStatus.is_cancelled_status == True)))).scalars().all()
+    final_ids = (await status_registry.get(session)).final_ids
     
     tables_sub = select(Table.id).where(Table.assigned_waiters.any(Employee.id == employee.id))
     
-    q = select(Order).options(
-        joinedload(Order.status), joinedload(Order.table), joinedload(Order.accepted_by_waiter),
-        selectinload(Order.items)
-    ).where(
+    q = select(Order).options(*ORDER_LIST_CARD).where(
         Order.status_id.not_in(final_ids),
         or_(Order.accepted_by_waiter_id == employee.id, Order.table_id.in_(tables_sub))
     ).order_by(Order.table_id, Order.id.desc())
@@ -785,11 +800,7 @@ async def _get_production_orders(session: AsyncSession, employee: Employee):
     is_bar = employee.role.can_receive_bar_orders
 
     # Надійний запит: беремо ТІЛЬКИ ті замовлення, статус яких має прапорець requires_kitchen_notify
-    q = select(Order).join(OrderStatus).options(
-        joinedload(Order.table), 
-        selectinload(Order.items).joinedload(OrderItem.product), 
-        joinedload(Order.status)
-    ).where(
+    q = select(Order).join(OrderStatus).options(*ORDER_KITCHEN_TICKET).where(
         OrderStatus.requires_kitchen_notify == True,
         or_(OrderStatus.visible_to_chef == True, OrderStatus.visible_to_bartender == True)
     ).order_by(Order.id.asc())
@@ -870,8 +881,8 @@ async def _get_production_orders(session: AsyncSession, employee: Employee):
     return orders_data
 
 async def _get_my_courier_orders(session: AsyncSession, employee: Employee):
-    final_ids = (await session.execute(select(OrderStatus.id).where(or_(OrderStatus.is_completed_status == True, OrderStatus.is_cancelled_status == True)))).scalars().all()
-    q = select(Order).options(joinedload(Order.status), selectinload(Order.items)).where(Order.courier_id == employee.id, Order.status_id.not_in(final_ids)).order_by(Order.id.desc())
+    final_ids = (await status_registry.get(session)).final_ids
+    q = select(Order).options(*ORDER_LIST_CARD).where(Order.courier_id == employee.id, Order.status_id.not_in(final_ids)).order_by(Order.id.desc())
     orders = (await session.execute(q)).scalars().all()
     res = []
     for o in orders:
@@ -926,7 +937,7 @@ async def _get_my_courier_orders(session: AsyncSession, employee: Employee):
     return res
 
 async def _get_all_delivery_orders_for_admin(session: AsyncSession, employee: Employee):
-    final_ids = (await session.execute(select(OrderStatus.id).where(or_(OrderStatus.is_completed_status == True, OrderStatus.is_cancelled_status == True)))).scalars().all()
+    final_ids = (await status_registry.get(session)).final_ids
     
     q = select(Order).options(
         joinedload(Order.status), joinedload(Order.courier)
@@ -965,11 +976,9 @@ async def _get_all_delivery_orders_for_admin(session: AsyncSession, employee: Em
     return res
 
 async def _get_general_orders(session: AsyncSession, employee: Employee):
-    final_ids = (await session.execute(select(OrderStatus.id).where(or_(OrderStatus.is_completed_status == True, OrderStatus.is_cancelled_status == True)))).scalars().all()
+    final_ids = (await status_registry.get(session)).final_ids
     
-    q = select(Order).options(
-        joinedload(Order.status), joinedload(Order.table), joinedload(Order.accepted_by_waiter), joinedload(Order.courier), selectinload(Order.items)
-    ).where(Order.status_id.not_in(final_ids)).order_by(Order.id.desc())
+    q = select(Order).options(*ORDER_LIST_CARD).where(Order.status_id.not_in(final_ids)).order_by(Order.id.desc())
 
     orders = (await session.execute(q)).scalars().all()
     res = []
@@ -1075,11 +1084,8 @@ async def get_order_details(order_id: int, session: AsyncSession = Depends(get_d
     
     couriers_list = []
     if employee.role.can_manage_orders and order.is_delivery:
-        courier_role_res = await session.execute(select(Role.id).where(Role.can_be_assigned == True))
-        courier_role_ids = courier_role_res.scalars().all()
-        if courier_role_ids:
-            couriers = (await session.execute(select(Employee).where(Employee.role_id.in_(courier_role_ids), Employee.is_on_shift == True))).scalars().all()
-            couriers_list = [{"id": c.id, "name": c.full_name, "selected": c.id == order.courier_id} for c in couriers]
+        couriers = (await staff_roster.get(session)).on_shift("courier")
+        couriers_list = [{"id": c.id, "name": c.full_name, "selected": c.id == order.courier_id} for c in couriers]
 
     return JSONResponse({
         "id": order.id,
@@ -1179,7 +1185,7 @@ async def assign_courier_api(
                 logger.error(f"Не вдалося сповістити в TG кур'єра {courier.telegram_user_id} з PWA: {e}")
         # ----------------------------------------------------
     
-    await session.commit()
+    await commit_staff_notifications(session)
     return JSONResponse({"success": True, "message": msg})
 
 @router.post("/api/order/update_status")
@@ -1252,12 +1258,15 @@ async def update_order_status_api(
             await register_employee_debt(session, order, debtor_id)
 
     session.add(OrderStatusHistory(order_id=order.id, status_id=new_status_id, actor_info=actor_info))
-    await session.commit()
-    
-    await notify_all_parties_on_status_change(
-        order, old_status, actor_info, 
-        request.app.state.admin_bot, request.app.state.client_bot, session
+    # Склад (списання / повернення) - в транзакції зміни статусу, до commit
+    inventory_returned = await apply_status_inventory(session, order, new_status)
+    enqueue_notification(
+        session, "status_changed",
+        order_id=order.id, old_status_name=old_status, actor_info=actor_info,
+        new_status_id=new_status.id, inventory_returned=inventory_returned
     )
+    await session.commit()
+    notification_dispatcher.wake()
     
     # --- ОНОВЛЕННЯ ДЛЯ ПЕРСОНАЛУ ЧЕРЕЗ WEBSOCKET ---
     await manager.broadcast_staff({
@@ -1292,7 +1301,8 @@ async def cancel_order_complex_api(
     if not order: return JSONResponse({"error": "Замовлення не знайдено"}, 404)
 
     # Знаходимо статус скасування
-    cancel_status = await session.scalar(select(OrderStatus).where(OrderStatus.is_cancelled_status == True).limit(1))
+    cancelled = (await status_registry.get(session)).with_flag("is_cancelled_status")
+    cancel_status = cancelled[0] if cancelled else None
     if not cancel_status: return JSONResponse({"error": "Статус скасування не налаштовано"}, 500)
 
     old_status_name = order.status.name
@@ -1306,12 +1316,9 @@ async def cancel_order_complex_api(
     # ------------------------------------------
 
     # 1. Логіка Складу
-    if action_type == 'waste':
-        # Якщо "Списати", ми ставимо прапор, щоб notification_manager НЕ робив reverse_deduction
-        order.skip_inventory_return = True
-    else:
-        # Якщо "Повернути", notification_manager сам викличе reverse_deduction при зміні статусу
-        order.skip_inventory_return = False
+    # "Списати" - документи списання стають списанням (без reverse_deduction),
+    # "Повернути" - товари повертаються на склад (apply_status_inventory нижче)
+    skip_inventory_return = action_type == 'waste'
 
     # 2. Логіка Штрафу (Якщо Waste і вибрано)
     debt_msg = ""
@@ -1346,14 +1353,19 @@ async def cancel_order_complex_api(
         status_id=cancel_status.id, 
         actor_info=actor_info
     ))
-    
-    await session.commit()
 
-    # 4. Сповіщення
-    await notify_all_parties_on_status_change(
-        order, old_status_name, actor_info, 
-        request.app.state.admin_bot, request.app.state.client_bot, session
+    # 4. Склад - в цій же транзакції
+    inventory_returned = await apply_status_inventory(session, order, cancel_status, skip_inventory_return)
+
+    # 5. Сповіщення (outbox, тим самим commit)
+    enqueue_notification(
+        session, "status_changed",
+        order_id=order.id, old_status_name=old_status_name, actor_info=actor_info,
+        new_status_id=cancel_status.id, inventory_returned=inventory_returned
     )
+    
+    await session.commit()
+    notification_dispatcher.wake()
 
     # --- ОНОВЛЕННЯ ДЛЯ ПЕРСОНАЛУ ЧЕРЕЗ WEBSOCKET ---
     await manager.broadcast_staff({
@@ -1462,7 +1474,7 @@ async def update_order_items_api(
     # --------------------------
     
     if order.is_delivery:
-        settings = await session.get(Settings, 1) or Settings()
+        settings = await settings_cache.get(session)
         delivery_cost = settings.delivery_cost
         if settings.free_delivery_from is not None and total_price >= settings.free_delivery_from:
             delivery_cost = Decimal(0)
@@ -1474,11 +1486,9 @@ async def update_order_items_api(
     await session.commit()
     
     msg = f"🔄 Замовлення #{order.id} оновлено ({employee.full_name})"
-    chefs = (await session.execute(
-        select(Employee).join(Role).where(Role.can_receive_kitchen_orders==True, Employee.is_on_shift==True)
-    )).scalars().all()
-    for c in chefs:
-        await create_staff_notification(session, c.id, msg)
+    roster = await staff_roster.get(session)
+    await create_staff_notifications(session, roster.ids("kitchen"), msg)
+    await commit_staff_notifications(session)
         
     # --- ОНОВЛЕННЯ ДЛЯ ПЕРСОНАЛУ ЧЕРЕЗ WEBSOCKET ---
     await manager.broadcast_staff({
@@ -1600,7 +1610,7 @@ async def handle_action_api(
                 # ЛОГ ПРИЙНЯТТЯ
                 session.add(OrderLog(order_id=order.id, message="Офіціант прийняв замовлення", actor=actor_info))
                 
-                proc_status = await session.scalar(select(OrderStatus).where(OrderStatus.name == "В обробці").limit(1))
+                proc_status = (await status_registry.get(session)).named("В обробці")
                 if proc_status: order.status_id = proc_status.id
                 await session.commit()
                 
@@ -1618,48 +1628,21 @@ async def handle_action_api(
         return JSONResponse({"error": str(e)}, status_code=500)
 
 @router.get("/api/menu/full")
-async def get_full_menu(session: AsyncSession = Depends(get_db_session)):
+async def get_full_menu(request: Request, since: Optional[int] = Query(None), session: AsyncSession = Depends(get_db_session)):
     """
-    Повертає повне меню ресторану для PWA.
+    Повертає повне меню ресторану для PWA (зі знімка меню).
+    З ?since=<version> - лише зміни з цієї версії або маркер full_reload.
     """
-    cats = (await session.execute(select(Category).where(Category.show_in_restaurant==True).order_by(Category.sort_order))).scalars().all()
-    
-    menu = []
-    for c in cats:
-        prods = (await session.execute(
-            select(Product)
-            .where(Product.category_id==c.id, Product.is_active==True)
-            .options(selectinload(Product.modifiers))
-        )).scalars().all()
-        
-        prod_list = []
-        for p in prods:
-            p_mods = []
-            if p.modifiers:
-                for m in p.modifiers:
-                    price_val = m.price if m.price is not None else 0
-                    p_mods.append({
-                        "id": m.id, 
-                        "name": m.name, 
-                        "price": float(price_val)
-                    })
-            
-            prod_list.append({
-                "id": p.id, 
-                "name": p.name, 
-                "price": float(p.price), 
-                "preparation_area": p.preparation_area,
-                "production_warehouse_id": p.production_warehouse_id, # Важливо для фільтрації
-                "modifiers": p_mods 
-            })
-            
-        menu.append({
-            "id": c.id, 
-            "name": c.name, 
-            "products": prod_list
-        })
-        
-    return JSONResponse({"menu": menu})
+    etag = make_etag("staff_menu", menu_cache.version, since)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag, private=True)
+
+    if since is not None:
+        delta = await menu_cache.get_delta(session, since, "staff")
+        return JSONResponse(delta, headers=cache_headers(etag, private=True))
+
+    menu = await menu_cache.get(session)
+    return JSONResponse(menu.staff_menu, headers=cache_headers(etag, private=True))
 
 @router.post("/api/order/create")
 async def create_waiter_order(
@@ -1737,7 +1720,7 @@ async def create_waiter_order(
                     modifiers=final_mods # JSON з warehouse_id
                 ))
         
-        new_status = await session.scalar(select(OrderStatus).where(OrderStatus.name == "Новий").limit(1))
+        new_status = (await status_registry.get(session)).named("Новий")
         status_id = new_status.id if new_status else 1
         
         order = Order(
@@ -1768,9 +1751,9 @@ async def create_waiter_order(
         await session.refresh(order, ['status'])
         
         session.add(OrderStatusHistory(order_id=order.id, status_id=status_id, actor_info=actor_info))
+        enqueue_notification(session, "new_order", order_id=order.id)
         await session.commit()
-        
-        await notify_new_order_to_staff(request.app.state.admin_bot, order, session)
+        notification_dispatcher.wake()
         
         # --- МИТТЄВЕ ОНОВЛЕННЯ ДЛЯ ПЕРСОНАЛУ ЧЕРЕЗ WEBSOCKET ---
         await manager.broadcast_staff({
@@ -2028,12 +2011,12 @@ async def create_staff_delivery_order(
                 ))
         
         # Додаємо вартість доставки якщо є в налаштуваннях
-        settings = await session.get(Settings, 1) or Settings()
+        settings = await settings_cache.get(session)
         if settings.delivery_cost > 0:
              if settings.free_delivery_from is None or total < settings.free_delivery_from:
                  total += settings.delivery_cost
 
-        new_status = await session.scalar(select(OrderStatus).where(OrderStatus.name == "Новий").limit(1))
+        new_status = (await status_registry.get(session)).named("Новий")
         status_id = new_status.id if new_status else 1
         
         order = Order(
@@ -2063,10 +2046,10 @@ async def create_staff_delivery_order(
         await session.refresh(order, ['status'])
         
         session.add(OrderStatusHistory(order_id=order.id, status_id=status_id, actor_info=actor_info))
+        # Сповіщаємо систему (outbox, тим самим commit)
+        enqueue_notification(session, "new_order", order_id=order.id)
         await session.commit()
-        
-        # Сповіщаємо систему
-        await notify_new_order_to_staff(request.app.state.admin_bot, order, session)
+        notification_dispatcher.wake()
         
         # --- МИТТЄВЕ ОНОВЛЕННЯ ДЛЯ ПЕРСОНАЛУ ЧЕРЕЗ WEBSOCKET ---
         await manager.broadcast_staff({
@@ -0,0 +1,100 @@
+# staff_roster.py
+
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from models import Employee
+from read_replica import is_replica_session
+
+logger = logging.getLogger(__name__)
+
+# Можливість -> прапор ролі
+CAPABILITIES = {
+    "operator": "can_manage_orders",
+    "courier": "can_be_assigned",
+    "waiter": "can_serve_tables",
+    "kitchen": "can_receive_kitchen_orders",
+    "bar": "can_receive_bar_orders",
+}
+
+
+class RosterEmployee:
+    """Знімок співробітника на зміні (не прив'язаний до сесії)."""
+    __slots__ = ("id", "full_name", "telegram_user_id", "role_id", "role_name", "capabilities")
+
+    def __init__(self, employee: Employee):
+        self.id = employee.id
+        self.full_name = employee.full_name
+        self.telegram_user_id = employee.telegram_user_id
+        self.role_id = employee.role_id
+        self.role_name = employee.role.name if employee.role else None
+        self.capabilities = frozenset(
+            name for name, flag in CAPABILITIES.items() if employee.role and getattr(employee.role, flag)
+        )
+
+
+class RosterSnapshot:
+    def __init__(self, employees: List[RosterEmployee]):
+        # Сортування за ім'ям - списки кур'єрів в адмінці/боті показуються в цьому порядку
+        self.employees = sorted(employees, key=lambda e: e.full_name or "")
+        self.by_id: Dict[int, RosterEmployee] = {e.id: e for e in self.employees}
+        self.by_telegram_id: Dict[int, RosterEmployee] = {
+            e.telegram_user_id: e for e in self.employees if e.telegram_user_id
+        }
+        self.by_capability: Dict[str, List[RosterEmployee]] = {
+            name: [e for e in self.employees if name in e.capabilities] for name in CAPABILITIES
+        }
+
+    def on_shift(self, capability: str) -> List[RosterEmployee]:
+        return self.by_capability[capability]
+
+    def ids(self, capability: str) -> List[int]:
+        return [e.id for e in self.by_capability[capability]]
+
+    def chat_ids(self, capability: str) -> List[int]:
+        return [e.telegram_user_id for e in self.by_capability[capability] if e.telegram_user_id]
+
+
+class StaffRoster:
+    """
+    In-process список співробітників на зміні, проіндексований за можливостями ролі
+    та telegram_user_id. Будується одним запитом; invalidate() викликають після commit
+    перемикання зміни (PWA, бот) та збереження співробітників/ролей в адмінці.
+    """
+    def __init__(self):
+        self._version: int = 0
+        self._snapshot: Optional[RosterSnapshot] = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._version += 1
+        self._snapshot = None
+
+    async def get(self, session: AsyncSession) -> RosterSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+
+        async with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+
+            version = self._version
+            rows = (await session.execute(
+                select(Employee).options(joinedload(Employee.role)).where(Employee.is_on_shift == True)
+            )).scalars().all()
+            snapshot = RosterSnapshot([RosterEmployee(e) for e in rows])
+
+            # Якщо під час читання хтось почав/закінчив зміну - не кешуємо застарілий список (і список з репліки)
+            if version == self._version and not is_replica_session(session):
+                self._snapshot = snapshot
+            return snapshot
+
+
+# Глобальний екземпляр
+staff_roster = StaffRoster()
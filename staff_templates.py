@@ -550,6 +550,8 @@ STAFF_DASHBOARD_HTML = """
             ws.onmessage = (event) => {{
                 try {{
                     const data = JSON.parse(event.data);
+                    // Нові PWA-сповіщення: одразу оновлюємо бейдж, не чекаючи поллінгу
+                    if (data.type === 'staff_notifications') {{ updateNotifications(); return; }}
                     if (data.type === 'new_order' || data.type === 'order_updated' || data.type === 'item_ready') {{
                         if (data.type === 'new_order') showToast("🔔 " + data.message);
                         else showToast("🔄 Оновлення даних...");
@@ -0,0 +1,102 @@
+# static_assets.py
+
+import hashlib
+import logging
+import os
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+from starlette.staticfiles import StaticFiles
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = "static"
+HASH_LENGTH = 12
+
+# Кеш для файлів з хешем у назві: вміст за такою адресою ніколи не змінюється
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# favicon-32x32.<hash>.png -> favicon-32x32.png
+FINGERPRINT_RE = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[A-Za-z0-9]+)$" % HASH_LENGTH)
+# Посилання на статику у відрендереному HTML
+STATIC_URL_RE = re.compile(r"/(static/[\w\-./]+\.[A-Za-z0-9]+)")
+
+
+class StaticAssetManifest:
+    """
+    Маніфест статики: шлях файлу -> хеш вмісту.
+    Хеш перераховується лише коли змінюється mtime/розмір файлу
+    (наприклад, фавікон перезаписали з адмінки).
+    """
+    def __init__(self, root: str = STATIC_DIR):
+        self.root = root
+        # шлях -> (mtime_ns, size, hash)
+        self._entries: Dict[str, Tuple[int, int, str]] = {}
+
+    def file_hash(self, path: str) -> Optional[str]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        entry = self._entries.get(path)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+
+        digest = hashlib.sha1()
+        try:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(65536), b""):
+                    digest.update(chunk)
+        except OSError:
+            return None
+
+        file_hash = digest.hexdigest()[:HASH_LENGTH]
+        self._entries[path] = (stat.st_mtime_ns, stat.st_size, file_hash)
+        return file_hash
+
+    def fingerprint(self, path: Optional[str]) -> Optional[str]:
+        """'static/images/a.webp' -> 'static/images/a.<hash>.webp' (без зміни, якщо файла немає)."""
+        if not path:
+            return path
+        normalized = os.path.normpath(path.lstrip("/")).replace("\\", "/")
+        if not normalized.startswith(self.root + "/"):
+            return path
+
+        file_hash = self.file_hash(normalized)
+        if not file_hash:
+            return path
+        stem, ext = os.path.splitext(normalized)
+        return f"{stem}.{file_hash}{ext}"
+
+    def fingerprint_many(self, paths: Iterable[Optional[str]]) -> Dict[str, str]:
+        return {path: self.fingerprint(path) for path in set(paths) if path}
+
+    def url(self, path: Optional[str]) -> Optional[str]:
+        fingerprinted = self.fingerprint(path)
+        return "/" + fingerprinted if fingerprinted else fingerprinted
+
+    def rewrite_html(self, content: str) -> str:
+        """Замінює всі /static/... у відрендереному HTML на адреси з хешем."""
+        return STATIC_URL_RE.sub(lambda m: "/" + self.fingerprint(m.group(1)), content)
+
+
+class FingerprintedStaticFiles(StaticFiles):
+    """
+    StaticFiles, що розуміє адреси з хешем у назві файлу.
+    Якщо хеш збігається з поточним вмістом - віддає з Cache-Control: immutable на рік.
+    """
+    async def get_response(self, path: str, scope):
+        match = FINGERPRINT_RE.match(path)
+        if match and not os.path.exists(os.path.join(self.directory, path)):
+            original = match.group("stem") + match.group("ext")
+            response = await super().get_response(original, scope)
+            current_hash = static_assets.file_hash(os.path.join(self.directory, original).replace("\\", "/"))
+            if response.status_code == 200 and current_hash == match.group("hash"):
+                response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+            return response
+        return await super().get_response(path, scope)
+
+
+# Глобальний екземпляр
+static_assets = StaticAssetManifest()
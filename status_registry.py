@@ -0,0 +1,94 @@
+# status_registry.py
+
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import OrderStatus
+from read_replica import is_replica_session
+
+logger = logging.getLogger(__name__)
+
+# Булеві прапори OrderStatus, за якими будуються індекси
+STATUS_FLAGS = (
+    "notify_customer", "visible_to_operator", "visible_to_courier", "visible_to_waiter",
+    "visible_to_chef", "visible_to_bartender", "requires_kitchen_notify",
+    "is_completed_status", "is_cancelled_status",
+)
+
+
+class StatusSnapshot:
+    """
+    Від'єднані копії статусів (не прив'язані до сесії) - тільки для читання.
+    Для запису в замовлення використовувати id: order.status_id = status.id
+    """
+    def __init__(self, statuses: List[OrderStatus]):
+        self.statuses = sorted(statuses, key=lambda s: s.id)
+        self.by_id: Dict[int, OrderStatus] = {s.id: s for s in self.statuses}
+        self.by_name: Dict[str, OrderStatus] = {}
+        for s in self.statuses:
+            # При однакових назвах - перший за id (як select(...).where(name == ...).limit(1))
+            self.by_name.setdefault(s.name, s)
+        self.by_flag: Dict[str, List[OrderStatus]] = {
+            flag: [s for s in self.statuses if getattr(s, flag)] for flag in STATUS_FLAGS
+        }
+        self.completed_ids: List[int] = [s.id for s in self.by_flag["is_completed_status"]]
+        self.cancelled_ids: List[int] = [s.id for s in self.by_flag["is_cancelled_status"]]
+        # Фінальні: завершені або скасовані
+        self.final_ids: List[int] = [s.id for s in self.statuses if s.is_completed_status or s.is_cancelled_status]
+
+    def get(self, status_id: Optional[int]) -> Optional[OrderStatus]:
+        return self.by_id.get(status_id)
+
+    def named(self, name: str) -> Optional[OrderStatus]:
+        return self.by_name.get(name)
+
+    def with_flag(self, flag: str) -> List[OrderStatus]:
+        return self.by_flag[flag]
+
+    def is_final(self, status_id: Optional[int]) -> bool:
+        status = self.by_id.get(status_id)
+        return bool(status and (status.is_completed_status or status.is_cancelled_status))
+
+
+class StatusRegistry:
+    """
+    In-process реєстр статусів замовлень: за id, за назвою та за прапорами.
+    Завантажується одним запитом; invalidate() викликають обробники admin_statuses.py після commit.
+    """
+    def __init__(self):
+        self._version: int = 0
+        self._snapshot: Optional[StatusSnapshot] = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._version += 1
+        self._snapshot = None
+
+    async def get(self, session: AsyncSession) -> StatusSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+
+        async with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+
+            version = self._version
+            rows = (await session.execute(select(OrderStatus))).scalars().all()
+            snapshot = StatusSnapshot([
+                OrderStatus(**{attr.key: getattr(row, attr.key) for attr in OrderStatus.__mapper__.column_attrs})
+                for row in rows
+            ])
+
+            # Якщо під час читання статуси змінили - не кешуємо застарілий знімок (і знімок з репліки)
+            if version == self._version and not is_replica_session(session):
+                self._snapshot = snapshot
+            return snapshot
+
+
+# Глобальний екземпляр
+status_registry = StatusRegistry()
@@ -0,0 +1,209 @@
+# telegram_fanout.py
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramRetryAfter, TelegramNetworkError, TelegramServerError,
+    TelegramForbiddenError, TelegramBadRequest
+)
+
+logger = logging.getLogger(__name__)
+
+# Ліміти Telegram Bot API: ~30 повідомлень/с на бота, 1/с в один чат, 20/хв у групу
+TELEGRAM_GLOBAL_RATE = float(os.environ.get("TELEGRAM_GLOBAL_RATE", "25"))
+TELEGRAM_CHAT_RATE = 1.0
+TELEGRAM_GROUP_RATE = 20 / 60
+# Скільки повідомлень одночасно "в дорозі" (відкритих HTTPS-запитів)
+TELEGRAM_MAX_CONCURRENCY = int(os.environ.get("TELEGRAM_MAX_CONCURRENCY", "10"))
+MAX_RETRIES = 3
+# Якщо Telegram просить чекати довше - не тримаємо розсилку, вважаємо невдачею
+MAX_RETRY_AFTER_SECONDS = 30
+NETWORK_RETRY_DELAY = 1.0
+MAX_CHAT_BUCKETS = 1000
+
+class TokenBucket:
+    """Класичний token bucket: rate токенів за секунду, не більше capacity в запасі."""
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        # Lock - черга FIFO: повідомлення в один чат ідуть у порядку відправки
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Після 429: не видавати токени, поки не мине retry_after."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    def is_idle(self) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        return not self._lock.locked() and now >= self._blocked_until and self._tokens >= self.capacity
+
+
+class SendOutcome:
+    """Результат відправки одного повідомлення."""
+    __slots__ = ("chat_id", "ok", "message_id", "error", "attempts", "retryable")
+
+    def __init__(self, chat_id, ok: bool, message_id: Optional[int] = None, error: Optional[str] = None,
+                 attempts: int = 1, retryable: bool = False):
+        self.chat_id = chat_id
+        self.ok = ok
+        self.message_id = message_id
+        self.error = error
+        self.attempts = attempts
+        # Тимчасова помилка (429, мережа, 5xx) - є сенс повторити пізніше
+        self.retryable = retryable
+
+    def __repr__(self):
+        state = "ok" if self.ok else f"error={self.error!r}"
+        return f"<SendOutcome chat={self.chat_id} {state} attempts={self.attempts}>"
+
+
+class DeliveryLog:
+    """
+    Доставка в межах однієї події outbox: ключі вже відправлених повідомлень
+    (повтор події їх пропускає) і тимчасові невдачі, після яких подію треба повторити.
+    """
+    def __init__(self, delivered: Iterable[str] = ()):
+        self.delivered: Set[str] = set(delivered)
+        self.failed: List[SendOutcome] = []
+
+
+_delivery_log: ContextVar[Optional[DeliveryLog]] = ContextVar("telegram_delivery_log", default=None)
+
+
+@contextmanager
+def delivery_log(log: DeliveryLog):
+    """Усі send() всередині блоку записують результат у log."""
+    token = _delivery_log.set(log)
+    try:
+        yield log
+    finally:
+        _delivery_log.reset(token)
+
+
+def delivery_key(bot: Bot, chat_id, text: str) -> str:
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+    return f"{bot.id}:{chat_id}:{digest}"
+
+
+# (chat_id, текст, додаткові параметри send_message)
+FanoutMessage = Tuple[int, str, dict]
+
+
+class TelegramFanout:
+    """
+    Паралельна розсилка повідомлень з дотриманням лімітів Telegram:
+    загальний bucket на бота + окремий bucket на кожен чат.
+    На 429 чекає retry_after і повторює; повертає результат по кожному повідомленню.
+    """
+    def __init__(self, global_rate: float = TELEGRAM_GLOBAL_RATE, max_concurrency: int = TELEGRAM_MAX_CONCURRENCY):
+        self._global = TokenBucket(global_rate, capacity=global_rate)
+        self._chats: Dict[str, TokenBucket] = {}
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        # ADMIN_CHAT_ID інколи передається рядком - один bucket для "123" і 123
+        key = str(chat_id)
+        bucket = self._chats.get(key)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                self._chats = {cid: b for cid, b in self._chats.items() if not b.is_idle()}
+            # Від'ємні ID - групи/канали (адмін-чат), там ліміт суворіший
+            rate = TELEGRAM_GROUP_RATE if key.startswith("-") else TELEGRAM_CHAT_RATE
+            bucket = TokenBucket(rate)
+            self._chats[key] = bucket
+        return bucket
+
+    async def send(self, bot: Optional[Bot], chat_id, text: str, **kwargs) -> SendOutcome:
+        if bot is None:
+            return SendOutcome(chat_id, False, error="Бот не налаштований", attempts=0)
+
+        log = _delivery_log.get()
+        key = delivery_key(bot, chat_id, text) if log is not None else None
+        if key is not None and key in log.delivered:
+            return SendOutcome(chat_id, True, attempts=0)
+
+        outcome = await self._send(bot, chat_id, text, **kwargs)
+        if log is not None:
+            if outcome.ok:
+                log.delivered.add(key)
+            elif outcome.retryable:
+                log.failed.append(outcome)
+        return outcome
+
+    async def _send(self, bot: Bot, chat_id, text: str, **kwargs) -> SendOutcome:
+        chat_bucket = self._chat_bucket(chat_id)
+        attempt = 0
+        while True:
+            attempt += 1
+            await chat_bucket.acquire()
+            await self._global.acquire()
+            try:
+                async with self._slots:
+                    message = await bot.send_message(chat_id, text, **kwargs)
+                return SendOutcome(chat_id, True, message_id=message.message_id, attempts=attempt)
+            except TelegramRetryAfter as e:
+                chat_bucket.pause(e.retry_after)
+                if attempt > MAX_RETRIES or e.retry_after > MAX_RETRY_AFTER_SECONDS:
+                    return SendOutcome(chat_id, False, error=f"429 retry_after={e.retry_after}", attempts=attempt, retryable=True)
+                logger.warning(f"Telegram 429 для чату {chat_id}: чекаємо {e.retry_after}с")
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if attempt > MAX_RETRIES:
+                    return SendOutcome(chat_id, False, error=str(e), attempts=attempt, retryable=True)
+                await asyncio.sleep(NETWORK_RETRY_DELAY * attempt)
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                # Бот заблокований / чат не існує - повтор не допоможе
+                return SendOutcome(chat_id, False, error=str(e), attempts=attempt)
+            except Exception as e:
+                return SendOutcome(chat_id, False, error=f"{type(e).__name__}: {e}", attempts=attempt, retryable=True)
+
+    async def fan_out(self, bot: Optional[Bot], messages: Iterable[FanoutMessage]) -> List[SendOutcome]:
+        """Відправляє всі повідомлення паралельно. Помилки не кидаються - лише логуються і повертаються."""
+        messages = list(messages)
+        if not messages:
+            return []
+        if bot is None:
+            # Боти не запущені (немає токенів) - тихо пропускаємо, як і раніше
+            return [SendOutcome(chat_id, False, error="Бот не налаштований", attempts=0) for chat_id, _, _ in messages]
+        outcomes = await asyncio.gather(*(self.send(bot, chat_id, text, **kwargs) for chat_id, text, kwargs in messages))
+        for outcome in outcomes:
+            if not outcome.ok:
+                logger.error(f"Не вдалося відправити в TG {outcome.chat_id}: {outcome.error}")
+        return list(outcomes)
+
+    async def broadcast(self, bot: Optional[Bot], chat_ids: Iterable, text: str, **kwargs) -> List[SendOutcome]:
+        """Один текст кільком отримувачам."""
+        return await self.fan_out(bot, [(chat_id, text, kwargs) for chat_id in dict.fromkeys(chat_ids)])
+
+
+# Глобальний екземпляр
+telegram_fanout = TelegramFanout()
@@ -0,0 +1,38 @@
+# tests/conftest.py
+
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Модулі застосунку читають DATABASE_URL під час імпорту - окрема SQLite-база для тестів
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="app-tests-"), "test.sqlite")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_DB_PATH}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Base, engine  # noqa: E402
+import inventory_models  # noqa: E402,F401 - таблиці складу в Base.metadata
+
+
+def run(coro):
+    """Виконує корутину в новому циклі; з'єднання пулу прив'язані до циклу, тому пул закривається."""
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+    return asyncio.run(wrapper())
+
+
+@pytest.fixture
+def db():
+    """Порожня схема на кожен тест."""
+    if os.path.exists(_DB_PATH):
+        os.remove(_DB_PATH)
+
+    async def create():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    run(create())
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+from conftest import run
+from idempotency import find_response, replay_after_conflict, save_response
+from models import async_session_maker
+
+KEY = "checkout:abc-123"
+PAYLOAD = {"items": [{"id": 1, "quantity": 2}], "phone": "+380000000000"}
+BODY = {"message": "Замовлення прийнято", "order_id": 42}
+
+
+async def _save(payload=PAYLOAD):
+    async with async_session_maker() as session:
+        save_response(session, KEY, payload, BODY, order_id=42, status_code=201)
+        await session.commit()
+
+
+def test_same_key_and_body_replays_saved_response(db):
+    async def scenario():
+        await _save()
+        async with async_session_maker() as session:
+            return await find_response(session, KEY, dict(reversed(list(PAYLOAD.items()))))
+
+    response = run(scenario())
+    assert response.status_code == 201
+    assert response.headers["Idempotent-Replayed"] == "true"
+    assert json.loads(response.body) == BODY
+
+
+def test_same_key_with_different_body_is_422(db):
+    async def scenario():
+        await _save()
+        async with async_session_maker() as session:
+            await find_response(session, KEY, {**PAYLOAD, "phone": "+380111111111"})
+
+    with pytest.raises(HTTPException) as exc:
+        run(scenario())
+    assert exc.value.status_code == 422
+
+
+def test_unknown_or_missing_key_is_not_replayed(db):
+    async def scenario():
+        async with async_session_maker() as session:
+            return await find_response(session, KEY, PAYLOAD), await find_response(session, None, PAYLOAD)
+
+    assert run(scenario()) == (None, None)
+
+
+def test_parallel_duplicate_gets_first_response(db):
+    async def scenario():
+        await _save()
+        async with async_session_maker() as session:
+            save_response(session, KEY, PAYLOAD, {"order_id": 43}, order_id=43)
+            with pytest.raises(IntegrityError):
+                await session.commit()
+            return await replay_after_conflict(session, KEY, PAYLOAD)
+
+    response = run(scenario())
+    assert json.loads(response.body) == BODY
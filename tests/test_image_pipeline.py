@@ -0,0 +1,21 @@
+import struct
+import zlib
+
+import pytest
+
+from image_pipeline import ImageRejected, process_image
+
+
+def _png_header(width: int, height: int) -> bytes:
+    """PNG лише із заголовком: Pillow бачить розміри, пікселі не потрібні."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(b"")) + chunk(b"IEND", b"")
+
+
+@pytest.mark.parametrize("size", [(7000, 7000), (20000, 20000)])
+def test_oversized_image_is_rejected(size):
+    # 49 Мп - понад MAX_PIXELS; 400 Мп - понад ліміт "бомби" Pillow (DecompressionBombError)
+    with pytest.raises(ImageRejected):
+        process_image(_png_header(*size), (320,))
@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+from sqlalchemy import update
+
+from conftest import run
+from menu_cache import MenuCache
+from models import Category, Product, async_session_maker
+
+
+async def _seed(session):
+    category = Category(name="Піца")
+    session.add(category)
+    await session.flush()
+    session.add_all([
+        Product(id=1, name="Маргарита", price=Decimal("150.00"), category_id=category.id, slug="marharyta"),
+        Product(id=2, name="Пепероні", price=Decimal("180.00"), category_id=category.id, slug="peperoni"),
+    ])
+    await session.commit()
+
+
+def test_delta_from_known_version_has_only_changes(db):
+    async def scenario():
+        cache = MenuCache()
+        async with async_session_maker() as session:
+            await _seed(session)
+            old_version = (await cache.get(session)).version
+
+            await session.execute(update(Product).where(Product.id == 1).values(price=Decimal("155.00")))
+            await session.execute(update(Product).where(Product.id == 2).values(is_active=False))
+            await session.commit()
+            cache.invalidate()
+
+            return old_version, cache.version, await cache.get_delta(session, old_version, "api")
+
+    old_version, new_version, delta = run(scenario())
+    assert delta["full_reload"] is False
+    assert (delta["since"], delta["version"]) == (old_version, new_version)
+    assert [(p["id"], p["price"]) for p in delta["products"]] == [(1, 155.0)]
+    assert delta["removed_products"] == [2]
+    assert delta["categories"] == [] and delta["removed_categories"] == []
+
+
+def test_unknown_version_falls_back_to_full_reload(db):
+    async def scenario():
+        cache = MenuCache()
+        async with async_session_maker() as session:
+            await _seed(session)
+            return cache.version, await cache.get_delta(session, cache.version - 1, "staff")
+
+    version, delta = run(scenario())
+    assert delta == {"version": version, "since": version - 1, "full_reload": True}
@@ -0,0 +1,84 @@
+from sqlalchemy import select
+
+import notification_outbox
+from conftest import run
+from models import NotificationOutbox, async_session_maker
+from notification_outbox import enqueue_notification, notification_dispatcher
+from telegram_fanout import telegram_fanout
+
+
+class FakeMessage:
+    message_id = 1
+
+
+class FakeBot:
+    """Бот, у якого перша відправка в задані чати падає."""
+    id = 42
+
+    def __init__(self, fail_once=()):
+        self.fail_once = set(fail_once)
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.fail_once:
+            self.fail_once.discard(chat_id)
+            raise ConnectionError("telegram down")
+        self.sent.append((chat_id, text))
+        return FakeMessage()
+
+
+async def _event() -> NotificationOutbox:
+    async with async_session_maker() as session:
+        return (await session.execute(select(NotificationOutbox))).scalar_one()
+
+
+def test_failed_send_is_retried_without_resending_delivered(db, monkeypatch):
+    monkeypatch.setattr(notification_outbox, "backoff_delay", lambda attempts: 0)
+    bot = FakeBot(fail_once={222})
+
+    async def handler(session, payload):
+        await telegram_fanout.fan_out(bot, [(111, "first", {}), (222, "second", {})])
+
+    notification_dispatcher.register("test_fanout", handler)
+
+    async def scenario():
+        async with async_session_maker() as session:
+            enqueue_notification(session, "test_fanout")
+            await session.commit()
+
+        await notification_dispatcher.drain()
+        first = await _event()
+        await notification_dispatcher.drain()
+        second = await _event()
+        return first, second
+
+    first, second = run(scenario())
+
+    assert first.status == 'pending'
+    assert "DeliveryFailed" in first.last_error
+    assert len(first.payload["delivered"]) == 1
+    assert second.status == 'sent'
+    assert second.attempts == 2
+    # 111 отримав повідомлення при першій спробі, повтор його не дублює
+    assert bot.sent == [(111, "first"), (222, "second")]
+
+
+def test_event_without_failures_is_sent_once(db):
+    bot = FakeBot()
+
+    async def handler(session, payload):
+        await telegram_fanout.send(bot, 333, "hello")
+
+    notification_dispatcher.register("test_single", handler)
+
+    async def scenario():
+        async with async_session_maker() as session:
+            enqueue_notification(session, "test_single")
+            await session.commit()
+        await notification_dispatcher.drain()
+        return await _event()
+
+    event = run(scenario())
+    assert event.status == 'sent'
+    assert event.attempts == 1
+    assert bot.sent == [(333, "hello")]
@@ -0,0 +1,58 @@
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+
+from conftest import run
+from menu_cache import MenuCache
+from models import Category, Product, async_session_maker
+from order_intake import MAX_ITEM_QUANTITY, price_cart
+
+
+async def _menu():
+    async with async_session_maker() as session:
+        category = Category(name="Піца")
+        session.add(category)
+        await session.flush()
+        session.add_all([
+            Product(id=1, name="Маргарита", price=Decimal("150.00"), category_id=category.id, slug="marharyta"),
+            Product(id=2, name="Пепероні", price=Decimal("180.50"), category_id=category.id, slug="peperoni"),
+            Product(id=3, name="Архівна", price=Decimal("99.00"), category_id=category.id, slug="arkhivna", is_active=False),
+        ])
+        await session.commit()
+        return await MenuCache().get(session)
+
+
+def test_prices_known_items_from_snapshot(db):
+    menu = run(_menu())
+    total, rows, log_items = price_cart(menu, [{"id": 1, "quantity": 2}, {"id": "2", "quantity": 1}])
+
+    assert total == Decimal("480.50")
+    assert [(r["product_id"], r["quantity"], r["price_at_moment"]) for r in rows] == [
+        (1, 2, Decimal("150.00")), (2, 1, Decimal("180.50"))
+    ]
+    assert log_items == ["Маргарита x2", "Пепероні x1"]
+
+
+def test_unknown_and_inactive_items_are_skipped(db):
+    menu = run(_menu())
+    total, rows, _ = price_cart(menu, [{"id": 999, "quantity": 1}, {"id": 3, "quantity": 1}, {"id": 1, "quantity": 1}])
+
+    assert total == Decimal("150.00")
+    assert [r["product_id"] for r in rows] == [1]
+
+
+@pytest.mark.parametrize("item", [{"id": "abc", "quantity": 1}, {"quantity": 1}, {"id": None}, {"id": 1, "quantity": "x"}])
+def test_bad_id_or_quantity_format_is_400(db, item):
+    menu = run(_menu())
+    with pytest.raises(HTTPException) as exc:
+        price_cart(menu, [item])
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.parametrize("qty", [0, -1, MAX_ITEM_QUANTITY + 1])
+def test_out_of_range_quantity_is_400(db, qty):
+    menu = run(_menu())
+    with pytest.raises(HTTPException) as exc:
+        price_cart(menu, [{"id": 1, "quantity": qty}])
+    assert exc.value.status_code == 400
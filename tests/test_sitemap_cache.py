@@ -0,0 +1,51 @@
+import re
+from datetime import datetime
+from types import SimpleNamespace
+
+import sitemap_cache
+from sitemap_cache import SitemapCache
+
+BASE_URL = "https://example.com"
+
+
+def _menu(count, version=1):
+    products = [
+        {"id": i, "slug": f"strava-{i}", "updated_at": datetime(2026, 1, i % 28 + 1)}
+        for i in range(1, count + 1)
+    ]
+    return SimpleNamespace(version=version, products=products)
+
+
+def _locs(fragments):
+    return re.findall(r"<loc>([^<]+)</loc>", "".join(fragments))
+
+
+def test_small_menu_is_a_single_urlset(monkeypatch):
+    monkeypatch.setattr(sitemap_cache, "SITEMAP_CHUNK_SIZE", 10)
+    documents = SitemapCache().get(_menu(3), BASE_URL)
+
+    assert list(documents) == ["sitemap.xml"]
+    assert "<urlset" in documents["sitemap.xml"][0]
+    assert _locs(documents["sitemap.xml"]) == [f"{BASE_URL}/"] + [f"{BASE_URL}/?p=strava-{i}" for i in (1, 2, 3)]
+
+
+def test_large_menu_is_split_into_chunks_with_index(monkeypatch):
+    monkeypatch.setattr(sitemap_cache, "SITEMAP_CHUNK_SIZE", 4)
+    # 10 страв + головна = 11 URL -> 3 файли по 4/4/3
+    documents = SitemapCache().get(_menu(10), BASE_URL)
+
+    assert sorted(documents) == ["sitemap-1.xml", "sitemap-2.xml", "sitemap-3.xml", "sitemap.xml"]
+    assert "<sitemapindex" in documents["sitemap.xml"][0]
+    assert _locs(documents["sitemap.xml"]) == [f"{BASE_URL}/sitemap-{n}.xml" for n in (1, 2, 3)]
+    assert [len(_locs(documents[f"sitemap-{n}.xml"])) for n in (1, 2, 3)] == [4, 4, 3]
+    all_locs = [loc for n in (1, 2, 3) for loc in _locs(documents[f"sitemap-{n}.xml"])]
+    assert all_locs == [f"{BASE_URL}/"] + [f"{BASE_URL}/?p=strava-{i}" for i in range(1, 11)]
+
+
+def test_rebuilds_only_when_menu_version_or_base_url_changes():
+    cache = SitemapCache()
+    first = cache.get(_menu(2, version=1), BASE_URL)
+
+    assert cache.get(_menu(2, version=1), BASE_URL) is first
+    assert cache.get(_menu(3, version=2), BASE_URL) is not first
+    assert _locs(cache.get(_menu(3, version=2), "https://other.example")["sitemap.xml"])[0] == "https://other.example/"
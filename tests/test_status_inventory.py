@@ -0,0 +1,66 @@
+from decimal import Decimal
+
+from sqlalchemy.exc import IntegrityError
+
+import notification_manager
+from conftest import run
+from models import Order, OrderStatus, async_session_maker
+from notification_manager import apply_status_inventory
+
+
+async def _order_with_statuses():
+    async with async_session_maker() as session:
+        new = OrderStatus(name="Новий")
+        ready = OrderStatus(name="Готовий до видачі")
+        session.add_all([new, ready])
+        await session.flush()
+        order = Order(customer_name="A", total_price=Decimal("100"), status_id=new.id)
+        session.add(order)
+        await session.commit()
+        return order.id, ready.id
+
+
+async def _load(order_id):
+    async with async_session_maker() as session:
+        return await session.get(Order, order_id)
+
+
+def test_inventory_is_not_committed_before_caller(db):
+    async def scenario():
+        order_id, ready_id = await _order_with_statuses()
+        async with async_session_maker() as session:
+            order = await session.get(Order, order_id)
+            ready = await session.get(OrderStatus, ready_id)
+            order.status_id = ready_id
+            await apply_status_inventory(session, order, ready)
+            assert order.is_inventory_deducted
+            # Викликач відкочує транзакцію - ні статус, ні склад не збережені
+            await session.rollback()
+        return ready_id, await _load(order_id)
+
+    ready_id, order = run(scenario())
+    assert not order.is_inventory_deducted
+    assert order.status_id != ready_id
+
+
+def test_inventory_error_keeps_status_change(db, monkeypatch):
+    async def failing_deduct(session, order, commit=True):
+        order.is_inventory_deducted = True
+        raise IntegrityError("INSERT", {}, Exception("stock constraint"))
+
+    monkeypatch.setattr(notification_manager, "deduct_products_by_tech_card", failing_deduct)
+
+    async def scenario():
+        order_id, ready_id = await _order_with_statuses()
+        async with async_session_maker() as session:
+            order = await session.get(Order, order_id)
+            ready = await session.get(OrderStatus, ready_id)
+            order.status_id = ready_id
+            returned = await apply_status_inventory(session, order, ready)
+            await session.commit()
+        return returned, ready_id, await _load(order_id)
+
+    returned, ready_id, order = run(scenario())
+    assert returned is False
+    assert order.status_id == ready_id
+    assert not order.is_inventory_deducted
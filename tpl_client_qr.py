@@ -65,6 +65,8 @@ IN_HOUSE_MENU_HTML_TEMPLATE = """
         --st-ready-bg: #dcfce7; --st-ready-text: #16a34a;
         --st-done-bg: #f1f5f9; --st-done-text: #64748b;
       }}
+      /* Менші версії фото шапки для вузьких екранів */
+      {header_image_media_css}
       
       html {{ scroll-behavior: smooth; -webkit-text-size-adjust: 100%; }}
       * {{ box-sizing: border-box; -webkit-tap-highlight-color: transparent; outline: none; }}
@@ -618,6 +620,7 @@ IN_HOUSE_MENU_HTML_TEMPLATE = """
                         const card = document.createElement('div');
                         card.className = 'product-card';
                         const img = prod.image_url ? `/${{prod.image_url}}` : '/static/images/placeholder.jpg';
+                        const srcsetAttr = prod.srcset ? `srcset="${{prod.srcset}}" sizes="{product_image_sizes}"` : '';
                         const prodJson = JSON.stringify(prod).replace(/"/g, '&quot;');
                         
                         card.onclick = (e) => {{
@@ -625,7 +628,7 @@ IN_HOUSE_MENU_HTML_TEMPLATE = """
                         }};
 
                         card.innerHTML = `
-                            <div class="product-image-wrapper"><img src="${{img}}" class="product-image" loading="lazy"></div>
+                            <div class="product-image-wrapper"><img src="${{img}}" ${{srcsetAttr}} class="product-image" loading="lazy"></div>
                             <div class="product-info">
                                 <div class="product-header">
                                     <div class="product-name">${{prod.name}}</div>
@@ -804,6 +807,37 @@ IN_HOUSE_MENU_HTML_TEMPLATE = """
         }}
 
         // --- API CALLS ---
+        // --- Idempotency-Key: повтори того самого замовлення не створюють дублів ---
+        let orderKey = null, orderKeyBody = null;
+        function idempotencyKeyFor(body) {{
+            if (orderKey === null || orderKeyBody !== body) {{
+                orderKey = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : Date.now().toString(36) + Math.random().toString(36).slice(2);
+                orderKeyBody = body;
+            }}
+            return orderKey;
+        }}
+        // Таймаут і повтори з тим самим ключем (сервер поверне вже створене замовлення)
+        async function postOrder(url, body) {{
+            const key = idempotencyKeyFor(body);
+            for (let attempt = 0; ; attempt++) {{
+                const ctrl = new AbortController();
+                const timer = setTimeout(() => ctrl.abort(), 15000);
+                try {{
+                    const res = await fetch(url, {{
+                        method: 'POST', signal: ctrl.signal,
+                        headers: {{'Content-Type': 'application/json', 'Idempotency-Key': key}}, body: body
+                    }});
+                    if ((res.status < 500 && res.status !== 409) || attempt >= 2) {{
+                        if (res.ok) orderKey = null;
+                        return res;
+                    }}
+                }} catch(err) {{
+                    if (attempt >= 2) throw err;
+                }} finally {{ clearTimeout(timer); }}
+                await new Promise(r => setTimeout(r, 800 * (attempt + 1)));
+            }}
+        }}
+
         async function placeOrder() {{
             const btn = document.getElementById('place-order-btn');
             const originalHTML = btn.innerHTML;
@@ -814,10 +848,7 @@ IN_HOUSE_MENU_HTML_TEMPLATE = """
                     id: i.id, quantity: i.qty, modifiers: i.modifiers
                 }}));
                 
-                const res = await fetch(`/api/menu/table/${{TABLE_ID}}/place_order`, {{
-                    method: 'POST', headers: {{'Content-Type': 'application/json'}}, 
-                    body: JSON.stringify(items)
-                }});
+                const res = await postOrder(`/api/menu/table/${{TABLE_ID}}/place_order`, JSON.stringify(items));
                 
                 if(res.ok) {{
                     cart = {{}}; saveCart();
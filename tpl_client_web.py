@@ -70,6 +70,8 @@ WEB_ORDER_HTML = """
         --font-sans: '{font_family_sans_val}', -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif;
         --font-serif: '{font_family_serif_val}', serif;
       }}
+      /* Менші версії фото шапки для вузьких екранів */
+      {header_image_media_css}
       
       html {{ scroll-behavior: smooth; -webkit-text-size-adjust: 100%; }}
       * {{ box-sizing: border-box; -webkit-tap-highlight-color: transparent; outline: none; }}
@@ -1213,6 +1215,7 @@ WEB_ORDER_HTML = """
                             const card = document.createElement('div');
                             card.className = 'product-card';
                             const img = prod.image_url ? `/${{prod.image_url}}` : '/static/images/placeholder.jpg';
+                            const srcsetAttr = prod.srcset ? `srcset="${{prod.srcset}}" sizes="{product_image_sizes}"` : '';
                             
                             // *** FIXED LINE HERE ***
                             // Correctly replace quotes with " for HTML attribute
@@ -1225,7 +1228,7 @@ WEB_ORDER_HTML = """
 
                             // UPDATE FOR SEO: h3 tag and alt attribute
                             card.innerHTML = `
-                                <div class="product-image-wrapper"><img src="${{img}}" alt="${{prod.name}}" class="product-image" loading="lazy"></div>
+                                <div class="product-image-wrapper"><img src="${{img}}" ${{srcsetAttr}} alt="${{prod.name}}" class="product-image" loading="lazy"></div>
                                 <div class="product-info">
                                     <div class="product-header">
                                         <h3 class="product-name">${{prod.name}}</h3>
@@ -1745,6 +1748,37 @@ WEB_ORDER_HTML = """
                 }}
             }};
 
+            // --- Idempotency-Key: повтори того самого замовлення не створюють дублів ---
+            let orderKey = null, orderKeyBody = null;
+            function idempotencyKeyFor(body) {{
+                if (orderKey === null || orderKeyBody !== body) {{
+                    orderKey = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : Date.now().toString(36) + Math.random().toString(36).slice(2);
+                    orderKeyBody = body;
+                }}
+                return orderKey;
+            }}
+            // Таймаут і повтори з тим самим ключем (сервер поверне вже створене замовлення)
+            async function postOrder(url, body) {{
+                const key = idempotencyKeyFor(body);
+                for (let attempt = 0; ; attempt++) {{
+                    const ctrl = new AbortController();
+                    const timer = setTimeout(() => ctrl.abort(), 15000);
+                    try {{
+                        const res = await fetch(url, {{
+                            method: 'POST', signal: ctrl.signal,
+                            headers: {{'Content-Type': 'application/json', 'Idempotency-Key': key}}, body: body
+                        }});
+                        if ((res.status < 500 && res.status !== 409) || attempt >= 2) {{
+                            if (res.ok) orderKey = null;
+                            return res;
+                        }}
+                    }} catch(err) {{
+                        if (attempt >= 2) throw err;
+                    }} finally {{ clearTimeout(timer); }}
+                    await new Promise(r => setTimeout(r, 800 * (attempt + 1)));
+                }}
+            }}
+
             document.getElementById('checkout-form').onsubmit = async (e) => {{
                 e.preventDefault();
                 
@@ -1782,9 +1816,7 @@ WEB_ORDER_HTML = """
                 }};
 
                 try {{
-                    const res = await fetch('/api/place_order', {{
-                        method: 'POST', headers: {{'Content-Type': 'application/json'}}, body: JSON.stringify(data)
-                    }});
+                    const res = await postOrder('/api/place_order', JSON.stringify(data));
                     if(res.ok) {{
                         // --- GA EVENT: purchase (Analytics) ---
                         const itemsGA = Object.values(cart).map(i => ({{